@@ -0,0 +1,84 @@
+"""
+Compact author cards: what pages and API responses show about a user
+wherever they appear as an author or as the signed-in user.
+
+A card is a small dict (username, avatar URL and srcset, bio snippet, and
+the profile as the API nests it) cached per user id. ``get_cards`` reads many at once with one ``get_many`` and
+builds the misses with a single query, so post lists and comment threads
+no longer join or fetch profiles per author. Cards are dropped whenever the
+user, the profile or the avatar renditions change (see accounts.signals).
+"""
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.utils.text import Truncator
+
+from blog.renditions import rendition_urls
+
+# bump the version when the card gains fields, so older cards are not read
+CARD_KEY = "card:v2:user:{}"
+CARD_TIMEOUT = 60 * 60 * 24
+BIO_SNIPPET_WORDS = 20
+# navbar and comment avatars are 40px; 96w covers 2x screens
+AVATAR_WIDTH = 96
+
+
+def _avatar(profile):
+    """URL and srcset of the avatar rendition closest to AVATAR_WIDTH."""
+    if profile is None or not profile.profile_picture:
+        return None, ""
+    meta = profile.profile_picture_renditions or {}
+    entries = meta.get("sources", {}).get("jpeg", []) if meta.get("source") == profile.profile_picture.name else []
+    if not entries:
+        return profile.profile_picture.url, ""
+    width, path = next(((w, p) for w, p in entries if w >= AVATAR_WIDTH), entries[-1])
+    srcset = ", ".join(f"{default_storage.url(p)} {w}w" for w, p in entries)
+    return default_storage.url(path), srcset
+
+
+def build_card(user):
+    profile = getattr(user, "profile", None)
+    avatar, avatar_srcset = _avatar(profile)
+    return {
+        "id": user.pk,
+        "username": user.username,
+        "avatar": avatar,
+        "avatar_srcset": avatar_srcset,
+        "bio": Truncator(profile.bio if profile else "").words(BIO_SNIPPET_WORDS, truncate=" …"),
+        # the API's nested profile (see api.serializers.AuthorCardField)
+        "profile": {
+            "bio": profile.bio,
+            "profile_picture": profile.profile_picture.url if profile.profile_picture else None,
+            "profile_picture_renditions": rendition_urls(profile.profile_picture_renditions),
+        } if profile else None,
+    }
+
+
+def get_cards(user_ids):
+    """Return ``{user id: card}`` for the users that exist among ``user_ids``."""
+    from django.contrib.auth.models import User
+
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    keys = {CARD_KEY.format(user_id): user_id for user_id in user_ids}
+    cached = cache.get_many(keys)
+    cards = {keys[key]: card for key, card in cached.items()}
+
+    missing = user_ids - cards.keys()
+    if missing:
+        users = User.objects.filter(pk__in=missing).select_related("profile").only(
+            "pk", "username", "profile__bio", "profile__profile_picture",
+            "profile__profile_picture_renditions",
+        )
+        built = {user.pk: build_card(user) for user in users}
+        cache.set_many({CARD_KEY.format(user_id): card for user_id, card in built.items()}, CARD_TIMEOUT)
+        cards.update(built)
+    return cards
+
+
+def get_card(user_id):
+    return get_cards([user_id]).get(user_id)
+
+
+def invalidate_card(user_id):
+    cache.delete(CARD_KEY.format(user_id))
@@ -0,0 +1,14 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cards import get_card
+
+
+def user_card(request):
+    """
+    The signed-in user's card for the navbar, loaded at most once per
+    request and only if a template uses it.
+    """
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return {"user_card": None}
+    return {"user_card": SimpleLazyObject(lambda: get_card(user.pk))}
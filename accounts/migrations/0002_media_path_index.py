@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-17 04:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='profile_picture',
+            field=models.ImageField(blank=True, db_index=True, null=True, upload_to='profile_pics/'),
+        ),
+    ]
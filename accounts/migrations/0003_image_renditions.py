@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-17 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_media_path_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='profile_picture_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
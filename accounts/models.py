@@ -3,9 +3,46 @@ from django.contrib.auth.models import User
 
 # Create your models here.
 class Profile(models.Model):
+    # compared against their loaded values by changed_fields()
+    TRACKED_FIELDS = ("bio", "profile_picture")
+
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(blank=True)
-    profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True, db_index=True)
+    # size, placeholder and resized copies of profile_picture; see blog.renditions
+    profile_picture_renditions = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return self.user.username
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored state so saves can skip or act on real changes
+        instance._loaded_values = {
+            name: instance._tracked_value(name)
+            for name in cls.TRACKED_FIELDS
+            if name in field_names
+        }
+        return instance
+
+    def _tracked_value(self, name):
+        value = getattr(self, name)
+        # file fields compare by stored name, not by FieldFile identity
+        return getattr(value, "name", value) or None
+
+    def loaded_value(self, name):
+        """Value of ``name`` as last loaded or saved; raises KeyError if unknown."""
+        return getattr(self, "_loaded_values", {})[name]
+
+    def changed_fields(self):
+        """Tracked fields that differ from the stored row (all of them when not loaded)."""
+        loaded = getattr(self, "_loaded_values", {})
+        return {
+            name for name in self.TRACKED_FIELDS
+            if name not in loaded or loaded[name] != self._tracked_value(name)
+        }
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {name: self._tracked_value(name) for name in self.TRACKED_FIELDS}
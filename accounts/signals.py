@@ -1,6 +1,11 @@
 from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from blog.assets import register_upload
+from blog.renditions import needs_renditions, rendition_paths, schedule_renditions
+from blog.uploads import run_in_background
+from .cards import invalidate_card
 from .models import Profile
 
 
@@ -12,28 +17,72 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, "profile"):
+    """
+    Save a profile edited through its user. Only one that was already loaded
+    and actually changed is written, so plain User saves (such as the
+    last_login update on every login) cost no Profile query at all.
+    """
+    if User.profile.is_cached(instance) and instance.profile.changed_fields():
         instance.profile.save()
 
 
 @receiver(pre_save, sender=Profile)
-def delete_old_profile_picture(sender, instance, **kwargs):
+def find_replaced_profile_picture(sender, instance, **kwargs):
     """
-    Delete old profile picture when a new one is uploaded.
-    Works with Cloudinary and local storage.
+    Note whether a save changes the picture, and which one it replaces, for
+    record_profile_picture to act on once the row is written.
     """
+    new_picture = instance.profile_picture.name or None
     if not instance.pk:
+        old_picture = None
+    else:
+        try:
+            old_picture = instance.loaded_value("profile_picture")
+        except KeyError:
+            # not loaded from the database (or loaded with only()); look it up
+            old_picture = Profile.objects.filter(pk=instance.pk).values_list(
+                "profile_picture", flat=True
+            ).first()
+    instance._picture_change = (old_picture or None, new_picture) if old_picture != new_picture else None
+
+
+@receiver(post_save, sender=Profile)
+def record_profile_picture(sender, instance, **kwargs):
+    """
+    Record a new profile picture as an Upload, so orphan cleanup knows its
+    age on storages that report none, and delete the one it replaced.
+    Works with Cloudinary and local storage.
+    """
+    change = getattr(instance, "_picture_change", None)
+    if not change:
         return
+    instance._picture_change = None
+    old_picture, new_picture = change
+    if new_picture:
+        register_upload(new_picture, directory="profile_pics")
+    if old_picture:
+        # after the UPDATE, once committed, off the request thread
+        run_in_background(default_storage.delete, old_picture)
+
+
+@receiver(post_save, sender=Profile)
+def render_profile_picture(sender, instance, **kwargs):
+    """Resize a new profile picture in the background."""
+    if needs_renditions(instance):
+        schedule_renditions(Profile, instance.pk)
+
 
-    try:
-        old_picture = Profile.objects.get(pk=instance.pk).profile_picture
-    except Profile.DoesNotExist:
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_card(sender, instance, update_fields=None, **kwargs):
+    # login only touches last_login, which cards do not show
+    if update_fields and set(update_fields) <= {"last_login"}:
         return
+    invalidate_card(instance.pk)
 
-    new_picture = instance.profile_picture
 
-    if old_picture and old_picture != new_picture:
-        old_picture.delete(save=False)
+@receiver([post_save, post_delete], sender=Profile)
+def invalidate_profile_card(sender, instance, **kwargs):
+    invalidate_card(instance.user_id)
 
 
 @receiver(post_delete, sender=Profile)
@@ -44,3 +93,5 @@ def delete_profile_pic_on_delete(sender, instance, **kwargs):
     """
     if instance.profile_picture:
         instance.profile_picture.delete(save=False)
+    for path in rendition_paths(instance.profile_picture_renditions):
+        default_storage.delete(path)
@@ -0,0 +1,59 @@
+"""
+Per-author statistics over published posts: post count, total likes and
+total views, computed as annotations so a page of users costs one query
+however many users or posts it covers. ``author_stats`` caches them for a
+single author's profile page.
+"""
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from blog.caching import author_listing, listing_key
+
+STATS_TIMEOUT = 60 * 15
+
+
+def _published():
+    return Q(posts__status="published", posts__pub_date__lte=timezone.now())
+
+
+def with_author_stats(queryset):
+    """Annotate a User queryset with published_posts_count, total_likes and total_views."""
+    published = _published()
+    return queryset.annotate(
+        published_posts_count=Count("posts", filter=published),
+        total_likes=Coalesce(Sum("posts__likes", filter=published), 0),
+        total_views=Coalesce(Sum("posts__views_count", filter=published), 0),
+    )
+
+
+def username_prefix(queryset, prefix):
+    """
+    Users whose username starts with ``prefix`` (case-sensitive), read as a
+    range scan of the unique username index.
+    """
+    if not prefix:
+        return queryset
+    # every string starting with prefix sorts in [prefix, prefix with its last character bumped)
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return queryset.filter(username__gte=prefix, username__lt=upper, username__startswith=prefix)
+
+
+def author_stats(user_id):
+    """
+    Cached ``{"published_posts_count", "total_likes", "total_views"}`` of one
+    author. The key follows the author's listing generation, so it changes
+    whenever one of their posts does; views flushed in between show up once
+    the entry expires.
+    """
+    from django.contrib.auth.models import User
+
+    key = listing_key("author_stats", author_listing(user_id))
+    stats = cache.get(key)
+    if stats is None:
+        stats = with_author_stats(User.objects.filter(pk=user_id)).values(
+            "published_posts_count", "total_likes", "total_views"
+        ).first()
+        cache.set(key, stats, STATS_TIMEOUT)
+    return stats
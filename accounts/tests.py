@@ -1,3 +1,187 @@
-from django.test import TestCase
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from blog.models import Post, Upload
+
+from .models import Profile
+
+
+class ProfileSaveTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="testpass123")
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            STORAGES={
+                **settings.STORAGES,
+                "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+            },
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_login_does_not_touch_the_profile(self):
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(self.client.login(username="testuser", password="testpass123"))
+        self.assertFalse(any("accounts_profile" in query["sql"] for query in context.captured_queries))
+
+    def test_user_save_writes_profile_only_when_changed(self):
+        user = User.objects.select_related("profile").get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            user.save()
+
+        user.profile.bio = "Hello"
+        with self.assertNumQueries(2):
+            user.save()
+        self.assertEqual(Profile.objects.get(user=user).bio, "Hello")
+        self.assertEqual(user.profile.changed_fields(), set())
+
+    def test_old_picture_is_deleted_after_commit_without_a_lookup(self):
+        old = default_storage.save("profile_pics/old.png", ContentFile(b"old"))
+        Profile.objects.filter(user=self.user).update(profile_picture=old)
+        profile = Profile.objects.get(user=self.user)
+        profile.profile_picture = default_storage.save("profile_pics/new.png", ContentFile(b"new"))
+
+        with mock.patch("accounts.signals.run_in_background") as background:
+            with CaptureQueriesContext(connection) as context:
+                profile.save()
+        self.assertFalse(any(
+            query["sql"].startswith("SELECT") and "accounts_profile" in query["sql"]
+            for query in context.captured_queries
+        ))
+        self.assertTrue(default_storage.exists(old))
+        background.assert_called_once_with(default_storage.delete, old)
+        # so orphan cleanup can tell its age on storages without mtimes
+        self.assertEqual(Upload.objects.get(path=profile.profile_picture.name).directory, "profile_pics")
+
+    def test_old_picture_is_scheduled_after_the_update(self):
+        old = default_storage.save("profile_pics/old.png", ContentFile(b"old"))
+        Profile.objects.filter(user=self.user).update(profile_picture=old)
+        profile = Profile.objects.get(user=self.user)
+        profile.profile_picture = default_storage.save("profile_pics/new.png", ContentFile(b"new"))
+
+        stored = []
+        with mock.patch("accounts.signals.run_in_background") as background:
+            background.side_effect = lambda *args: stored.append(
+                Profile.objects.values_list("profile_picture", flat=True).get(pk=profile.pk)
+            )
+            profile.save()
+        self.assertEqual(stored, ["profile_pics/new.png"])
+
+    def test_unchanged_picture_is_kept(self):
+        picture = default_storage.save("profile_pics/me.png", ContentFile(b"me"))
+        Profile.objects.filter(user=self.user).update(profile_picture=picture)
+        profile = Profile.objects.get(user=self.user)
+        profile.bio = "New bio"
+
+        with mock.patch("accounts.signals.run_in_background") as background:
+            profile.save()
+        background.assert_not_called()
+
+
+class UserCardTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="testpass123")
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username="testuser", password="testpass123")
+
+    def test_navbar_avatar_comes_from_cached_card(self):
+        self.client.get(reverse("blog:index"))
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("blog:index"))
+        self.assertContains(response, 'class="profile-pic"')
+        self.assertFalse(any("accounts_profile" in query["sql"] for query in context.captured_queries))
+
+    def test_profile_view_renders_card(self):
+        other = User.objects.create_user(username="other", password="testpass123")
+        response = self.client.get(reverse("accounts:profile", kwargs={"username": "other"}))
+        self.assertEqual(response.context["card"]["id"], other.pk)
+        self.assertContains(response, "<h1>other</h1>")
+        self.assertNotContains(response, "edit profile")
+
+        response = self.client.get(reverse("accounts:own_profile"))
+        self.assertContains(response, "edit profile")
+
+        self.assertEqual(self.client.get(reverse("accounts:profile", kwargs={"username": "nobody"})).status_code, 404)
+
+
+class ProfilePostsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="testpass123")
+        cls.author = User.objects.create_user(username="author", password="testpass123")
+        for i in range(12):
+            Post.objects.create(
+                title=f"Published {i}", content=f"<p>Body of post number {i}</p>",
+                author=cls.author, status="published", likes=1,
+                pub_date=timezone.now() - timedelta(hours=i + 1),
+            )
+        Post.objects.create(title="Secret draft", content="<p>Not yet</p>", author=cls.author, status="draft")
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username="testuser", password="testpass123")
+        self.url = reverse("accounts:profile", kwargs={"username": "author"})
+
+    def test_lists_published_posts_a_page_at_a_time(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, "Published 0")
+        self.assertContains(response, "Body of post number 0")
+        self.assertNotContains(response, "Published 10")
+        self.assertNotContains(response, "Secret draft")
+        self.assertContains(response, "12 posts")
+        self.assertContains(response, "12 likes")
+
+        next_link = re.search(r'\?cursor=([^"]+)"', response.content.decode()).group(1)
+        response = self.client.get(f"{self.url}?cursor={next_link}")
+        self.assertContains(response, "Published 10")
+        self.assertContains(response, "Published 11")
+        self.assertNotContains(response, "Published 9<")
+
+        self.assertEqual(self.client.get(f"{self.url}?cursor=bogus").status_code, 404)
+
+    def test_posts_and_stats_come_from_cache(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertContains(response, "Published 0")
+        self.assertFalse(any("blog_post" in query["sql"] for query in context.captured_queries))
+
+    def test_cache_follows_the_authors_posts(self):
+        self.client.get(self.url)
+        Post.objects.create(
+            title="Fresh post", content="<p>Just written</p>", author=self.author,
+            status="published", pub_date=timezone.now() - timedelta(minutes=1),
+        )
+        response = self.client.get(self.url)
+        self.assertContains(response, "Fresh post")
+        self.assertContains(response, "13 posts")
+
+    def test_older_posts_link_names_the_author(self):
+        # the author reads their own profile first, so it is cached from /profile/
+        self.client.login(username="author", password="testpass123")
+        self.client.get(reverse("accounts:own_profile"))
+        self.client.login(username="testuser", password="testpass123")
+        response = self.client.get(self.url)
+        self.assertContains(response, f'href="{self.url}?cursor=')
@@ -2,38 +2,76 @@ import logging
 from django.contrib.auth import login
 from django.contrib.auth.models import User
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.shortcuts import render, redirect, get_object_or_404
+from django.core.cache import cache
+from django.http import Http404
+from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.safestring import mark_safe
 from django.views.generic import DetailView, UpdateView
 
+from blog.caching import author_listing, listing_key
+from blog.models import Post
+from blog.pagination import InvalidCursor, keyset_page
+
+from .cards import get_card
 from .forms import ProfileForm, SignupForm
 from .models import Profile
+from .stats import author_stats
 
 logger = logging.getLogger(__name__)
 
 # Create your views here.
 class ProfileView(LoginRequiredMixin, DetailView):
-    model = Profile
     template_name = "accounts/profile.html"
-    context_object_name = 'profile_obj' # Renamed to avoid conflict with 'profile' context
+    context_object_name = 'card'
+    page_size = 10
+    posts_timeout = 60 * 5
 
     def get_object(self, queryset=None):
-        # Check if a username is provided in the URL
+        """The author card (see accounts.cards) of the requested or logged-in user."""
         username = self.kwargs.get('username')
         if username:
-            # If username is provided, fetch the User and then their Profile
-            user = get_object_or_404(User, username=username)
-            return user.profile
+            user_id = User.objects.filter(username=username).values_list('pk', flat=True).first()
+            if user_id is None:
+                raise Http404("No such user")
         else:
-            # If no username, return the logged-in user's profile
-            return self.request.user.profile
+            user_id = self.request.user.pk
+        return get_card(user_id)
 
     # override get_context_data method to add additional context data
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["posts"] = self.object.user.posts.all()
+        context["stats"] = author_stats(self.object["id"])
+        context["posts_html"] = self.render_posts(self.request.GET.get("cursor"))
         return context
 
+    def render_posts(self, cursor):
+        """
+        One keyset page of the author's published posts as HTML, cached per
+        author and cursor until one of their posts changes.
+        """
+        user_id = self.object["id"]
+        key = listing_key("profile_posts", author_listing(user_id), cursor)
+        html = cache.get(key)
+        if html is None:
+            posts = Post.objects.filter(
+                author_id=user_id, status="published", pub_date__lte=timezone.now()
+            ).only("id", "title", "slug", "pub_date", "list_excerpt")
+            try:
+                page = keyset_page(posts, cursor, self.page_size)
+            except InvalidCursor:
+                raise Http404("Invalid cursor")
+            html = render_to_string("accounts/_profile_posts.html", {
+                "posts": page.items,
+                "next_cursor": page.next_cursor,
+                "profile_url": reverse('accounts:profile', kwargs={'username': self.object["username"]}),
+            })
+            # bounded so posts scheduled for later still appear on time
+            cache.set(key, html, self.posts_timeout)
+        return mark_safe(html)
+
 class ProfileUpdateView(LoginRequiredMixin, UpdateView):
     model = Profile
     form_class = ProfileForm
@@ -0,0 +1,94 @@
+# type: ignore
+"""
+Sparse fieldsets: ``?fields=title,slug`` limits a response to the named
+fields and ``?expand=content`` adds fields a serializer leaves out by
+default (its ``Meta.expandable_fields``). Unknown names are ignored.
+
+Views narrow their queryset to the fields that remain: ``only()`` the
+columns those fields read and prefetch just the relations they list, so a
+client asking for ``title,slug,pub_date`` never loads post bodies or
+comment rows. Fieldsets apply to reads only; writes answer in full.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def _names(request, param):
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Serializer taking ``fields=`` (names to keep) and ``expand=`` (optional
+    names to add). ``Meta.field_sources`` names the attributes read by
+    fields whose source is the whole object, such as URLs and method fields.
+    """
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        expandable = set(getattr(self.Meta, 'expandable_fields', ()))
+        keep = set(self.fields) - (expandable - set(expand or ()))
+        if fields is not None:
+            keep &= set(fields) | set(expand or ())
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+
+
+def field_sources(serializer):
+    """Attribute paths, e.g. ``('profile', 'bio')``, read by the serializer's fields."""
+    overrides = getattr(serializer.Meta, 'field_sources', {})
+    paths = set()
+    for name, field in serializer.fields.items():
+        if name in overrides:
+            paths.update(tuple(source.split('.')) for source in overrides[name])
+        elif field.source_attrs:
+            paths.add(tuple(field.source_attrs))
+    return paths
+
+
+def narrow_queryset(queryset, serializer, always=()):
+    """
+    Restrict ``queryset`` to the columns and relations the serializer reads,
+    plus the ``always`` columns the view itself needs. Attributes that are
+    not model fields (annotations, properties) are left alone.
+    """
+    opts = queryset.model._meta
+    columns, prefetch = {opts.pk.name, *always}, set()
+    for path in field_sources(serializer):
+        try:
+            field = opts.get_field(path[0])
+        except FieldDoesNotExist:
+            continue
+        if field.many_to_many or field.one_to_many:
+            prefetch.add(field.name)
+        elif field.concrete:
+            columns.add(field.name)
+    return queryset.only(*columns).prefetch_related(*prefetch)
+
+
+class SparseFieldsetMixin:
+    """
+    View mixin reading ``?fields=`` and ``?expand=`` on safe requests and
+    handing them to serializers that use SparseFieldsetSerializerMixin.
+    """
+
+    def sparse_fieldset(self):
+        """``(fields, expand)`` requested by the client; None when not given."""
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in SAFE_METHODS:
+            return None, None
+        return _names(request, FIELDS_PARAM), _names(request, EXPAND_PARAM)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        if issubclass(serializer_class, SparseFieldsetSerializerMixin):
+            fields, expand = self.sparse_fieldset()
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
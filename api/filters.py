@@ -0,0 +1,38 @@
+# type: ignore
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+from accounts.stats import username_prefix
+from blog.search import search_posts
+
+
+class PostSearchFilter(filters.SearchFilter):
+    """
+    ?search= backed by the blog full-text index instead of icontains.
+    Results come back best match first unless ?ordering= is given,
+    so this must run after OrderingFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+
+        ordering = queryset.query.order_by
+        queryset = search_posts(queryset, query)
+
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+
+class UsernamePrefixFilter(filters.SearchFilter):
+    """
+    ?search= as a case-sensitive username prefix match, answered from the
+    unique username index rather than a scan.
+    """
+    search_description = 'Username prefix to match.'
+
+    def filter_queryset(self, request, queryset, view):
+        prefix = request.query_params.get(self.search_param, '').strip()
+        return username_prefix(queryset, prefix)
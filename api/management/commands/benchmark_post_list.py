@@ -0,0 +1,59 @@
+# type: ignore
+import timeit
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.serializers import PostListSerializer, PostListValuesSerializer
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = "Time PostListSerializer against the values() fast path on the same page of posts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size",
+            type=int,
+            default=10,
+            help="Posts per page (default: 10)",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=200,
+            help="Pages serialized per timing (default: 200)",
+        )
+        parser.add_argument(
+            "--host",
+            default="127.0.0.1",
+            help="Host the request is made to; must be in ALLOWED_HOSTS (default: 127.0.0.1)",
+        )
+
+    def handle(self, *args, **options):
+        size, repeat = options["size"], options["repeat"]
+        request = Request(APIRequestFactory().get("/api/posts/", HTTP_HOST=options["host"]))
+        posts = Post.objects.defer("content", "plain_text").order_by("-pub_date", "-id")
+        if not posts.exists():
+            self.stderr.write("No posts to serialize")
+            return
+
+        # both read the page from the database, as the list endpoint does
+        def models():
+            page = list(posts[:size])
+            return JSONRenderer().render(PostListSerializer(page, many=True, context={"request": request}).data)
+
+        def values():
+            page = list(posts.values(*PostListValuesSerializer.value_columns())[:size])
+            return JSONRenderer().render(PostListValuesSerializer(page, context={"request": request}).data)
+
+        if models() != values():
+            self.stderr.write(self.style.WARNING("Outputs differ"))
+
+        slow = min(timeit.repeat(models, number=repeat, repeat=3)) / repeat
+        fast = min(timeit.repeat(values, number=repeat, repeat=3)) / repeat
+        self.stdout.write(f"PostListSerializer:       {slow * 1000:.3f} ms/page")
+        self.stdout.write(f"PostListValuesSerializer: {fast * 1000:.3f} ms/page")
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {slow / fast:.1f}x"))
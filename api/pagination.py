@@ -0,0 +1,87 @@
+# type: ignore
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
+
+from blog.pagination import InvalidCursor, keyset_page
+from blog.threads import COMMENTS_PAGE_SIZE, thread_page
+
+
+class PostKeysetPagination(CursorPagination):
+    """
+    Cursor pagination over posts by (pub_date, id), newest first.
+    Pages are read with a keyset filter, so there is no COUNT(*) or OFFSET
+    and deep pages cost the same as the first one.
+
+    Requests that sort by something else (?ordering=) or rank search results
+    (?search=) keep their order and fall back to page numbers.
+    """
+    ordering = ('-pub_date', '-id')
+    fallback_params = ('ordering', 'search')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.fallback = None
+
+        if any(request.query_params.get(param) for param in self.fallback_params):
+            self.fallback = PageNumberPagination()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        try:
+            self.page = keyset_page(queryset, cursor, page_size)
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+
+        self.base_url = request.build_absolute_uri()
+        return self.page.items
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self._link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self._link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.fallback is not None:
+            return self.fallback.get_html_context()
+        return super().get_html_context()
+
+
+class CommentThreadPagination(PostKeysetPagination):
+    """
+    Pages of a post's top-level comment threads, newest first, each with
+    its replies nested to blog.threads.REPLY_DEPTH; the same pages and
+    cursors as the first page embedded in the post. See blog.threads.
+    """
+    ordering = ('path',)
+    page_size = COMMENTS_PAGE_SIZE
+    fallback_params = ()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.fallback = None
+        cursor = request.query_params.get(self.cursor_query_param)
+        try:
+            self.page = thread_page(queryset, cursor, self.get_page_size(request))
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+
+        self.base_url = request.build_absolute_uri()
+        return [comment for comment in self.page.items if comment.depth == 0]
+
+
+class UsernameCursorPagination(CursorPagination):
+    """Cursor pagination over users by their unique username."""
+    ordering = ('username',)
@@ -15,7 +15,7 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        return obj.author == request.user
+        return obj.author_id == request.user.id
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
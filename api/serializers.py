@@ -1,21 +1,56 @@
 # type: ignore
+from operator import itemgetter
+
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
 from rest_framework.reverse import reverse
+from rest_framework.utils.urls import replace_query_param
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from django.utils import timezone
 from django.db import transaction
+from django.utils import timezone
 
+from accounts.cards import get_cards
 from accounts.models import Profile
+from api.fieldsets import SparseFieldsetSerializerMixin
+from blog.likes import has_liked
 from blog.models import Comment, Post
+from blog.renditions import rendition_urls
+from blog.threads import thread_page
+from blog.uploads import staged_url
+
+
+class RenditionsField(serializers.ReadOnlyField):
+    """
+    Resized copies of an image (see blog.renditions): its size, a placeholder
+    data URI and the URL of each width per format; null until generated.
+    """
+    def to_representation(self, value):
+        return rendition_urls(value)
+
+
+class StagedImageField(serializers.ImageField):
+    """
+    Image URL that also works while the file still sits in the staging
+    storage, waiting for its transfer (see blog.uploads).
+    """
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = staged_url(value.name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
 
 
 class ProfileSerializer(serializers.ModelSerializer):
     """
     Serializer for Profile model (bio, picture)
     """
+    profile_picture_renditions = RenditionsField()
+
     class Meta:
         model = Profile
-        fields = ['bio', 'profile_picture']
+        fields = ['bio', 'profile_picture', 'profile_picture_renditions']
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -48,22 +83,24 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserDetailSerializer(serializers.ModelSerializer):
+class UserDetailSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Detailed serializer for User
     """
     bio = serializers.CharField(source='profile.bio', allow_blank=True, required=False)
     profile_picture = serializers.ImageField(source='profile.profile_picture', allow_null=True, required=False)
-    posts_count = serializers.SerializerMethodField()
+    profile_picture_renditions = RenditionsField(source='profile.profile_picture_renditions')
+    # annotated by accounts.stats.with_author_stats
+    posts_count = serializers.IntegerField(source='published_posts_count', read_only=True)
+    total_likes = serializers.IntegerField(read_only=True)
+    total_views = serializers.IntegerField(read_only=True)
     posts_url = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ['username', 'email', 'bio', 'profile_picture', 'date_joined', 'last_login', 'posts_url', 'posts_count']
+        fields = ['username', 'email', 'bio', 'profile_picture', 'profile_picture_renditions', 'date_joined', 'last_login', 'posts_url', 'posts_count', 'total_likes', 'total_views']
         read_only_fields = ['username', 'email', 'last_login', 'date_joined']
-
-    def get_posts_count(self, obj):
-        return obj.posts.filter(status='published', pub_date__lte=timezone.now()).count()
+        field_sources = {'posts_url': ['username']}
 
     def get_posts_url(self, obj):
         request = self.context.get('request')
@@ -84,7 +121,8 @@ class UserDetailSerializer(serializers.ModelSerializer):
         if 'profile_picture' in profile_data:
             profile.profile_picture = profile_data['profile_picture']
 
-        profile.save()
+        if profile.changed_fields():
+            profile.save()
 
         return super().update(instance, validated_data)
 
@@ -100,17 +138,59 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['username', 'profile']
 
 
-class UserListSerializer(serializers.ModelSerializer):
+def author_representation(card, request=None):
+    """What UserSerializer gives for the card's user, built from the card alone."""
+    if card is None:
+        return None
+    profile = card['profile']
+    if profile is not None and profile['profile_picture'] and request is not None:
+        profile = {**profile, 'profile_picture': request.build_absolute_uri(profile['profile_picture'])}
+    return {'username': card['username'], 'profile': profile}
+
+
+@extend_schema_field(UserSerializer)
+class AuthorCardField(serializers.ReadOnlyField):
+    """
+    The author in UserSerializer's shape, read from the card cache by user
+    id, so posts and comments need no author or profile join. Cards are
+    memoized in the serializer context for the whole response.
+    """
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'author_id')
+        super().__init__(**kwargs)
+
+    def to_representation(self, user_id):
+        cards = self.context.setdefault('author_cards', {})
+        if user_id not in cards:
+            cards.update(get_cards([user_id]))
+        return author_representation(cards.get(user_id), self.context.get('request'))
+
+
+class AuthorCardListSerializer(serializers.ListSerializer):
+    """Fetch the author cards of a whole list with one cache round trip."""
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        cards = self.context.setdefault('author_cards', {})
+        cards.update(get_cards({item.author_id for item in items} - cards.keys()))
+        return super().to_representation(items)
+
+
+class UserListSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Simple serializer for listing users
     """
     profile = ProfileSerializer(read_only=True)
     profile_url = serializers.SerializerMethodField()
     posts_url = serializers.SerializerMethodField()
+    # annotated by accounts.stats.with_author_stats
+    posts_count = serializers.IntegerField(source='published_posts_count', read_only=True)
+    total_likes = serializers.IntegerField(read_only=True)
+    total_views = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = User
-        fields = ['username', 'profile', 'profile_url', 'posts_url']
+        fields = ['username', 'profile', 'profile_url', 'posts_url', 'posts_count', 'total_likes', 'total_views']
+        field_sources = {'posts_url': ['username'], 'profile_url': ['username']}
     
     def get_posts_url(self, obj):
         request = self.context.get('request')
@@ -132,13 +212,32 @@ class CommentSerializer(serializers.ModelSerializer):
     """
     Serializer for Comment model.
     author is read-only because we set it automatically from request.user
+    replies nests the replies loaded with the comment (see blog.threads.nest);
+    replies_url lists the ones left out.
     """
-    author = UserSerializer(read_only=True)
+    author = AuthorCardField()
+    replies = serializers.SerializerMethodField()
+    replies_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
-        fields = ['content', 'author', 'created_date', 'approved']
-        read_only_fields = ['created_date', 'approved']
+        fields = [
+            'id', 'parent', 'content', 'author', 'created_date', 'approved',
+            'depth', 'reply_count', 'replies', 'replies_url',
+        ]
+        read_only_fields = ['parent', 'created_date', 'approved']
+        list_serializer_class = AuthorCardListSerializer
+
+    @extend_schema_field({'type': 'array', 'items': {'$ref': '#/components/schemas/Comment'}})
+    def get_replies(self, obj):
+        return CommentSerializer(getattr(obj, 'thread_replies', []), many=True, context=self.context).data
+
+    @extend_schema_field(OpenApiTypes.URI)
+    def get_replies_url(self, obj):
+        if not getattr(obj, 'more_replies', False):
+            return None
+        url = reverse('api:post-comment', kwargs={'slug': self.context['post_slug']}, request=self.context.get('request'))
+        return replace_query_param(url, 'thread', obj.pk)
 
 
 class CommentCreateSerializer(serializers.ModelSerializer):
@@ -146,9 +245,18 @@ class CommentCreateSerializer(serializers.ModelSerializer):
     Serializer for creating comments.
     post and author are set in the view, not by user input.
     """
+    parent = serializers.PrimaryKeyRelatedField(
+        queryset=Comment.objects.filter(approved=True), required=False, allow_null=True
+    )
+
     class Meta:
         model = Comment
-        fields = ['content']
+        fields = ['content', 'parent']
+
+    def validate_parent(self, value):
+        if value is not None and value.post_id != self.context['post'].pk:
+            raise serializers.ValidationError("Replies must be on the same post")
+        return value
 
     def validate_content(self, value):
         if not value or not value.strip():
@@ -156,14 +264,15 @@ class CommentCreateSerializer(serializers.ModelSerializer):
         return value
 
 
-class PostListSerializer(serializers.ModelSerializer):
+class PostListSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Lightweight serializer for listing posts.
-    Does not include full content or comments
+    Does not include full content (unless ?expand=content) or comments
     """
-    author = UserSerializer(read_only=True)
-    comments_count = serializers.SerializerMethodField()
-    excerpt = serializers.SerializerMethodField()
+    author = AuthorCardField()
+    comments_count = serializers.IntegerField(source='approved_comments_count', read_only=True)
+    featured_image = StagedImageField(read_only=True, allow_null=True)
+    featured_image_renditions = RenditionsField()
     url = serializers.HyperlinkedIdentityField(
         view_name='api:post-detail',
         lookup_field='slug',
@@ -176,7 +285,7 @@ class PostListSerializer(serializers.ModelSerializer):
             'url',
             'title',
             'slug',
-            'excerpt', # short preview instead of full content
+            'excerpt', # short preview stored at save time, not full content
             'author',
             'status',
             'pub_date',
@@ -185,31 +294,126 @@ class PostListSerializer(serializers.ModelSerializer):
             'likes',
             'comments_count',
             'featured_image',
+            'featured_image_renditions',
+            'content',
         ]
+        expandable_fields = ['content']
+        field_sources = {'url': ['slug']}
+        list_serializer_class = AuthorCardListSerializer
 
-    def get_comments_count(self, obj) -> int:
-        """Count approved comments only"""
-        return len([comment for comment in obj.comments.all() if comment.approved])
 
-    def get_excerpt(self, obj) -> str:
-        """Get the first 100 characters of the content as preview"""
-        # Strip HTML tags for clean excerpt
-        from django.utils.html import strip_tags
-        cleaned_content = strip_tags(obj.content)
+class PostListValuesSerializer:
+    """
+    Read-only fast path producing exactly the JSON of PostListSerializer
+    from ``.values(*PostListValuesSerializer.value_columns(fields))`` rows.
+
+    Everything that does not depend on the row (the detail URL around the
+    slug, the timezone, the author cards of the page) is worked out once,
+    so each row is a plain dict build with no DRF fields or reverse().
+    """
+    # output field -> columns it is built from, in PostListSerializer order
+    columns = {
+        'url': ['slug'],
+        'title': ['title'],
+        'slug': ['slug'],
+        'excerpt': ['excerpt'],
+        'author': ['author_id'],
+        'status': ['status'],
+        'pub_date': ['pub_date'],
+        'views_count': ['views_count'],
+        'reading_time': ['reading_time'],
+        'likes': ['likes'],
+        'comments_count': ['approved_comments_count'],
+        'featured_image': ['featured_image'],
+        'featured_image_renditions': ['featured_image_renditions'],
+    }
+    slug_placeholder = 'post-slug'
+
+    def __init__(self, rows, context=None, fields=None):
+        self.rows = rows
+        self.context = context or {}
+        self.fields = [name for name in self.columns if fields is None or name in fields]
+
+    @classmethod
+    def value_columns(cls, fields=None):
+        """Columns to pass to values() for ``fields``; keyset pagination needs id and pub_date."""
+        names = [name for name in cls.columns if fields is None or name in fields]
+        return list(dict.fromkeys(['id', 'pub_date', *(column for name in names for column in cls.columns[name])]))
+
+    def _url_template(self):
+        # slugs are ASCII slugify() output, so they need no quoting
+        url = reverse(
+            'api:post-detail',
+            kwargs={'slug': self.slug_placeholder},
+            request=self.context.get('request'),
+            format=self.context.get('format'),
+        )
+        return url.split(self.slug_placeholder, 1)
+
+    def _converters(self, rows):
+        request = self.context.get('request')
+        url_prefix, url_suffix = self._url_template()
+        tz = timezone.get_current_timezone()
+        cards = self.context.setdefault('author_cards', {})
+        if 'author' in self.fields:
+            cards.update(get_cards({row['author_id'] for row in rows} - cards.keys()))
+
+        def url(row):
+            return url_prefix + row['slug'] + url_suffix
+
+        def author(row):
+            return author_representation(cards.get(row['author_id']), request)
+
+        def pub_date(row):
+            value = row['pub_date']
+            if not value:
+                return None
+            value = value.astimezone(tz).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+
+        def featured_image(row):
+            name = row['featured_image']
+            if not name:
+                return None
+            image = staged_url(name)
+            return request.build_absolute_uri(image) if request is not None else image
+
+        def featured_image_renditions(row):
+            return rendition_urls(row['featured_image_renditions'])
+
+        special = {
+            'url': url,
+            'author': author,
+            'pub_date': pub_date,
+            'featured_image': featured_image,
+            'featured_image_renditions': featured_image_renditions,
+        }
+        return [
+            (name, special.get(name) or itemgetter(self.columns[name][0]))
+            for name in self.fields
+        ]
 
-        if len(cleaned_content) > 100:
-            return cleaned_content[:100] + '...'
-        return cleaned_content
+    @property
+    def data(self):
+        rows = list(self.rows)
+        converters = self._converters(rows)
+        return [{name: convert(row) for name, convert in converters} for row in rows]
 
 
-class PostDetailSerializer(serializers.ModelSerializer):
+class PostDetailSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Full serializer for a single post view.
-    Includes full content, comments, etc.
+    Includes full content, the first page of comments, etc.; comments_next
+    links to the rest.
     """
-    author = UserSerializer(read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
-    comments_count = serializers.SerializerMethodField()
+    author = AuthorCardField()
+    comments = serializers.SerializerMethodField()
+    comments_next = serializers.SerializerMethodField()
+    comments_count = serializers.IntegerField(source='approved_comments_count', read_only=True)
+    featured_image = StagedImageField(read_only=True, allow_null=True)
+    featured_image_renditions = RenditionsField()
     is_liked = serializers.SerializerMethodField()
     is_author = serializers.SerializerMethodField()
 
@@ -230,7 +434,9 @@ class PostDetailSerializer(serializers.ModelSerializer):
             'is_liked',
             'is_author',
             'featured_image', 
+            'featured_image_renditions',
             'comments',
+            'comments_next',
             'comments_count'
         ]
         read_only_fields = [
@@ -241,22 +447,40 @@ class PostDetailSerializer(serializers.ModelSerializer):
             'views_count', 
             'likes'
         ]
-
-    def get_comments_count(self, obj) -> int:
-        return len([comment for comment in obj.comments.all() if comment.approved])
+        field_sources = {'is_liked': [], 'is_author': ['author_id'], 'comments': [], 'comments_next': ['slug']}
+
+    def comment_page(self, obj):
+        """The first page of comment threads, read once for both comment fields."""
+        pages = self.context.setdefault('comment_pages', {})
+        if obj.pk not in pages:
+            pages[obj.pk] = thread_page(Comment.objects.filter(post_id=obj.pk, approved=True))
+        return pages[obj.pk]
+
+    @extend_schema_field(CommentSerializer(many=True))
+    def get_comments(self, obj):
+        threads = [comment for comment in self.comment_page(obj).items if comment.depth == 0]
+        return CommentSerializer(threads, many=True, context={**self.context, 'post_slug': obj.slug}).data
+
+    @extend_schema_field(OpenApiTypes.URI)
+    def get_comments_next(self, obj):
+        cursor = self.comment_page(obj).next_cursor
+        if cursor is None:
+            return None
+        url = reverse('api:post-comment', kwargs={'slug': obj.slug}, request=self.context.get('request'))
+        return replace_query_param(url, 'cursor', cursor)
 
     def get_is_liked(self, obj) -> bool:
         """Check if current user has liked this post"""
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.liked_by.filter(id=request.user.id).exists()
+        if request:
+            return has_liked(request.user, obj.pk)
         return False
 
     def get_is_author(self, obj) -> bool:
         """Check if current user is the author (for edit/delete permissions)"""
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.author == request.user
+            return obj.author_id == request.user.id
         return False
 
 
@@ -1,21 +1,24 @@
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from django.core.cache import cache
-from blog.models import Post
+
+from blog.caching import invalidate_post
+from blog.models import Comment, Post
+from blog.signals import deletes_post_of
 
 @receiver([post_save, post_delete], sender=Post)
 def invalidate_post_cache(sender, instance, **kwargs):
     """
     Invalidate cache when a post is modified
     """
-    # This works on all cache types
-    cache.delete(f"post_detail_{instance.slug}") 
+    # bumping generations orphans the old keys; works on every cache backend
+    invalidate_post(instance.pk, instance.author_id)
+
 
-    # This check prevents the crash! 
-    # It asks: "Do you know how to delete_pattern?"
-    if hasattr(cache, "delete_pattern"):
-        cache.delete_pattern("*post_list*")
-    else:
-        # Fallback for basic caches (like the one on Render right now)
-        # We just clear the whole cache to be safe, or you can pass
-        cache.clear()
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_comment_cache(sender, instance, origin=None, **kwargs):
+    """
+    Comments are embedded in the cached post detail
+    """
+    # a post deleted along with them drops its own entries
+    if origin is None or not deletes_post_of(instance, origin):
+        invalidate_post(instance.post_id)
@@ -0,0 +1,329 @@
+# type: ignore
+from unittest import mock
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.cards import get_card
+from blog.counters import flush_views
+from blog.likes import toggle_like
+from blog.caching import POSTS_LISTING, hit_rate, listing_generation, post_key, reset_hit_rate
+from blog.models import Comment, Post
+
+
+class PostCacheInvalidationTestCase(APITestCase):
+    """
+    Test generation-based invalidation of cached post data
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.post = Post.objects.create(
+            title='Cached Post',
+            content='Content that ends up in the cache.',
+            author=self.user,
+            status='published',
+        )
+
+    def test_post_save_keeps_unrelated_cache_entries(self):
+        """Saving a post no longer clears the whole cache"""
+        cache.set('unrelated', 'still here')
+        self.post.title = 'Renamed'
+        self.post.save()
+        self.assertEqual(cache.get('unrelated'), 'still here')
+
+    def test_post_save_changes_detail_key(self):
+        key = post_key('post_detail', self.post.pk)
+        self.post.save()
+        self.assertNotEqual(post_key('post_detail', self.post.pk), key)
+
+    def test_detail_cache_invalidated_on_update(self):
+        response = self.client.get(f'/api/posts/{self.post.slug}/')
+        self.assertEqual(response.data['title'], 'Cached Post')
+
+        self.post.title = 'Updated Title'
+        self.post.save()
+
+        response = self.client.get(f'/api/posts/{self.post.slug}/')
+        self.assertEqual(response.data['title'], 'Updated Title')
+
+    def test_detail_cache_invalidated_on_new_comment(self):
+        self.client.get(f'/api/posts/{self.post.slug}/')
+        Comment.objects.create(post=self.post, author=self.user, content='First!')
+
+        response = self.client.get(f'/api/posts/{self.post.slug}/')
+        self.assertEqual(response.data['comments_count'], 1)
+
+    def test_list_cache_invalidated_on_new_post(self):
+        response = self.client.get('/api/posts/')
+        self.assertEqual(len(response.data['results']), 1)
+
+        generation = listing_generation(POSTS_LISTING)
+        Post.objects.create(
+            title='Second Post',
+            content='Another post to list.',
+            author=self.user,
+            status='published',
+        )
+        self.assertNotEqual(listing_generation(POSTS_LISTING), generation)
+
+        response = self.client.get('/api/posts/')
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_list_cache_hit_skips_queries(self):
+        self.client.get('/api/posts/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/posts/')
+        self.assertEqual(len(response.data['results']), 1)
+
+
+class AuthorCardTestCase(APITestCase):
+    """
+    Test that post and comment authors come from the author card cache
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            User.objects.create_user(username=f'author{i}', password='testpass123') for i in range(3)
+        ]
+        for user in self.users:
+            user.profile.bio = f'Bio of {user.username}'
+            user.profile.save()
+            Post.objects.create(title=f'Post by {user.username}', content='Body text.', author=user, status='published')
+
+    def test_list_reads_authors_from_cards(self):
+        response = self.client.get('/api/posts/')
+        self.assertEqual(
+            response.data['results'][0]['author'],
+            {'username': 'author2', 'profile': {
+                'bio': 'Bio of author2', 'profile_picture': None, 'profile_picture_renditions': None,
+            }},
+        )
+
+        # a different query string misses the list cache but not the cards
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/api/posts/?status=published')
+        self.assertFalse(any('accounts_profile' in query['sql'] for query in context.captured_queries))
+
+    def test_comment_authors_share_one_card_lookup(self):
+        post = Post.objects.first()
+        for user in self.users:
+            Comment.objects.create(post=post, author=user, content='Nice', approved=True)
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f'/api/posts/{post.slug}/comments/')
+        self.assertEqual([c['author']['username'] for c in response.data['results']], ['author2', 'author1', 'author0'])
+        profile_queries = [q for q in context.captured_queries if 'accounts_profile' in q['sql']]
+        self.assertEqual(len(profile_queries), 1)
+
+    def test_card_refreshes_when_profile_changes(self):
+        user = self.users[0]
+        self.assertEqual(get_card(user.pk)['bio'], 'Bio of author0')
+        user.profile.bio = 'Changed'
+        user.profile.save()
+        self.assertEqual(get_card(user.pk)['bio'], 'Changed')
+
+
+class SharedPostListCacheTestCase(APITestCase):
+    """
+    Test the post list cache shared by all viewers and the per-author draft query
+    """
+
+    def setUp(self):
+        cache.clear()
+        reset_hit_rate('post_list')
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.reader = User.objects.create_user(username='reader', password='testpass123')
+        now = timezone.now()
+        for i in range(12):
+            Post.objects.create(
+                title=f'Published {i}', content='Body text.', author=self.author,
+                status='published', pub_date=now - timedelta(hours=i * 2 + 1),
+            )
+        # one draft within each page of ten
+        for hours in (4, 20):
+            Post.objects.create(
+                title=f'Draft {hours}h', content='Body text.', author=self.author,
+                status='draft', pub_date=now - timedelta(hours=hours),
+            )
+
+    def titles(self, response):
+        return [post['title'] for post in response.data['results']]
+
+    def test_one_entry_serves_every_viewer(self):
+        self.assertEqual(self.client.get('/api/posts/')['X-Cache'], 'MISS')
+
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get('/api/posts/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertFalse(any(title.startswith('Draft') for title in self.titles(response)))
+
+        self.client.force_authenticate(user=self.author)
+        self.assertNotIn('X-Cache', self.client.get('/api/posts/'))
+
+        self.assertEqual(hit_rate('post_list'), {'hits': 1, 'misses': 1, 'rate': 1 / 2})
+
+    def test_drafts_paged_with_published_posts(self):
+        self.client.force_authenticate(user=self.author)
+        first = self.client.get('/api/posts/')
+        self.assertEqual(self.titles(first)[:3], ['Published 0', 'Published 1', 'Draft 4h'])
+        self.assertEqual(len(first.data['results']), 10)
+
+        second = self.client.get(first.data['next'])
+        titles = self.titles(first) + self.titles(second)
+        self.assertEqual(titles.count('Draft 4h') + titles.count('Draft 20h'), 2)
+        self.assertEqual(len(titles), 14)
+        self.assertEqual(titles[-1], 'Published 11')
+
+    def test_many_old_drafts_keep_the_page_size(self):
+        long_ago = timezone.now() - timedelta(days=30)
+        Post.objects.bulk_create(
+            Post(title=f'Old draft {i}', content='Body text.', author=self.author,
+                 status='draft', pub_date=long_ago - timedelta(minutes=i))
+            for i in range(60)
+        )
+        self.client.force_authenticate(user=self.author)
+        response = self.client.get('/api/posts/?status=draft')
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNotNone(response.data['next'])
+
+        seen, url = 0, '/api/posts/'
+        while url:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.data['results']), 10)
+            seen += len(response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, 74)
+
+    def test_viewer_without_drafts_adds_no_queries(self):
+        self.client.get('/api/posts/')
+        self.client.force_authenticate(user=self.reader)
+        self.client.get('/api/posts/')
+        with self.assertNumQueries(0):
+            self.client.get('/api/posts/')
+
+    def test_search_still_includes_own_drafts(self):
+        self.client.force_authenticate(user=self.author)
+        response = self.client.get('/api/posts/?search=Draft')
+        self.assertIn('Draft 4h', self.titles(response))
+
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get('/api/posts/?search=Draft')
+        self.assertNotIn('Draft 4h', self.titles(response))
+
+    def test_new_draft_shows_up(self):
+        self.client.force_authenticate(user=self.reader)
+        self.client.get('/api/posts/')
+        Post.objects.create(title='Fresh draft', content='Body text.', author=self.reader, status='draft')
+        self.assertIn('Fresh draft', self.titles(self.client.get('/api/posts/')))
+
+
+class ConditionalRequestTestCase(APITestCase):
+    """
+    Test ETag / Last-Modified validators and 304 responses on the post endpoints
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.post = Post.objects.create(
+            title='Validated Post', content='Content that gets revalidated.', author=self.user,
+            status='published', pub_date=timezone.now() - timedelta(hours=1),
+        )
+        self.url = f'/api/posts/{self.post.slug}/'
+
+    def test_retrieve_304_counts_the_view(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Cache-Control'], 'public, no-cache')
+
+        with CaptureQueriesContext(connection) as context:
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        self.assertEqual(len(context.captured_queries), 1)
+        flush_views()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 2)
+
+    def test_retrieve_etag_follows_likes_and_viewer(self):
+        etag = self.client.get(self.url)['ETag']
+        toggle_like(self.post, self.user)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['likes'], 1)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_liked'])
+        self.assertIn('private', response['Cache-Control'])
+
+        etag = self.client.get(self.url + '?fields=title')['ETag']
+        self.assertNotEqual(etag, response['ETag'])
+
+    def test_retrieve_follows_the_author_card(self):
+        etag = self.client.get(self.url)['ETag']
+        self.user.username = 'renamed'
+        self.user.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['author']['username'], 'renamed')
+
+        profile = self.user.profile
+        profile.bio = 'A new bio'
+        profile.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['author']['profile']['bio'], 'A new bio')
+
+    def test_list_304_until_a_post_changes(self):
+        response = self.client.get('/api/posts/')
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        Post.objects.create(title='Newer Post', content='Fresh content.', author=self.user, status='published')
+        response = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_list_etag_follows_likes(self):
+        etag = self.client.get('/api/posts/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            toggle_like(self.post, self.user)
+        response = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['likes'], 1)
+
+    def test_list_etag_follows_scheduled_posts(self):
+        scheduled = Post.objects.create(
+            title='Scheduled Post', content='Goes live soon.', author=self.user,
+            status='published', pub_date=timezone.now() + timedelta(minutes=5),
+        )
+        etag = self.client.get('/api/posts/')['ETag']
+        self.assertEqual(self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Post.objects.filter(pk=scheduled.pk).update(pub_date=timezone.now() - timedelta(seconds=1))
+        later = timezone.now() + timedelta(minutes=6)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            response = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Scheduled Post', [post['title'] for post in response.data['results']])
+
+    def test_list_etag_follows_own_drafts(self):
+        self.client.force_authenticate(user=self.user)
+        etag = self.client.get('/api/posts/')['ETag']
+        Post.objects.create(title='Secret Draft', content='Not public.', author=self.user, status='draft')
+        response = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Secret Draft', [post['title'] for post in response.data['results']])
@@ -1,5 +1,23 @@
-from django.test import TestCase
-from api.serializers import PostCreateUpdateSerializer, CommentCreateSerializer
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from accounts.models import Profile
+from api.serializers import (
+    CommentCreateSerializer,
+    PostCreateUpdateSerializer,
+    PostListSerializer,
+    PostListValuesSerializer,
+)
+from blog.models import Post
 
 class SerializerTestCase(TestCase):
     def test_post_serializer_validation(self):
@@ -42,3 +60,71 @@ class SerializerTestCase(TestCase):
         serializer = CommentCreateSerializer(data={'content': ''})
         self.assertFalse(serializer.is_valid())
         self.assertIn('content', serializer.errors)
+
+
+@override_settings(STORAGES={
+    **settings.STORAGES,
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+})
+class PostListValuesSerializerTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', password='testpass123')
+        Profile.objects.filter(user=cls.author).update(bio='Writes things', profile_picture='profile_pics/me.jpg')
+        other = User.objects.create_user(username='other', password='testpass123')
+
+        cls.with_image = Post.objects.create(
+            title='With image', content='<p>Illustrated post body</p>', author=cls.author,
+            status='published', pub_date=timezone.now() - timedelta(days=1),
+        )
+        Post.objects.filter(pk=cls.with_image.pk).update(
+            featured_image='featured_images/cover.jpg',
+            featured_image_renditions={
+                'source': 'featured_images/cover.jpg', 'width': 800, 'height': 600,
+                'placeholder': 'data:image/jpeg;base64,AAAA',
+                'sources': {'jpeg': [[320, 'renditions/featured_images/cover/320w.jpg']],
+                            'webp': [[320, 'renditions/featured_images/cover/320w.webp']]},
+            },
+        )
+        Post.objects.create(title='Draft', content='<p>Not out yet</p>', author=other, status='draft')
+
+    def setUp(self):
+        cache.clear()
+
+    def render_both(self, **context):
+        request = Request(APIRequestFactory().get('/api/posts/'))
+        posts = Post.objects.order_by('-id')
+        expected = PostListSerializer(posts, many=True, context={'request': request, **context}).data
+        actual = PostListValuesSerializer(
+            posts.values(*PostListValuesSerializer.value_columns()), context={'request': request, **context}
+        ).data
+        return JSONRenderer().render(expected), JSONRenderer().render(actual)
+
+    def test_matches_post_list_serializer_byte_for_byte(self):
+        expected, actual = self.render_both()
+        self.assertIn(b'/api/posts/with-image/', actual)
+        self.assertIn(b'cover.jpg', actual)
+        self.assertEqual(actual, expected)
+
+    def test_matches_with_format_suffix(self):
+        expected, actual = self.render_both(format='json')
+        self.assertIn(b'/api/posts/with-image.json', actual)
+        self.assertEqual(actual, expected)
+
+    def test_list_endpoint_builds_no_post_instances(self):
+        with mock.patch.object(Post, 'from_db', side_effect=AssertionError('model instance built')):
+            response = self.client.get('/api/posts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([post['slug'] for post in response.json()['results']], ['with-image'])
+
+    def test_staged_featured_image_links_to_the_staging_storage(self):
+        Post.objects.filter(pk=self.with_image.pk).update(featured_image='staging/featured_images/cover.jpg')
+        staging = {**settings.STORAGES, 'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                   'staging': {'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                               'OPTIONS': {'base_url': '/staged/'}}}
+        with override_settings(STORAGES=staging):
+            expected, actual = self.render_both()
+            detail = self.client.get('/api/posts/with-image/').json()
+        self.assertIn(b'http://testserver/staged/staging/featured_images/cover.jpg', actual)
+        self.assertEqual(actual, expected)
+        self.assertEqual(detail['featured_image'], 'http://testserver/staged/staging/featured_images/cover.jpg')
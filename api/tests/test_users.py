@@ -4,7 +4,10 @@ from PIL import Image
 from django.contrib.auth.models import User
 from rest_framework.test import APITestCase
 from rest_framework import status
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from accounts.models import Profile
+from blog.models import Post
 
 def get_temporary_image(name='test_image.png'):
     """
@@ -153,3 +156,65 @@ class UserListTestCase(APITestCase):
         response = self.client.get('/api/users/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertGreaterEqual(len(response.data), 2)
+
+
+class UserDirectoryTestCase(APITestCase):
+    """
+    Test the annotated user list and detail endpoints
+    """
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', 'a@e.com', 'pass')
+        Post.objects.create(title='One', content='Body', author=self.alice, status='published', likes=3, views_count=10)
+        Post.objects.create(title='Two', content='Body', author=self.alice, status='published', likes=2, views_count=5)
+        Post.objects.create(title='Draft', content='Body', author=self.alice, status='draft', likes=7, views_count=7)
+        for name in ['alfred', 'bob', 'carol']:
+            User.objects.create_user(name, f'{name}@e.com', 'pass')
+
+    def list_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(context.captured_queries)
+
+    def test_stats_count_published_posts_only(self):
+        response = self.client.get('/api/users/alice/')
+        self.assertEqual(response.data['posts_count'], 2)
+        self.assertEqual(response.data['total_likes'], 5)
+        self.assertEqual(response.data['total_views'], 15)
+
+        response = self.client.get('/api/users/')
+        carol = next(user for user in response.data['results'] if user['username'] == 'carol')
+        self.assertEqual((carol['posts_count'], carol['total_likes'], carol['total_views']), (0, 0, 0))
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        _, few = self.list_queries('/api/users/')
+        for i in range(10):
+            User.objects.create_user(f'user{i}', f'user{i}@e.com', 'pass')
+        _, many = self.list_queries('/api/users/')
+        self.assertEqual(few, many)
+        self.assertEqual(many, 1)
+
+    def test_fields_skip_unused_joins(self):
+        response, _ = self.list_queries('/api/users/alice/?fields=username,posts_count')
+        self.assertEqual(response.data, {'username': 'alice', 'posts_count': 2})
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/users/?fields=username')
+        self.assertEqual(response.data['results'][0], {'username': 'alfred'})
+        sql = ' '.join(query['sql'] for query in context.captured_queries)
+        self.assertNotIn('blog_post', sql)
+        self.assertNotIn('accounts_profile', sql)
+
+    def test_prefix_search_and_cursor_pages(self):
+        response = self.client.get('/api/users/?search=al')
+        self.assertEqual([user['username'] for user in response.data['results']], ['alfred', 'alice'])
+
+        for i in range(10):
+            User.objects.create_user(f'user{i}', f'user{i}@e.com', 'pass')
+        first = self.client.get('/api/users/')
+        self.assertEqual(len(first.data['results']), 10)
+        second = self.client.get(first.data['next'])
+        names = [user['username'] for user in first.data['results'] + second.data['results']]
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(len(names), 14)
@@ -1,17 +1,22 @@
 # type: ignore
 from django.contrib.auth.models import User
-from django.db.models import Q
+from django.db.models import Min, Q
 from django.utils import timezone
 from drf_spectacular.utils import extend_schema
-from rest_framework import generics, viewsets, filters, status
+from rest_framework import generics, viewsets, filters, serializers, status
 from rest_framework.decorators import action, api_view
 from rest_framework.permissions import  AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
-from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiParameter
+from drf_spectacular.utils import extend_schema_view, extend_schema, inline_serializer, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
 
+from accounts.cards import get_card
+from accounts.stats import with_author_stats
+from api.fieldsets import SparseFieldsetMixin, field_sources, narrow_queryset
+from api.filters import PostSearchFilter, UsernamePrefixFilter
+from api.pagination import CommentThreadPagination, PostKeysetPagination, UsernameCursorPagination
 from api.permissions import IsAuthorOrReadOnly
 from api.serializers import (
     CommentCreateSerializer,
@@ -19,14 +24,16 @@ from api.serializers import (
     PostCreateUpdateSerializer,
     PostDetailSerializer,
     PostListSerializer,
+    PostListValuesSerializer,
     UserDetailSerializer,
     UserListSerializer,
     UserRegistrationSerializer,
 )
+from blog.caching import POSTS_LISTING, author_listing, listing_generation, listing_key, post_key, record_lookup
+from blog.conditional import digest, listing_etag, not_modified, post_etag, set_validators
+from blog.likes import has_liked, toggle_like
 from blog.models import Comment, Post
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
-from django.views.decorators.vary import vary_on_cookie, vary_on_headers
+from blog.threads import subtree
 from django.core.cache import cache
 
 # Create your views here.
@@ -76,16 +83,46 @@ class RegisterView(generics.CreateAPIView):
     permission_classes = [AllowAny]
 
 
-class UserListView(generics.ListAPIView):
+STATS_SOURCES = {'published_posts_count', 'total_likes', 'total_views'}
+
+
+def user_queryset(sources=None):
+    """
+    Users with their profile and published-post stats, all in one query.
+    ``sources`` (see api.fieldsets.field_sources) drops the profile join or
+    the stats aggregation when no requested field reads them.
+    """
+    queryset = User.objects.all()
+    names = None if sources is None else {path[0] for path in sources}
+    if names is None or 'profile' in names:
+        queryset = queryset.select_related('profile')
+    if names is None or names & STATS_SOURCES:
+        queryset = with_author_stats(queryset)
+    return queryset
+
+
+class UserQuerysetMixin(SparseFieldsetMixin):
+    """user_queryset() narrowed to the fields of the response."""
+
+    def get_queryset(self):
+        fields, expand = self.sparse_fieldset()
+        if fields is None and expand is None:
+            return user_queryset()
+        return user_queryset(field_sources(self.get_serializer()))
+
+
+class UserListView(UserQuerysetMixin, generics.ListAPIView):
     """"
     GET /api/users/ - List all users
+    GET /api/users/?search=<prefix> - Users whose username starts with prefix
     """
-    queryset = User.objects.all()
     serializer_class = UserListSerializer
     permission_classes = [AllowAny]
+    pagination_class = UsernameCursorPagination
+    filter_backends = [UsernamePrefixFilter]
 
 
-class UserProfileView(generics.RetrieveUpdateAPIView):
+class UserProfileView(UserQuerysetMixin, generics.RetrieveUpdateAPIView):
     """
     GET /api/users/me/ - Get current user's profile
     PUT /api/users/me/ - Update current user's profile
@@ -94,34 +131,94 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        return self.get_queryset().get(pk=self.request.user.pk)
 
 
-class UserDetailView(generics.RetrieveAPIView):
+class UserDetailView(UserQuerysetMixin, generics.RetrieveAPIView):
     """
     GET /api/users/<username>/ - Public User Profile
     """
-    queryset = User.objects.all()
     serializer_class = UserDetailSerializer
     permission_classes = [AllowAny]
     lookup_field = 'username'
 
 
+class ValuesListMixin(SparseFieldsetMixin):
+    """
+    list() serialized from ``.values()`` rows by ``values_serializer_class``
+    instead of model instances and DRF fields. get_serializer_class() still
+    names the equivalent model serializer, which documents the schema and
+    serves ?expand= requests the values path cannot build.
+    """
+    values_serializer_class = PostListValuesSerializer
+
+    def uses_values(self):
+        _, expand = self.sparse_fieldset()
+        return not (expand and set(expand) - set(self.values_serializer_class.columns))
+
+    def list_rows(self, queryset):
+        """``queryset`` as the rows serialize_rows() takes."""
+        if not self.uses_values():
+            return queryset
+        fields, _ = self.sparse_fieldset()
+        return queryset.values(*self.values_serializer_class.value_columns(fields))
+
+    def serialize_rows(self, rows):
+        if not self.uses_values():
+            return self.get_serializer(rows, many=True).data
+        fields, _ = self.sparse_fieldset()
+        return self.values_serializer_class(rows, context=self.get_serializer_context(), fields=fields).data
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.list_rows(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.serialize_rows(page))
+
+        return Response(self.serialize_rows(queryset))
 
-class UserPostsViewSet(viewsets.ReadOnlyModelViewSet):
+
+class UserPostsViewSet(ValuesListMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet to list posts by a specific user.
     GET /api/users/{username}/posts/ - List user's published posts
     """
     serializer_class = PostListSerializer
+    pagination_class = PostKeysetPagination
 
     def get_queryset(self):
         username = self.kwargs.get('username')
-        return(Post.objects.filter(
+        queryset = Post.objects.filter(
             author__username=username,
             status='published',
             pub_date__lte=timezone.now()
-        ).select_related('author'))
+        )
+        return narrow_queryset(queryset, self.get_serializer(), always=['pub_date'])
+
+
+SPARSE_FIELDSET_PARAMETERS = [
+    OpenApiParameter(
+        name='fields',
+        type=OpenApiTypes.STR,
+        description='Comma-separated fields to return, e.g. title,slug,pub_date'
+    ),
+    OpenApiParameter(
+        name='expand',
+        type=OpenApiTypes.STR,
+        description='Comma-separated optional fields to add, e.g. content'
+    ),
+]
+
+
+def has_drafts(user_id):
+    """Whether the user has any drafts, cached until one of their posts changes."""
+    key = listing_key('has_drafts', author_listing(user_id))
+    result = cache.get(key)
+    if result is None:
+        result = Post.objects.filter(author_id=user_id, status='draft').exists()
+        cache.set(key, result, 60 * 60)
+    return result
 
 
 # POST
@@ -145,10 +242,12 @@ class UserPostsViewSet(viewsets.ReadOnlyModelViewSet):
                 type=OpenApiTypes.STR,
                 description='Filter posts by author username'
             ),
+            *SPARSE_FIELDSET_PARAMETERS,
         ]
     ),
     retrieve=extend_schema(
-        description="Retrieve a single published post. Authors can also retrieve their own drafts. View count is incremented."
+        description="Retrieve a single published post. Authors can also retrieve their own drafts. View count is incremented.",
+        parameters=SPARSE_FIELDSET_PARAMETERS,
     ),
     create=extend_schema(
         description="Create a new post. Requires authentication. Author is automatically set to the current user."
@@ -178,13 +277,24 @@ class UserPostsViewSet(viewsets.ReadOnlyModelViewSet):
     comment=extend_schema(
         request=CommentCreateSerializer,
         responses={
-            200: CommentSerializer(many=True),
+            200: inline_serializer('PaginatedCommentList', {
+                'next': serializers.URLField(allow_null=True),
+                'previous': serializers.URLField(allow_null=True),
+                'results': CommentSerializer(many=True),
+            }),
             201: CommentSerializer,
         },
-        description="List comments (GET) or create a comment (POST). Comment creation requires authentication."
+        parameters=[
+            OpenApiParameter(
+                name='thread',
+                type=OpenApiTypes.INT,
+                description='List every reply below this comment instead of a page of threads'
+            ),
+        ],
+        description="List comment threads newest first, a page at a time, with replies nested (GET), or create a comment or reply (POST). Comment creation requires authentication."
     )
 )
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(ValuesListMixin, viewsets.ModelViewSet):
     """
     Provides:
     - GET /posts/ - List all published posts
@@ -197,20 +307,59 @@ class PostViewSet(viewsets.ModelViewSet):
     - POST /posts/{slug}/comments/ - Add a comment to a post
     """
     lookup_field = 'slug'
+    pagination_class = PostKeysetPagination
 
     # enable filtering, searchin, and ordering
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, PostSearchFilter]
     filterset_fields = ['status', 'author__username']
-    search_fields = ['title', 'content', 'author__username']
     ordering_fields = ['pub_date', 'views_count', 'likes', 'reading_time']
     ordering = ['-pub_date']
+    include_drafts = False
 
-    @method_decorator(cache_page(60 * 15, key_prefix='post_list'))
-    @method_decorator(vary_on_headers('Authorization'))  # For JWT/Token Auth
-    @method_decorator(vary_on_cookie)                    # For Session Auth
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        """
+        Published posts come from one cache entry per query string, shared by
+        every viewer. An authenticated author who has drafts gets them paged
+        in with the published posts by an uncached per-viewer query instead.
+        """
+        user = request.user
+        # the author generation moves with the viewer's own drafts
+        viewer = [user.pk, listing_generation(author_listing(user.pk))] if user.is_authenticated else []
+        variant = [request.get_full_path(), request.accepted_renderer.format]
+
+        if user.is_authenticated and has_drafts(user.pk):
+            self.include_drafts = True
+            response = super().list(request, *args, **kwargs)
+            etag = listing_etag(POSTS_LISTING, *variant, digest(response.data), *viewer)
+            return set_validators(not_modified(request, etag) or response, request, etag)
+
+        cache_key = listing_key('post_list', POSTS_LISTING, request.get_full_path())
+        now = timezone.now()
+        entry = cache.get(cache_key)
+        hit = entry is not None and (entry['expires'] is None or entry['expires'] > now)
+        record_lookup('post_list', hit)
+
+        if not hit:
+            response = super().list(request, *args, **kwargs)
+            entry = {
+                'data': response.data,
+                'digest': digest(response.data),
+                # the next scheduled post changes the page without a save
+                'expires': Post.objects.filter(status='published', pub_date__gt=now).aggregate(
+                    next=Min('pub_date')
+                )['next'],
+            }
+            cache.set(cache_key, entry, 60 * 15)
+
+        # follows the page as served, counters and scheduled posts included
+        etag = listing_etag(POSTS_LISTING, *variant, entry['digest'], *viewer)
+        response = not_modified(request, etag)
+        if response is not None:
+            return set_validators(response, request, etag)
 
+        response = Response(entry['data'])
+        response['X-Cache'] = 'HIT' if hit else 'MISS'
+        return set_validators(response, request, etag)
 
     def get_queryset(self):
         """
@@ -218,25 +367,40 @@ class PostViewSet(viewsets.ModelViewSet):
         - List: Only published posts (unless user is author)
         - Detail: Published posts OR user's own drafts
         """
-        base_queryset = Post.objects.select_related('author', 'author__profile').prefetch_related(
-            'comments', 'liked_by'
-        )
+        if self.action in ('like', 'comment'):
+            # toggling and commenting only need the primary key; never load
+            # the likers or the comments
+            return Post.objects.only('pk', 'slug')
+
+        # authors are rendered from the card cache; see accounts.cards
+        base_queryset = Post.objects.all()
 
         if self.action == 'list':
-            if not self.request.user.is_authenticated:
+            # lists use the stored excerpt and comment count; never load the
+            # HTML bodies (unless expanded) or the comments themselves
+            base_queryset = narrow_queryset(base_queryset, self.get_serializer(), always=['pub_date'])
+
+            if not self.include_drafts:
+                # drafts are merged into the shared page by list()
                 return base_queryset.filter(
                     status='published',
                     pub_date__lte=timezone.now()
                 )
-            
+
             # single query with Q objects for authenticated users.
             return base_queryset.filter(
                 Q(status='published', pub_date__lte=timezone.now()) |
                 Q(author=self.request.user, status='draft')
             ).distinct()
 
-        # for detail views
-        return base_queryset.prefetch_related('comments__author')
+        if self.action == 'retrieve':
+            # enough for retrieve() to check visibility, count the view and
+            # validate; the serialized fields load only on a cache miss
+            return base_queryset.only(
+                'status', 'pub_date', 'author', 'last_updated', 'views_count', 'likes', 'approved_comments_count'
+            )
+
+        return base_queryset.prefetch_related('comments')
 
     def get_serializer_class(self):
         """
@@ -272,11 +436,12 @@ class PostViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         """
         Get single post and increment view count.
+        The view is counted even when the client's copy is current and gets a 304.
         """
         instance = self.get_object()
 
         is_published = (instance.status == 'published' and instance.pub_date <= timezone.now())
-        is_author = (request.user.is_authenticated and request.user == instance.author)
+        is_author = (request.user.is_authenticated and request.user.id == instance.author_id)
 
         if not(is_published or is_author):
             return Response(
@@ -286,28 +451,44 @@ class PostViewSet(viewsets.ModelViewSet):
 
         instance.increment_views()
 
-        cache_key = f"post_detail{instance.slug}"
+        fields, expand = self.sparse_fieldset()
+        shown = self.get_serializer().fields
+        is_liked = 'is_liked' in shown and has_liked(request.user, instance.pk)
+        # the embedded author card changes without bumping the post generation
+        author = digest(get_card(instance.author_id))
+        etag = post_etag(
+            instance, sorted(fields or ()), sorted(expand or ()), request.accepted_renderer.format,
+            request.user.pk, is_liked, author,
+        )
+        response = not_modified(request, etag)
+        if response is not None:
+            return set_validators(response, request, etag)
+
+        cache_key = post_key('post_detail', instance.pk, sorted(fields or ()), sorted(expand or ()), author)
 
         serialized_data = cache.get(cache_key)
 
         if not serialized_data:
             # cache miss; cache and skip next timee 
-            serializer = self.get_serializer(instance)
+            post = narrow_queryset(Post.objects.filter(pk=instance.pk), self.get_serializer()).get()
+            serializer = self.get_serializer(post)
             serialized_data = serializer.data
 
             cache.set(cache_key, serialized_data, 60 * 5)
 
-        # inject the fresh view count
-        serialized_data['views_count'] = instance.views_count
+        # inject the fresh counters; they change without invalidating the cache
+        # (only those the client asked for)
+        if 'views_count' in serialized_data:
+            serialized_data['views_count'] = instance.views_count
+        if 'likes' in serialized_data:
+            serialized_data['likes'] = instance.likes
 
-        if request.user.is_authenticated:
-            serialized_data['is_liked'] = instance.liked_by.filter(id=request.user.id).exists()
-            serialized_data['is_author'] = (instance.author == request.user)
-        else:
-            serialized_data['is_liked'] = False
-            serialized_data['is_author'] = False
+        if 'is_liked' in serialized_data:
+            serialized_data['is_liked'] = is_liked
+        if 'is_author' in serialized_data:
+            serialized_data['is_author'] = request.user.is_authenticated and instance.author_id == request.user.id
 
-        return Response(serialized_data)
+        return set_validators(Response(serialized_data), request, etag)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def like(self, request, slug=None):
@@ -317,51 +498,49 @@ class PostViewSet(viewsets.ModelViewSet):
         """
 
         post = self.get_object()
-        user = request.user
-
-        if user in post.liked_by.all():
-            post.liked_by.remove(user)
-            post.likes -= 1
-            liked = False
-        else:
-            post.liked_by.add(user)
-            post.likes += 1
-            liked = True
-
-        post.save()
+        liked, likes = toggle_like(post, request.user)
 
         return Response({
             'liked': liked,
-            'likes_count': post.likes
+            'likes_count': likes
         })
 
-    @action(detail=True, methods=['get', 'post'], url_path='comments')
+    @action(detail=True, methods=['get', 'post'], url_path='comments', pagination_class=CommentThreadPagination)
     def comment(self, request, slug=None):
         """
         List or create comments for a post.
-        GET /posts/{slug}/comments/ - List comments
-        POST /posts/{slug}/comments/ - Create comment (authenticated)
+        GET /posts/{slug}/comments/ - List comment threads, a page at a time
+        GET /posts/{slug}/comments/?thread={id} - List every reply below a comment
+        POST /posts/{slug}/comments/ - Create comment or reply (authenticated)
         """
 
         post = self.get_object()
+        context = {**self.get_serializer_context(), 'post': post, 'post_slug': post.slug}
+        comments = Comment.objects.filter(post_id=post.pk, approved=True)
 
         if request.method == 'GET':
-            comments = post.comments.filter(approved=True).select_related('author')
-            serializer = CommentSerializer(comments, many=True)
-            return Response(serializer.data)
+            thread = request.query_params.get('thread')
+            if thread is not None:
+                root = generics.get_object_or_404(comments.only('path', 'depth'), pk=thread)
+                replies = [reply for reply in subtree(root, comments) if reply.depth == root.depth + 1]
+                return Response({
+                    'next': None, 'previous': None,
+                    'results': CommentSerializer(replies, many=True, context=context).data,
+                })
+
+            page = self.paginate_queryset(comments)
+            serializer = CommentSerializer(page, many=True, context=context)
+            return self.get_paginated_response(serializer.data)
 
         elif request.method == 'POST':
             # DRF permissions already ensure user is authenticated here
-            serializer = CommentCreateSerializer(data=request.data)
+            serializer = CommentCreateSerializer(data=request.data, context=context)
             if serializer.is_valid():
                 serializer.save(post=post, author=request.user)
 
                 # return full comment data
-                comment = Comment.objects.select_related('author').get(
-                    id=serializer.instance.id
-                )
                 return Response(
-                    CommentSerializer(comment).data,
+                    CommentSerializer(serializer.instance, context=context).data,
                     status=status.HTTP_201_CREATED
                 )
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -9,6 +9,7 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ["status", "pub_date"]
     prepopulated_fields = {"slug": ("title",)}
     exclude = ("views_count", "reading_time", "likes", "liked_by")
+    readonly_fields = ("approved_comments_count",)
     list_editable = ["status"]
 
 
@@ -18,3 +19,14 @@ class CommentAdmin(admin.ModelAdmin):
     search_fields = ["post__title", "author__username", "content"]
     list_filter = ["approved", "created_date"]
     list_editable = ["approved"]
+    actions = ["approve_comments", "unapprove_comments"]
+
+    @admin.action(description="Approve selected comments")
+    def approve_comments(self, request, queryset):
+        changed = queryset.set_approved(True)
+        self.message_user(request, f"{changed} comments approved.")
+
+    @admin.action(description="Unapprove selected comments")
+    def unapprove_comments(self, request, queryset):
+        changed = queryset.set_approved(False)
+        self.message_user(request, f"{changed} comments unapproved.")
@@ -0,0 +1,84 @@
+"""
+Index of uploaded files and the posts that reference them.
+
+``trix_upload`` records every file it stores as an ``Upload`` row, and each
+post save records the uploads its content points at as ``PostAsset`` rows
+(deleting a post cascades to its rows). Finding orphaned uploads is then an
+indexed anti-join between the two tables rather than a scan of every post
+body.
+"""
+import re
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+SRC_RE = re.compile(r'src="([^"]+)"')
+
+
+def path_from_url(url):
+    """Storage path for a media URL, or None for anything else."""
+    path = unquote(urlparse(url).path)
+    media_url = urlparse(settings.MEDIA_URL).path
+    if path.startswith(media_url):
+        return path[len(media_url):].lstrip("/")
+    return None
+
+
+def referenced_paths(content):
+    """Storage paths of the uploads an HTML body points at."""
+    paths = set()
+    for url in SRC_RE.findall(content or ""):
+        path = path_from_url(url)
+        if path:
+            paths.add(path)
+    return paths
+
+
+def sync_post_assets(post):
+    """Bring the post's PostAsset rows in line with its content."""
+    from .models import PostAsset
+
+    wanted = referenced_paths(post.content)
+    existing = set(PostAsset.objects.filter(post_id=post.pk).values_list("path", flat=True))
+
+    if existing - wanted:
+        PostAsset.objects.filter(post_id=post.pk, path__in=existing - wanted).delete()
+    if wanted - existing:
+        PostAsset.objects.bulk_create(
+            [PostAsset(post_id=post.pk, path=path) for path in wanted - existing],
+            ignore_conflicts=True,
+        )
+
+
+def register_upload(path, directory="uploads"):
+    from .models import Upload
+
+    Upload.objects.get_or_create(path=path, defaults={"directory": directory})
+
+
+def orphaned_uploads(older_than=None):
+    """
+    Uploads no post references, optionally only those older than the given
+    timedelta so files for posts still being written are left alone.
+    """
+    from .models import PostAsset, Upload
+
+    uploads = Upload.objects.annotate(
+        referenced=Exists(PostAsset.objects.filter(path=OuterRef("path")))
+    ).filter(referenced=False)
+    if older_than is not None:
+        uploads = uploads.filter(created_date__lt=timezone.now() - older_than)
+    return uploads
+
+
+def stream(queryset, batch_size=500):
+    """Yield lists of rows from ``queryset`` in primary key order, one batch per query."""
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk).order_by("pk")[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1].pk
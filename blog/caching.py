@@ -0,0 +1,137 @@
+"""
+Versioned cache keys for posts and post listings.
+
+Every cached value that depends on a post embeds a generation number in its
+key. Invalidating means bumping the generation, which orphans the old keys
+(they simply expire) instead of searching for them, so it costs O(1) on any
+cache backend and never touches unrelated entries.
+
+There is one generation per post and one per listing:
+
+- ``posts``: the public post list
+- ``author:<user id>``: everything listed for one author
+- ``feeds`` and ``feeds:author:<user id>``: the rendered feeds, which only
+  move when a post enters, changes in or leaves them (see blog.feeds)
+
+All post-related cache keys are built here, so the views that read the
+cache and the signals that invalidate it cannot drift apart. Caches worth
+watching count their hits and misses with ``record_lookup``; ``hit_rate``
+reports them.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+POST_GENERATION = "gen:post:{}"
+LISTING_GENERATION = "gen:listing:{}"
+HITS = "stats:cache:{}:hits"
+MISSES = "stats:cache:{}:misses"
+
+POSTS_LISTING = "posts"
+FEEDS_LISTING = "feeds"
+
+
+def author_listing(author_id):
+    return f"author:{author_id}"
+
+
+def author_feed(author_id):
+    return f"feeds:author:{author_id}"
+
+
+def _generation(key):
+    value = cache.get(key)
+    if value is None:
+        # start from the clock so an evicted counter never reuses old keys
+        cache.add(key, int(time.time() * 1000), None)
+        value = cache.get(key)
+    return value
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def post_generation(post_id):
+    return _generation(POST_GENERATION.format(post_id))
+
+
+def listing_generation(listing):
+    return _generation(LISTING_GENERATION.format(listing))
+
+
+def _variant(parts):
+    return hashlib.md5("|".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def post_key(name, post_id, *parts):
+    """
+    Key for a value derived from a single post, e.g. its serialized detail.
+    ``parts`` distinguish variants of it, such as a sparse fieldset.
+    """
+    key = f"{name}:{post_id}:{post_generation(post_id)}"
+    return f"{key}:{_variant(parts)}" if parts else key
+
+
+def listing_key(name, listing, *parts):
+    """
+    Key for a value derived from a listing.
+    ``parts`` distinguish variants of the same listing (page, query string,
+    viewer) and are hashed to keep the key short.
+    """
+    return f"{name}:{listing}:{listing_generation(listing)}:{_variant(parts)}"
+
+
+def invalidate_post(post_id, author_id=None):
+    """Drop everything cached for a post and the listings it appears in."""
+    _bump(POST_GENERATION.format(post_id))
+    _bump(LISTING_GENERATION.format(POSTS_LISTING))
+    if author_id is not None:
+        _bump(LISTING_GENERATION.format(author_listing(author_id)))
+
+
+def invalidate_feeds(author_id):
+    """Drop the rendered site feeds and the author's feeds."""
+    _bump(LISTING_GENERATION.format(FEEDS_LISTING))
+    _bump(LISTING_GENERATION.format(author_feed(author_id)))
+
+
+def invalidate_author(author_id):
+    """Drop the listings and feeds that show an author's name."""
+    _bump(LISTING_GENERATION.format(POSTS_LISTING))
+    _bump(LISTING_GENERATION.format(author_listing(author_id)))
+    invalidate_feeds(author_id)
+
+
+def is_shared():
+    """Whether other processes see the cache; the in-memory backends are per process."""
+    return not isinstance(caches["default"], (LocMemCache, DummyCache))
+
+
+def record_lookup(name, hit):
+    """Count a hit or miss of the ``name`` cache; see ``hit_rate``."""
+    key = (HITS if hit else MISSES).format(name)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def hit_rate(name):
+    """``{"hits", "misses", "rate"}`` of the ``name`` cache since the last reset."""
+    counts = cache.get_many([HITS.format(name), MISSES.format(name)])
+    hits = counts.get(HITS.format(name), 0)
+    misses = counts.get(MISSES.format(name), 0)
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "rate": hits / total if total else 0.0}
+
+
+def reset_hit_rate(name):
+    cache.delete_many([HITS.format(name), MISSES.format(name)])
@@ -0,0 +1,194 @@
+"""
+Orphaned media cleanup through the Django storage API.
+
+Everything here talks to a ``Storage`` (``listdir``, ``get_modified_time``,
+``delete``), so the same code cleans the local ``FileSystemStorage`` and the
+Cloudinary media storage used in production.
+
+Files are listed page by page. For each page, one indexed query per scope
+finds the paths that are still referenced:
+
+- ``uploads/``: ``PostAsset`` rows (see ``blog.assets``)
+- ``featured_images/``: ``Post.featured_image``
+- ``profile_pics/``: ``Profile.profile_picture``
+
+Orphans are then deleted on a bounded thread pool, throttled to a maximum
+rate so a large cleanup does not hammer the storage provider.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+from posixpath import join
+
+from django.utils import timezone
+
+
+@dataclass
+class Scope:
+    prefix: str
+    referenced: object  # callable(paths) -> set of paths still in use
+
+
+def _referenced_uploads(paths):
+    from .models import PostAsset
+
+    return set(PostAsset.objects.filter(path__in=paths).values_list("path", flat=True))
+
+
+def _referenced_featured_images(paths):
+    from .models import Post
+
+    return set(Post.objects.filter(featured_image__in=paths).values_list("featured_image", flat=True))
+
+
+def _referenced_profile_pictures(paths):
+    from accounts.models import Profile
+
+    return set(
+        Profile.objects.filter(profile_picture__in=paths).values_list("profile_picture", flat=True)
+    )
+
+
+SCOPES = {
+    "uploads": Scope("uploads", _referenced_uploads),
+    "featured_images": Scope("featured_images", _referenced_featured_images),
+    "profile_pics": Scope("profile_pics", _referenced_profile_pictures),
+}
+
+
+def iter_pages(storage, prefix, page_size=500):
+    """Yield the files under ``prefix`` in lists of at most ``page_size`` paths."""
+    page = []
+    pending = [prefix]
+    while pending:
+        directory = pending.pop()
+        try:
+            directories, files = storage.listdir(directory)
+        except FileNotFoundError:
+            continue
+        pending.extend(join(directory, name) for name in directories)
+        for name in files:
+            page.append(join(directory, name))
+            if len(page) == page_size:
+                yield page
+                page = []
+    if page:
+        yield page
+
+
+def _uploaded_at(storage, path, known):
+    """When a file was stored: the Upload row if any, else the storage's mtime."""
+    if path in known:
+        return known[path]
+    try:
+        return storage.get_modified_time(path)
+    except (NotImplementedError, OSError):
+        # unknown age: treated as new, see find_orphans
+        return None
+
+
+def find_orphans(storage, scope, older_than=timedelta(hours=24), page_size=500):
+    """
+    Yield ``(page, orphans, unknown)`` for each listed page of ``scope``,
+    where ``orphans`` are the unreferenced paths older than ``older_than``.
+    Unreferenced files whose age cannot be told are kept and counted in
+    ``unknown``.
+    """
+    from .models import Upload
+
+    cutoff = timezone.now() - older_than
+    for page in iter_pages(storage, scope.prefix, page_size):
+        referenced = scope.referenced(page)
+        candidates = [path for path in page if path not in referenced]
+        if not candidates:
+            yield page, [], 0
+            continue
+
+        known = dict(Upload.objects.filter(path__in=candidates).values_list("path", "created_date"))
+        orphans = []
+        unknown = 0
+        for path in candidates:
+            stored_at = _uploaded_at(storage, path, known)
+            if stored_at is None:
+                unknown += 1
+            elif stored_at < cutoff:
+                orphans.append(path)
+        yield page, orphans, unknown
+
+
+class RateLimiter:
+    """Allow at most ``rate`` calls per second across threads (no limit when falsy)."""
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+@dataclass
+class Report:
+    scanned: int = 0
+    orphaned: int = 0
+    deleted: int = 0
+    failed: list = field(default_factory=list)
+    # unreferenced files kept because neither an Upload row nor the storage
+    # could tell when they were stored
+    unknown_age: int = 0
+
+
+def delete_files(storage, paths, workers=4, limiter=None):
+    """
+    Delete ``paths`` on a pool of ``workers`` threads.
+    Returns ``(deleted paths, [(path, error), ...])``.
+    """
+    limiter = limiter or RateLimiter()
+
+    def delete(path):
+        limiter.wait()
+        try:
+            storage.delete(path)
+            return path, None
+        except Exception as error:  # keep going; report the failure
+            return path, error
+
+    deleted, failed = [], []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for path, error in pool.map(delete, paths):
+            if error is None:
+                deleted.append(path)
+            else:
+                failed.append((path, error))
+    return deleted, failed
+
+
+def clean(storage, scope, older_than=timedelta(hours=24), page_size=500,
+          workers=4, rate=None, dry_run=False, progress=None):
+    """Remove orphaned files of one scope; returns a Report."""
+    from .models import Upload
+
+    report = Report()
+    limiter = RateLimiter(rate)
+    for page, orphans, unknown in find_orphans(storage, scope, older_than, page_size):
+        report.scanned += len(page)
+        report.orphaned += len(orphans)
+        report.unknown_age += unknown
+        if orphans and not dry_run:
+            deleted, failed = delete_files(storage, orphans, workers, limiter)
+            Upload.objects.filter(path__in=deleted).delete()
+            report.deleted += len(deleted)
+            report.failed.extend(failed)
+        if progress:
+            progress(report, orphans)
+    return report
@@ -0,0 +1,73 @@
+"""
+HTTP validators for posts and post listings.
+
+A post's ETag is built from ``last_updated``, the counters shown with it
+(likes, approved comments) and its cache generation (see blog.caching),
+which also moves when comments or image renditions change. A listing's ETag
+adds a ``digest`` of the page as served, so it follows the counters and
+posts going live on schedule. Views that render per viewer add the viewer's
+parts. ``views_count`` is left out on purpose: it moves on every read, so
+including it would make every request a miss. A revalidated copy shows the
+count from its last full response.
+
+No Last-Modified is sent, since no single date covers all of the above;
+feeds (see blog.feeds) still send one.
+
+Views count a view before answering with 304, so revalidation never loses
+one. Anonymous responses use ``public, no-cache``: shared caches may keep
+them but must revalidate each time, which is cheap and keeps the count
+right. Responses for a signed-in user are ``private``.
+"""
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .caching import listing_generation, post_generation
+
+
+def _etag(*parts):
+    return quote_etag(hashlib.md5("|".join(str(part) for part in parts).encode()).hexdigest())
+
+
+def post_etag(post, *parts):
+    """Strong ETag of a post; ``parts`` add whatever else the response depends on."""
+    return _etag(
+        post.pk, post.last_updated.isoformat(), post.likes, post.approved_comments_count,
+        post_generation(post.pk), *parts,
+    )
+
+
+def listing_etag(listing, *parts):
+    """ETag of a listing page; ``parts`` tell pages and viewers apart."""
+    return _etag(listing, listing_generation(listing), *parts)
+
+
+def digest(data):
+    """Hash of serialized response data, as an ETag part."""
+    return hashlib.md5(json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()).hexdigest()
+
+
+def not_modified(request, etag=None, last_modified=None):
+    """
+    A 304 (or 412) response when the request's conditions hold, else None.
+    ``last_modified`` is a datetime.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def set_validators(response, request, etag=None, last_modified=None):
+    """Add the validators and the Cache-Control matching who is asking."""
+    if etag:
+        response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    patch_vary_headers(response, ["Cookie", "Authorization"])
+    return response
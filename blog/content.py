@@ -0,0 +1,54 @@
+"""
+Content analysis for posts.
+
+``analyze()`` runs once in ``Post.save()`` and turns the Trix HTML body into
+the plain-text derivatives that list pages, search and the API need, so none
+of them has to load or strip the full HTML again.
+"""
+import html
+import re
+
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+WORDS_PER_MINUTE = 200
+
+EXCERPT_CHARS = 100
+LIST_EXCERPT_WORDS = 20
+OVERLAY_EXCERPT_WORDS = 30
+
+# tags that separate words; "<div>one</div><div>two</div>" is two words
+BLOCK_TAG_RE = re.compile(
+    r"<\s*/?\s*(br|p|div|li|ul|ol|h[1-6]|blockquote|pre|figure|figcaption|"
+    r"table|tr|td|th|hr|img)\b[^>]*>",
+    re.IGNORECASE,
+)
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def plain_text(content):
+    """Return the readable text of an HTML body, entities decoded."""
+    text = strip_tags(BLOCK_TAG_RE.sub(" ", content or ""))
+    return WHITESPACE_RE.sub(" ", html.unescape(text)).strip()
+
+
+def analyze(content):
+    """
+    Return the stored derivatives of an HTML body as a dict of Post fields.
+    """
+    text = plain_text(content)
+    word_count = len(text.split())
+
+    if len(text) > EXCERPT_CHARS:
+        excerpt = text[:EXCERPT_CHARS] + "..."
+    else:
+        excerpt = text
+
+    return {
+        "plain_text": text,
+        "excerpt": excerpt,
+        "list_excerpt": Truncator(text).words(LIST_EXCERPT_WORDS, truncate=" …"),
+        "overlay_excerpt": Truncator(text).words(OVERLAY_EXCERPT_WORDS, truncate=" …"),
+        "word_count": word_count,
+        "reading_time": max(1, round(word_count / WORDS_PER_MINUTE)),
+    }
@@ -0,0 +1,166 @@
+"""
+Buffered view counting.
+
+Page views are collected in the cache instead of being written to the
+database one by one. Every post with pending views gets a numbered slot so
+that a flush only has to read the slots written since the previous flush,
+then applies the totals with bulk ``F('views_count') + n`` updates.
+``QuerySet.update()`` skips ``Post.save()`` and ``post_save``, so counting a
+view never recomputes the post or invalidates cached pages.
+
+A flush writes to the database before taking the written views off the
+pending counters, so a failed write leaves them to the next flush. The
+counters are decremented, never deleted, because a request may be adding
+to them at the same time.
+
+The counters must live in a cache shared by every process (see CACHES in
+the settings); with the per-process default, ``flush_view_counts`` runs in
+a process of its own and never sees the views the web workers recorded.
+"""
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+PENDING_KEY = "views:pending:{}"
+SLOT_KEY = "views:slot:{}"
+SEQ_KEY = "views:seq"
+CURSOR_KEY = "views:cursor"
+OLDEST_KEY = "views:oldest"
+FLUSH_LOCK_KEY = "views:flush_lock"
+SCHEDULE_KEY = "views:next_flush"
+
+# pending counters and slots must outlive a few missed flush windows
+KEY_TIMEOUT = 60 * 60 * 24
+
+
+def flush_interval():
+    """Seconds between automatic flushes."""
+    return getattr(settings, "VIEW_COUNT_FLUSH_INTERVAL", 60)
+
+
+def _incr(key, timeout=KEY_TIMEOUT):
+    """Increment ``key``, creating it if needed. Returns the new value."""
+    if cache.add(key, 1, timeout):
+        return 1
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # the key expired or was flushed between add() and incr()
+        if cache.add(key, 1, timeout):
+            return 1
+        return cache.incr(key)
+
+
+def _register(post_id):
+    """Give ``post_id`` a slot so the next flush picks it up."""
+    # the sequence and the flush cursor never expire, or they would drift apart
+    slot = _incr(SEQ_KEY, None)
+    cache.set(SLOT_KEY.format(slot), post_id, KEY_TIMEOUT)
+    cache.add(OLDEST_KEY, time.time(), KEY_TIMEOUT)
+
+
+def record_view(post_id):
+    """
+    Count one view of ``post_id``.
+    Returns the number of views of the post that were waiting to be flushed,
+    including this one, at the time it was recorded.
+    """
+    key = PENDING_KEY.format(post_id)
+    pending = _incr(key)
+    if pending == 1:
+        # new, or back from zero after a flush
+        _register(post_id)
+
+    # flush at most once per interval, piggybacking on the request
+    if cache.add(SCHEDULE_KEY, 1, flush_interval()):
+        flush_views()
+    return pending
+
+
+def pending_views(post_id):
+    """Views of ``post_id`` recorded but not yet written to the database."""
+    return cache.get(PENDING_KEY.format(post_id), 0)
+
+
+def flush_views():
+    """
+    Write all pending views to the database.
+    Returns ``(posts_updated, {post_id: views_written})``.
+    """
+    from .models import Post
+
+    if not cache.add(FLUSH_LOCK_KEY, 1, 30):
+        # another process is flushing right now
+        return 0, {}
+
+    try:
+        head = cache.get(SEQ_KEY, 0)
+        cursor = cache.get(CURSOR_KEY, 0)
+        if head < cursor:
+            # the sequence was evicted and started over from 1
+            cursor = 0
+        if head <= cursor:
+            return 0, {}
+
+        slots = cache.get_many([SLOT_KEY.format(n) for n in range(cursor + 1, head + 1)])
+        post_ids = set(slots.values())
+        counts = cache.get_many([PENDING_KEY.format(post_id) for post_id in post_ids])
+
+        written = {}
+        for post_id in post_ids:
+            count = counts.get(PENDING_KEY.format(post_id), 0)
+            if count:
+                written[post_id] = count
+
+        # group posts by increment so each distinct value is one UPDATE;
+        # if this fails nothing was taken off the counters
+        by_count = defaultdict(list)
+        for post_id, count in written.items():
+            by_count[count].append(post_id)
+        with transaction.atomic():
+            for count, ids in by_count.items():
+                Post.objects.filter(pk__in=ids).update(views_count=F("views_count") + count)
+
+        leftovers = []
+        for post_id, count in written.items():
+            # decr, never delete: views recorded meanwhile must survive, and
+            # a counter back at zero re-registers on its next view
+            try:
+                remaining = cache.decr(PENDING_KEY.format(post_id), count)
+            except ValueError:
+                remaining = 0
+            if remaining > 0:
+                leftovers.append(post_id)
+
+        cache.set(CURSOR_KEY, head, None)
+        cache.delete_many([SLOT_KEY.format(n) for n in range(cursor + 1, head + 1)])
+        cache.delete(OLDEST_KEY)
+        for post_id in leftovers:
+            _register(post_id)
+
+        return len(written), written
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+
+
+def lag():
+    """
+    Describe how far the stored counters trail behind.
+    Returns a dict with the number of posts and views waiting and the age in
+    seconds of the oldest unflushed view.
+    """
+    head = cache.get(SEQ_KEY, 0)
+    cursor = cache.get(CURSOR_KEY, 0)
+    slots = cache.get_many([SLOT_KEY.format(n) for n in range(cursor + 1, head + 1)])
+    post_ids = set(slots.values())
+    counts = cache.get_many([PENDING_KEY.format(post_id) for post_id in post_ids])
+    oldest = cache.get(OLDEST_KEY)
+    return {
+        "posts": len([value for value in counts.values() if value]),
+        "views": sum(counts.values()),
+        "seconds": round(time.time() - oldest) if oldest else 0,
+    }
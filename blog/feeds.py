@@ -0,0 +1,148 @@
+"""
+RSS and Atom feeds of the latest published posts, site-wide and per author.
+
+Entries are built from the stored ``list_excerpt`` and the author card, so a
+feed never loads post bodies or joins users. The rendered XML is cached
+under a feed generation (see blog.caching) that only moves when a post is
+published, edited while published or unpublished, or its author renamed. Posts scheduled for later
+are picked up by letting the cached feed expire when the next one goes live.
+
+Responses carry an ETag (a hash of the XML) and Last-Modified (the newest
+entry), and are ``public, no-cache``, so pollers revalidate every time and
+get a 304 from a cache read when nothing changed.
+"""
+import hashlib
+
+from django.contrib.auth.models import User
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Min
+from django.http import Http404, HttpResponse
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import http_date, quote_etag
+
+from accounts.cards import get_cards
+
+from .caching import FEEDS_LISTING, author_feed, listing_key, record_lookup
+from .conditional import not_modified
+from .models import Post
+
+FEED_SIZE = 20
+FEED_TIMEOUT = 60 * 60 * 24
+# what an entry reads; never the content
+ENTRY_FIELDS = ("id", "title", "slug", "list_excerpt", "pub_date", "last_updated", "author")
+
+
+class PostFeed(Feed):
+    """The latest published posts as RSS."""
+    title = "Valley"
+    link = reverse_lazy("blog:index")
+    description = "The latest posts on Valley"
+
+    def __call__(self, request, *args, **kwargs):
+        try:
+            obj = self.get_object(request, *args, **kwargs)
+        except ObjectDoesNotExist:
+            raise Http404("Feed object does not exist.")
+
+        listing = self.listing(obj)
+        # the path only: query strings do not change a feed
+        key = listing_key("feed", listing, request.path)
+        entry = cache.get(key)
+        hit = entry is not None and (entry["expires"] is None or entry["expires"] > timezone.now())
+        record_lookup("feed", hit)
+        if not hit:
+            entry = self.render(obj, request)
+            cache.set(key, entry, FEED_TIMEOUT)
+
+        response = not_modified(request, entry["etag"], entry["last_modified"])
+        if response is None:
+            response = HttpResponse(entry["content"], content_type=entry["content_type"])
+        response["ETag"] = entry["etag"]
+        response["Last-Modified"] = http_date(entry["last_modified"].timestamp())
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+    def render(self, obj, request):
+        """The cache entry for a freshly rendered feed."""
+        feedgen = self.get_feed(obj, request)
+        content = feedgen.writeString("utf-8")
+        return {
+            "content": content,
+            "content_type": feedgen.content_type,
+            "etag": quote_etag(hashlib.md5(content.encode()).hexdigest()),
+            "last_modified": feedgen.latest_post_date(),
+            # the next scheduled post changes the feed without a save
+            "expires": self.published(obj).filter(pub_date__gt=timezone.now()).aggregate(
+                next=Min("pub_date")
+            )["next"],
+        }
+
+    def listing(self, obj):
+        return FEEDS_LISTING
+
+    def published(self, obj):
+        return Post.objects.filter(status="published")
+
+    def items(self, obj):
+        posts = list(
+            self.published(obj).filter(pub_date__lte=timezone.now())
+            .only(*ENTRY_FIELDS).order_by("-pub_date", "-id")[:FEED_SIZE]
+        )
+        cards = get_cards({post.author_id for post in posts})
+        for post in posts:
+            post.card = cards.get(post.author_id)
+        return posts
+
+    def item_title(self, item):
+        return item.title
+
+    def item_description(self, item):
+        return item.list_excerpt
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_updateddate(self, item):
+        return item.last_updated
+
+    def item_author_name(self, item):
+        return item.card["username"] if item.card else None
+
+
+class PostAtomFeed(PostFeed):
+    feed_type = Atom1Feed
+    subtitle = PostFeed.description
+
+
+class AuthorFeed(PostFeed):
+    """One author's latest published posts as RSS."""
+
+    def get_object(self, request, username):
+        return User.objects.only("id", "username").get(username=username)
+
+    def title(self, obj):
+        return f"Posts by {obj.username} on Valley"
+
+    def link(self, obj):
+        return reverse("accounts:profile", args=[obj.username])
+
+    def description(self, obj):
+        return f"The latest posts by {obj.username} on Valley"
+
+    def listing(self, obj):
+        return author_feed(obj.pk)
+
+    def published(self, obj):
+        return super().published(obj).filter(author_id=obj.pk)
+
+
+class AuthorAtomFeed(AuthorFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
@@ -20,10 +20,17 @@ class CommentForm(forms.ModelForm):
 
     class Meta:
         model = Comment
-        fields = ["content"]
+        fields = ["content", "parent"]
         widgets = {
             "content": forms.Textarea(attrs={"class": "form-control", "rows": 3}),
+            "parent": forms.HiddenInput(),
         }
 
+    def __init__(self, *args, post=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # replies only to approved comments on the same post
+        comments = Comment.objects.filter(approved=True).only("post", "path", "depth", "parent")
+        self.fields["parent"].queryset = comments.filter(post=post) if post else comments.none()
+
 class SearchForm(forms.Form):
     query = forms.CharField(label='Search', max_length=100, required=True)
@@ -0,0 +1,167 @@
+"""
+Like toggling.
+
+A toggle touches a single row of the ``liked_by`` through table and adjusts
+the denormalized ``Post.likes`` counter with an ``F()`` expression, so its
+cost does not depend on how many users liked the post and concurrent toggles
+cannot overwrite each other's counts.
+
+Each user's liked post ids are cached as one packed array, so detail pages
+answer "liked?" with a cache read instead of a through-table query. The
+toggle patches that set after commit. When it cannot, because another
+toggle by the same user holds the set or none is cached (a reader may be
+rebuilding it from a read that predates the toggle), it marks the set
+stale. Readers then rebuild from the database without keeping the result
+until the mark expires.
+"""
+from array import array
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .caching import invalidate_post
+from .models import Post
+
+Like = Post.liked_by.through
+
+LIKED_KEY = "liked:user:{}"
+LIKED_LOCK_KEY = "liked:lock:{}"
+LIKED_STALE_KEY = "liked:stale:{}"
+LIKED_TIMEOUT = 60 * 60 * 24
+STALE_TIMEOUT = 30
+
+
+def encode_ids(ids):
+    """Sorted ids packed as 8-byte integers."""
+    return array("q", sorted(ids)).tobytes()
+
+
+def decode_ids(blob):
+    ids = array("q")
+    ids.frombytes(blob)
+    return ids
+
+
+def _load_liked(user_id):
+    key, stale_key = LIKED_KEY.format(user_id), LIKED_STALE_KEY.format(user_id)
+    ids = array("q", sorted(Like.objects.filter(user_id=user_id).values_list("post_id", flat=True)))
+    # add: a set cached meanwhile is at least as new as this read
+    cache.add(key, ids.tobytes(), LIKED_TIMEOUT)
+    if cache.get(stale_key):
+        # a toggle may have committed after the read above
+        cache.delete(key)
+    return ids
+
+
+def liked_post_ids(user_id):
+    """Sorted array of the ids of the posts ``user_id`` likes."""
+    key, stale_key = LIKED_KEY.format(user_id), LIKED_STALE_KEY.format(user_id)
+    cached = cache.get_many([key, stale_key])
+    if key not in cached or stale_key in cached:
+        return _load_liked(user_id)
+    return decode_ids(cached[key])
+
+
+def has_liked(user, post_id):
+    """Whether ``user`` (possibly anonymous) likes the post, without a query once cached."""
+    if not user.is_authenticated:
+        return False
+    ids = liked_post_ids(user.pk)
+    index = bisect_left(ids, post_id)
+    return index < len(ids) and ids[index] == post_id
+
+
+def _patch_liked(user_id, post_id, liked):
+    key, stale_key = LIKED_KEY.format(user_id), LIKED_STALE_KEY.format(user_id)
+    lock = LIKED_LOCK_KEY.format(user_id)
+    if not cache.add(lock, 1, STALE_TIMEOUT):
+        # another toggle of this user is patching the set right now and may
+        # write it without this change: mark it stale, then drop it
+        cache.set(stale_key, 1, STALE_TIMEOUT)
+        cache.delete(key)
+        return
+    try:
+        blob = cache.get(key)
+        if blob is None:
+            # nothing to patch, but a reader may be about to cache a set
+            # read before this toggle committed
+            cache.set(stale_key, 1, STALE_TIMEOUT)
+            return
+        ids = decode_ids(blob)
+        index = bisect_left(ids, post_id)
+        present = index < len(ids) and ids[index] == post_id
+        if liked and not present:
+            insort(ids, post_id)
+        elif not liked and present:
+            del ids[index]
+        cache.set(key, ids.tobytes(), LIKED_TIMEOUT)
+        if cache.get(stale_key):
+            # a concurrent toggle gave up while this one held the lock
+            cache.delete(key)
+    finally:
+        cache.delete(lock)
+
+
+def forget_liked(user_ids):
+    """Drop the cached sets of ``user_ids``; for changes made outside toggle_like."""
+    cache.delete_many([LIKED_KEY.format(user_id) for user_id in user_ids])
+
+
+def toggle_like(post, user):
+    """
+    Like ``post`` for ``user`` or take the like back.
+    Returns ``(liked, likes)`` with the state after the toggle.
+    """
+    with transaction.atomic():
+        # the delete doubles as the existence check
+        removed, _ = Like.objects.filter(post_id=post.pk, user_id=user.pk).delete()
+
+        if removed:
+            liked = False
+            Post.objects.filter(pk=post.pk, likes__gt=0).update(likes=F("likes") - 1)
+        else:
+            liked = True
+            try:
+                with transaction.atomic():
+                    Like.objects.create(post_id=post.pk, user_id=user.pk)
+            except IntegrityError:
+                # a concurrent request liked it first; the counter is theirs to bump
+                pass
+            else:
+                Post.objects.filter(pk=post.pk).update(likes=F("likes") + 1)
+
+        likes = Post.objects.filter(pk=post.pk).values_list("likes", flat=True).get()
+        transaction.on_commit(lambda: _patch_liked(user.pk, post.pk, liked))
+        # the update sends no signals; listings show the count
+        transaction.on_commit(lambda: invalidate_post(post.pk))
+
+    post.likes = likes
+    return liked, likes
+
+
+def reconcile_likes(batch_size=500):
+    """
+    Rebuild ``Post.likes`` from ``liked_by`` in batches of ``batch_size`` posts.
+    Yields ``(checked, fixed)`` after each batch.
+    """
+    from django.db.models import Count
+
+    last_pk = 0
+    while True:
+        batch = list(
+            Post.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .annotate(actual=Count("liked_by"))
+            .values_list("pk", "likes", "actual")[:batch_size]
+        )
+        if not batch:
+            return
+
+        stale = [Post(pk=pk, likes=actual) for pk, likes, actual in batch if likes != actual]
+        if stale:
+            Post.objects.bulk_update(stale, ["likes"])
+
+        last_pk = batch[-1][0]
+        yield len(batch), len(stale)
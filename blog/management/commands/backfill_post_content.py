@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from blog.content import analyze
+from blog.models import Post
+
+FIELDS = ["plain_text", "excerpt", "list_excerpt", "overlay_excerpt", "word_count", "reading_time"]
+
+
+class Command(BaseCommand):
+    help = "Fill plain text, excerpts, word count and reading time for existing posts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="Number of posts to process per batch (default: 200)",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        done = 0
+        last_pk = 0
+
+        while True:
+            # bulk_update skips save() and post_save, so nothing is invalidated
+            batch = list(
+                Post.objects.filter(pk__gt=last_pk).order_by("pk").only("pk", "content")[:batch_size]
+            )
+            if not batch:
+                break
+
+            for post in batch:
+                for field, value in analyze(post.content).items():
+                    setattr(post, field, value)
+            Post.objects.bulk_update(batch, FIELDS)
+
+            done += len(batch)
+            last_pk = batch[-1].pk
+            self.stdout.write(f"Processed {done} posts")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {done} posts"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from blog.caching import hit_rate, is_shared, reset_hit_rate
+
+CACHES = ["post_list", "feed"]
+
+
+class Command(BaseCommand):
+    help = "Report the hit rate of the instrumented caches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Reset the counters after reporting them",
+        )
+
+    def handle(self, *args, **options):
+        if not is_shared():
+            self.stdout.write(self.style.WARNING(
+                "The default cache is per process, so this only sees its own "
+                "counters; set REDIS_URL to share them with the web workers."
+            ))
+        for name in CACHES:
+            stats = hit_rate(name)
+            self.stdout.write(
+                f"{name}: {stats['hits']} hits, {stats['misses']} misses, "
+                f"hit rate {stats['rate']:.1%}"
+            )
+            if options["reset"]:
+                reset_hit_rate(name)
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from blog.caching import is_shared
+from blog.counters import flush_views, lag
+
+
+class Command(BaseCommand):
+    help = "Write buffered post views to the database and report the counter lag"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lag-only",
+            action="store_true",
+            help="Only report how far the counters lag, without flushing",
+        )
+
+    def handle(self, *args, **options):
+        if not is_shared():
+            self.stdout.write(self.style.WARNING(
+                "The default cache is per process, so this only sees its own "
+                "counters; set REDIS_URL to share them with the web workers."
+            ))
+        before = lag()
+        self.stdout.write(
+            f"Pending: {before['views']} views on {before['posts']} posts, "
+            f"oldest {before['seconds']}s ago"
+        )
+
+        if options["lag_only"]:
+            return
+
+        updated, written = flush_views()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Flushed {sum(written.values())} views to {updated} posts"
+            )
+        )
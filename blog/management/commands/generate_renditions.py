@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import Profile
+from blog.assets import stream
+from blog.models import Post
+from blog.renditions import image_field, update_renditions
+
+
+class Command(BaseCommand):
+    help = "Generate resized renditions for existing featured images and profile pictures"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate renditions that are already up to date",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="Number of rows to load per query (default: 200)",
+        )
+
+    def handle(self, *args, **options):
+        for model in (Post, Profile):
+            field = image_field(model)
+            rows = model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True}).only("pk")
+            done = failed = 0
+            for batch in stream(rows, options["batch_size"]):
+                for row in batch:
+                    try:
+                        if update_renditions(model, row.pk, force=options["force"]):
+                            done += 1
+                    except Exception as error:  # a missing or broken file should not stop the run
+                        failed += 1
+                        self.stderr.write(f"{model.__name__} {row.pk}: {error}")
+                self.stdout.write(f"{model.__name__}: rendered {done}, failed {failed}")
+
+            self.stdout.write(self.style.SUCCESS(f"Rendered {done} {model._meta.verbose_name_plural}"))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from blog.assets import stream
+from blog.models import Upload
+from blog.uploads import transfer
+
+
+class Command(BaseCommand):
+    help = "Transfer staged uploads to the media storage"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Also retry uploads whose earlier transfer failed",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of uploads to load per query (default: 100)",
+        )
+
+    def handle(self, *args, **options):
+        statuses = ["staged", "failed"] if options["retry_failed"] else ["staged"]
+        uploads = Upload.objects.filter(status__in=statuses).only("pk")
+
+        stored = failed = 0
+        for batch in stream(uploads, options["batch_size"]):
+            for upload in batch:
+                if transfer(upload.pk):
+                    stored += 1
+                else:
+                    failed += 1
+            self.stdout.write(f"Transferred {stored} uploads, {failed} failed or skipped")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {stored} uploads transferred"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from blog.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the post search index beside the live one and swap it in"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of posts to index per batch (default: 500)",
+        )
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        indexed = backend.rebuild(options["batch_size"], stdout=self.stdout)
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {type(backend).__name__} index: {indexed} posts")
+        )
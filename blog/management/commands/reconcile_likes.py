@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from blog.likes import reconcile_likes
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized Post.likes counter from liked_by"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of posts to check per query (default: 500)",
+        )
+
+    def handle(self, *args, **options):
+        checked = fixed = 0
+        for batch_checked, batch_fixed in reconcile_likes(options["batch_size"]):
+            checked += batch_checked
+            fixed += batch_fixed
+            self.stdout.write(f"Checked {checked} posts, fixed {fixed}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {fixed} of {checked} posts corrected"))
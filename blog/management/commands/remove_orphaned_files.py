@@ -1,30 +1,129 @@
-import os
-import re
+from datetime import timedelta
+
+from django.core.files.storage import storages
 from django.core.management.base import BaseCommand
+
+from blog.assets import register_upload, stream, sync_post_assets
+from blog.cleanup import SCOPES, clean, iter_pages
 from blog.models import Post
-from django.conf import settings
+
 
 class Command(BaseCommand):
-    help = "Clean up orphaned Trix uploads"
+    help = "Clean up orphaned uploads, featured images and profile pictures"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--storage",
+            default="default",
+            help="Alias in settings.STORAGES to clean (default: default)",
+        )
+        parser.add_argument(
+            "--scope",
+            action="append",
+            choices=sorted(SCOPES),
+            help="Only clean this media directory; may be repeated (default: all)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="List orphaned files without deleting anything",
+        )
+        parser.add_argument(
+            "--older-than",
+            type=float,
+            default=24,
+            metavar="HOURS",
+            help="Only remove files older than this many hours (default: 24), "
+                 "so files for posts still being written survive",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of files listed and looked up per query (default: 500)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of concurrent deletes (default: 4)",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=None,
+            help="Maximum deletes per second across all workers (default: unlimited)",
+        )
+        parser.add_argument(
+            "--reindex",
+            action="store_true",
+            help="Rebuild the upload index from post contents and the uploads "
+                 "directory before cleaning up",
+        )
 
     def handle(self, *args, **options):
-        # Collect all referenced files in posts
-        used_files = set()
-        pattern = re.compile(r'src="([^"]+)"')
-
-        for post in Post.objects.all():
-            matches = pattern.findall(post.content or "")
-            for url in matches:
-                if url.startswith(settings.MEDIA_URL):
-                    used_files.add(url.replace(settings.MEDIA_URL, "").lstrip("/"))
-
-        # Scan uploads directory
-        uploads_directory = os.path.join(settings.MEDIA_ROOT, "uploads")
-        for _, _, files in os.walk(uploads_directory):
-            for filename in files:
-                file_path = os.path.join("uploads", filename)
-                if file_path not in used_files:
-                    full_path = os.path.join(settings.MEDIA_ROOT, file_path)
-                    if os.path.isfile(full_path):
-                        os.remove(full_path)
-                        self.stdout.write(f"Deleted orphan file: {file_path}")
+        storage = storages[options["storage"]]
+        batch_size = options["batch_size"]
+        dry_run = options["dry_run"]
+
+        if options["reindex"]:
+            self.reindex(storage, batch_size)
+
+        def progress(report, orphans):
+            failed = {path for path, _ in report.failed}
+            for path in orphans:
+                if dry_run:
+                    self.stdout.write(f"Would delete orphan file: {path}")
+                elif path not in failed:
+                    self.stdout.write(f"Deleted orphan file: {path}")
+            self.stdout.write(f"Scanned {report.scanned} files, {report.orphaned} orphans")
+
+        totals = {"deleted": 0, "orphaned": 0, "failed": 0, "unknown_age": 0}
+        for name in options["scope"] or sorted(SCOPES):
+            report = clean(
+                storage,
+                SCOPES[name],
+                older_than=timedelta(hours=options["older_than"]),
+                page_size=batch_size,
+                workers=options["workers"],
+                rate=options["rate"],
+                dry_run=dry_run,
+                progress=progress,
+            )
+            for path, error in report.failed:
+                self.stderr.write(f"Could not delete {path}: {error}")
+            self.stdout.write(
+                f"{name}: scanned {report.scanned}, orphaned {report.orphaned}, "
+                f"deleted {report.deleted}, failed {len(report.failed)}, "
+                f"unknown age {report.unknown_age}"
+            )
+            totals["orphaned"] += report.orphaned
+            totals["deleted"] += report.deleted
+            totals["failed"] += len(report.failed)
+            totals["unknown_age"] += report.unknown_age
+
+        if dry_run:
+            message = f"Found {totals['orphaned']} orphaned files"
+        else:
+            message = f"Removed {totals['deleted']} orphaned files"
+        if totals["unknown_age"]:
+            self.stdout.write(self.style.WARNING(
+                f"Kept {totals['unknown_age']} unreferenced files of unknown age; "
+                "the storage does not report when they were stored"
+            ))
+        if totals["failed"]:
+            self.stdout.write(self.style.WARNING(f"{message}, {totals['failed']} failed"))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+
+    def reindex(self, storage, batch_size):
+        done = 0
+        for batch in stream(Post.objects.only("pk", "content"), batch_size):
+            for post in batch:
+                sync_post_assets(post)
+            done += len(batch)
+            self.stdout.write(f"Indexed references of {done} posts")
+
+        for page in iter_pages(storage, SCOPES["uploads"].prefix, batch_size):
+            for path in page:
+                register_upload(path)
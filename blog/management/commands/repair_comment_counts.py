@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
+
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = "Rebuild Post.approved_comments_count from the approved comments"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of posts to check per query (default: 500)",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        checked = fixed = 0
+        last_pk = 0
+
+        while True:
+            batch = list(
+                Post.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .annotate(actual=Count("comments", filter=Q(comments__approved=True)))
+                .values_list("pk", "approved_comments_count", "actual")[:batch_size]
+            )
+            if not batch:
+                break
+
+            stale = [
+                Post(pk=pk, approved_comments_count=actual)
+                for pk, stored, actual in batch
+                if stored != actual
+            ]
+            if stale:
+                Post.objects.bulk_update(stale, ["approved_comments_count"])
+
+            checked += len(batch)
+            fixed += len(stale)
+            last_pk = batch[-1][0]
+            self.stdout.write(f"Checked {checked} posts, fixed {fixed}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {fixed} of {checked} posts corrected"))
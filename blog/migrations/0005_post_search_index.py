@@ -0,0 +1,76 @@
+from django.db import migrations
+from django.utils.html import strip_tags
+
+# The index as it was when this migration was written; blog.search may
+# change later, so nothing here is imported from it.
+CREATE_SQL = {
+    "sqlite": (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS blog_post_search USING fts5("
+        "title, body, author, tokenize='porter unicode61 remove_diacritics 2')"
+    ),
+    "postgresql": (
+        "CREATE TABLE IF NOT EXISTS blog_post_search ("
+        "post_id bigint PRIMARY KEY, body text NOT NULL, document tsvector NOT NULL)"
+    ),
+}
+
+INSERT_SQL = {
+    "sqlite": (
+        "INSERT INTO blog_post_search (rowid, title, body, author) VALUES (%s, %s, %s, %s)"
+    ),
+    "postgresql": (
+        "INSERT INTO blog_post_search (post_id, body, document) VALUES (%s, %s, "
+        "setweight(to_tsvector('english', %s), 'A') || "
+        "setweight(to_tsvector('english', %s), 'B') || "
+        "setweight(to_tsvector('english', %s), 'C'))"
+    ),
+}
+
+
+def _params(vendor, rows):
+    if vendor == "postgresql":
+        return [(pk, body, title, author, body) for pk, title, body, author in rows]
+    return rows
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in CREATE_SQL:
+        return
+
+    Post = apps.get_model("blog", "Post")
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(CREATE_SQL[vendor])
+        rows = []
+        posts = Post.objects.order_by("pk").values_list(
+            "pk", "title", "content", "author__username"
+        )
+        for pk, title, content, author in posts.iterator(chunk_size=500):
+            rows.append((pk, title, strip_tags(content), author))
+            if len(rows) == 500:
+                cursor.executemany(INSERT_SQL[vendor], _params(vendor, rows))
+                rows = []
+        if rows:
+            cursor.executemany(INSERT_SQL[vendor], _params(vendor, rows))
+        if vendor == "postgresql":
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS blog_post_search_document_idx "
+                "ON blog_post_search USING GIN (document)"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS blog_post_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0004_remove_post_content_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.11 on 2026-10-17 04:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_post_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='pub_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['pub_date', 'id'], name='pub_date_id_idx'),
+        ),
+    ]
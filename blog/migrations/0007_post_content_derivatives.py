@@ -0,0 +1,38 @@
+# Generated by Django 5.2.11 on 2026-10-17 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_post_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=110),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='list_excerpt',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='overlay_excerpt',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='plain_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
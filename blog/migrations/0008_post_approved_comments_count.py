@@ -0,0 +1,36 @@
+# Generated by Django 5.2.11 on 2026-10-17 04:11
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_approved_comments(apps, schema_editor):
+    Post = apps.get_model("blog", "Post")
+    Comment = apps.get_model("blog", "Comment")
+    approved = (
+        Comment.objects.filter(post=OuterRef("pk"), approved=True)
+        .order_by()
+        .values("post")
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    Post.objects.update(
+        approved_comments_count=Coalesce(Subquery(approved, output_field=IntegerField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_post_content_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='approved_comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_approved_comments, migrations.RunPython.noop),
+    ]
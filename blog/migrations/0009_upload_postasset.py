@@ -0,0 +1,34 @@
+# Generated by Django 5.2.11 on 2026-10-17 04:17
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_post_approved_comments_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Upload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('created_date', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PostAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(db_index=True, max_length=255)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assets', to='blog.post')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('post', 'path'), name='unique_post_asset')],
+            },
+        ),
+    ]
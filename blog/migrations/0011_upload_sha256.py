@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-17 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_media_path_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='upload',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.11 on 2026-10-17 04:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_upload_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='upload',
+            name='directory',
+            field=models.CharField(default='uploads', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='upload',
+            name='status',
+            field=models.CharField(choices=[('staged', 'Staged'), ('stored', 'Stored'), ('failed', 'Failed')], default='stored', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='upload',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='upload',
+            index=models.Index(fields=['status'], name='blog_upload_status_8a9d52_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='upload',
+            constraint=models.UniqueConstraint(fields=('directory', 'sha256'), name='unique_upload_content'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-17 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_upload_transfer_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='featured_image_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
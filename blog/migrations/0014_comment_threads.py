@@ -0,0 +1,51 @@
+# Generated by Django 5.2.11 on 2026-10-17 05:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Cast, LPad
+
+
+def set_top_level_paths(apps, schema_editor):
+    # every existing comment starts a thread; see blog.models.path_segment
+    Comment = apps.get_model("blog", "Comment")
+    Comment.objects.update(
+        path=LPad(Cast(Value(10 ** 10 - 1) - F("id"), CharField()), 10, Value("0"))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_image_renditions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='blog.comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='blog_commen_post_id_34d25d_idx'),
+        ),
+        migrations.RunPython(set_top_level_paths, migrations.RunPython.noop),
+    ]
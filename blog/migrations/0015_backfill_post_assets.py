@@ -0,0 +1,44 @@
+import re
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.db import migrations
+
+# what blog.assets.referenced_paths did when this was written
+SRC_RE = re.compile(r'src="([^"]+)"')
+
+
+def _referenced_paths(content):
+    media_url = urlparse(settings.MEDIA_URL).path
+    paths = set()
+    for url in SRC_RE.findall(content or ""):
+        path = unquote(urlparse(url).path)
+        if path.startswith(media_url):
+            paths.add(path[len(media_url):].lstrip("/"))
+    return paths - {""}
+
+
+def backfill_post_assets(apps, schema_editor):
+    # posts saved before 0009 have no PostAsset rows, and the uploads cleanup
+    # treats an unindexed file as unreferenced
+    Post = apps.get_model("blog", "Post")
+    PostAsset = apps.get_model("blog", "PostAsset")
+    assets = []
+    for pk, content in Post.objects.order_by("pk").values_list("pk", "content").iterator(chunk_size=500):
+        assets.extend(PostAsset(post_id=pk, path=path) for path in _referenced_paths(content))
+        if len(assets) >= 500:
+            PostAsset.objects.bulk_create(assets, ignore_conflicts=True)
+            assets = []
+    if assets:
+        PostAsset.objects.bulk_create(assets, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_comment_threads'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_post_assets, migrations.RunPython.noop),
+    ]
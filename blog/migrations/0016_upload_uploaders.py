@@ -0,0 +1,20 @@
+# Generated by Django 5.2.11 on 2026-10-17 05:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_backfill_post_assets'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='upload',
+            name='uploaders',
+            field=models.ManyToManyField(blank=True, related_name='uploads', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,9 +1,51 @@
+from collections import Counter
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.urls import reverse
-from django.utils.text import slugify
 from django.utils import timezone
 
+from .caching import invalidate_feeds, invalidate_post
+from .content import analyze
+from .slugs import allocate_slugs, next_free_slug, slug_base
+from .uploads import resolve_staged
+
+
+SLUG_ATTEMPTS = 5
+
+
+class PostQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Like save(), derive content fields and allocate unique slugs for new
+        posts, using one slug query for the whole batch.
+        """
+        objs = list(objs)
+        for post in objs:
+            post.prepare()
+
+        new = [post for post in objs if post.pk is None]
+        slugs = allocate_slugs([slug_base(post.slug or post.title) for post in new])
+        for post, slug in zip(new, slugs):
+            post.slug = slug
+        created = super().bulk_create(objs, *args, **kwargs)
+
+        # no post_save for bulk inserts, so index them and drop the cached
+        # listings here
+        from .assets import sync_post_assets
+        from .search import get_backend
+
+        backend = get_backend()
+        for post in created:
+            if post.pk:
+                backend.index(post.pk)
+                sync_post_assets(post)
+                invalidate_post(post.pk, post.author_id)
+        for author_id in {post.author_id for post in created if post.status == "published"}:
+            invalidate_feeds(author_id)
+        return created
+
 
 # Create your models here.
 class Post(models.Model):
@@ -24,18 +66,40 @@ class Post(models.Model):
     last_updated = models.DateTimeField(auto_now=True)
     views_count = models.PositiveIntegerField(default=0)
     likes = models.PositiveIntegerField(default=0)
+    # maintained by Comment.save, the comment pre_delete signal and
+    # CommentQuerySet.set_approved; rebuild with repair_comment_counts
+    approved_comments_count = models.PositiveIntegerField(default=0, editable=False)
     liked_by = models.ManyToManyField(User, related_name="liked_posts", blank=True)
     reading_time = models.PositiveIntegerField(default=0)
-    featured_image = models.ImageField(upload_to="featured_images/", null=True, blank=True)
+    # derived from content in save(); see blog.content
+    plain_text = models.TextField(blank=True, default="", editable=False)
+    excerpt = models.CharField(max_length=110, blank=True, default="", editable=False)
+    list_excerpt = models.TextField(blank=True, default="", editable=False)
+    overlay_excerpt = models.TextField(blank=True, default="", editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    featured_image = models.ImageField(upload_to="featured_images/", null=True, blank=True, db_index=True)
+    # size, placeholder and resized copies of featured_image; see blog.renditions
+    featured_image_renditions = models.JSONField(default=dict, blank=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ["-pub_date"]
         indexes = [
-            models.Index(fields=["pub_date"], name="pub_date_idx"),
+            # keyset pagination walks (pub_date, id); see blog.pagination
+            models.Index(fields=["pub_date", "id"], name="pub_date_id_idx"),
             models.Index(fields=["status"], name="status_idx"),
             models.Index(fields=["title"], name="title_idx"),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored status so the feeds know a post left them
+        if "status" in field_names:
+            instance._loaded_status = instance.status
+        return instance
+
     def get_absolute_url(self):
         return reverse("blog:post_detail", args=[self.slug])
 
@@ -43,49 +107,254 @@ class Post(models.Model):
         return self.title
 
     def increment_views(self):
-        """Increment the views count for the post."""
-        self.views_count += 1
-        self.save()
+        """
+        Count a view of the post.
+        The view is buffered and written later by ``blog.counters.flush_views``,
+        so this never saves the post. ``views_count`` on this instance is
+        bumped to include the views still waiting to be flushed.
+        """
+        from .counters import record_view
 
-    def save(self, *args, **kwargs):
+        pending = record_view(self.pk)
+        self.views_count += pending - getattr(self, "_buffered_views", 0)
+        self._buffered_views = pending
+
+    def prepare(self):
+        """Fill in the fields derived on save; shared with bulk_create."""
         if not self.pub_date:
             self.pub_date = timezone.now()
 
-        # Ensure the slug is unique
-        if not self.slug:
-            self.slug = slugify(self.title)
+        # Links to uploads whose background transfer has since finished
+        self.content = resolve_staged(self.content)
+
+        # Plain text, excerpts, word count and reading time
+        for field, value in analyze(self.content).items():
+            setattr(self, field, value)
+
+    def save(self, *args, **kwargs):
+        self.prepare()
+
+        # If this is a new post(no primary key yet), give it a unique slug
+        if self.pk:
+            return super().save(*args, **kwargs)
+
+        base = slug_base(self.slug or self.title)
+        for attempt in range(SLUG_ATTEMPTS):
+            self.slug = next_free_slug(base)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # lost a race for the slug; anything else is a real error
+                if attempt == SLUG_ATTEMPTS - 1 or not Post.objects.filter(slug=self.slug).exists():
+                    raise
+
+
+def adjust_comment_count(post_id, delta):
+    """Atomically add ``delta`` to a post's approved comment count."""
+    if delta:
+        Post.objects.filter(pk=post_id).update(
+            approved_comments_count=models.F("approved_comments_count") + delta
+        )
+
+
+# A comment's path is its parent's path followed by its own fixed-width
+# segment. Top-level segments count down from ROOT_BASE, so ordering by path
+# lists a post's newest thread first, each followed by its replies in the
+# order they were written. See blog.threads.
+SEGMENT = 10
+ROOT_BASE = 10 ** SEGMENT - 1
+MAX_DEPTH = 8
+
+
+def path_segment(comment_id, top_level):
+    return f"{ROOT_BASE - comment_id if top_level else comment_id:0{SEGMENT}d}"
+
+
+def ancestor_paths(path):
+    """Paths of every ancestor of the comment at ``path``, outermost first."""
+    return [path[:end] for end in range(SEGMENT, len(path), SEGMENT)]
+
+
+def counting_ancestors(post_id, path):
+    """
+    Paths of the ancestors whose reply count includes the approved comment
+    at ``path``: its parent and on up to the nearest unapproved ancestor,
+    which hides it from everything further up.
+    """
+    ancestors = ancestor_paths(path)
+    approved = dict(
+        Comment.objects.filter(post_id=post_id, path__in=ancestors).values_list("path", "approved")
+    )
+    counting = []
+    for ancestor in reversed(ancestors):
+        counting.append(ancestor)
+        if not approved.get(ancestor, True):
+            break
+    return counting
 
-        # If this is a new post(no primary key yet)
 
-        if not self.pk:
-            # Check if the slug already exists, and if so, add a suffix to make it unique
-            original_slug = self.slug
-            counter = 1
+def adjust_reply_counts(post_id, path, delta):
+    """
+    Atomically add ``delta`` to the reply counts of the ancestors counting
+    the comment at ``path`` (see counting_ancestors).
+    """
+    if delta and len(path) > SEGMENT:
+        Comment.objects.filter(post_id=post_id, path__in=counting_ancestors(post_id, path)).update(
+            reply_count=models.F("reply_count") + delta
+        )
 
-            while Post.objects.filter(slug=self.slug).exists():
-                self.slug = f"{original_slug}-{counter}"
-                counter += 1
 
-        # Calculate reading time
-        word_count = len(self.content.split())
-        self.reading_time = max(1, round(word_count / 200))
-        super().save(*args, **kwargs)
+class CommentQuerySet(models.QuerySet):
+    def set_approved(self, approved):
+        """
+        Approve or unapprove every comment in the queryset in one UPDATE,
+        adjusting each affected post's approved comment count.
+        Returns the number of comments that changed.
+        """
+        sign = 1 if approved else -1
+        with transaction.atomic():
+            changing = self.filter(approved=not approved)
+            # outer comments first (a path extends its parent's), so each
+            # comment is counted over the approvals already applied above it
+            rows = list(changing.order_by("path").values_list("post_id", "path", "reply_count"))
+            changed = changing.update(approved=approved)
+
+            per_post = Counter(post_id for post_id, _, _ in rows)
+            for post_id, n in per_post.items():
+                adjust_comment_count(post_id, sign * n)
+                # update() sends no signals, so drop the cached post here
+                invalidate_post(post_id)
+
+            # a comment shows or hides the replies it counts along with itself
+            for post_id, path, replies in rows:
+                adjust_reply_counts(post_id, path, sign * (1 + replies))
+        return changed
 
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="comments")
+    parent = models.ForeignKey(
+        "self", null=True, blank=True, on_delete=models.CASCADE, related_name="replies"
+    )
     content = models.TextField()
     created_date = models.DateTimeField(auto_now_add=True)
     approved = models.BooleanField(default=True)
+    # materialized path, set on insert; see path_segment
+    path = models.CharField(max_length=255, default="", editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    # approved comments below this one with no unapproved comment in between
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
 
+    objects = CommentQuerySet.as_manager()
 
     def __str__(self):
         return f"Comment by {self.author} on {self.post.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored state so save() knows whether approval changed
+        instance._loaded_approved = (
+            instance.approved if "approved" in field_names else None
+        )
+        return instance
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding:
+            was_approved = False
+            parent_path = self._place()
+        else:
+            was_approved = getattr(self, "_loaded_approved", None)
+            if was_approved is None:
+                was_approved = Comment.objects.filter(pk=self.pk).values_list(
+                    "approved", flat=True
+                ).first() or False
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                # the path ends with the new id
+                self.path = parent_path + path_segment(self.pk, not parent_path)
+                Comment.objects.filter(pk=self.pk).update(path=self.path)
+            delta = int(self.approved) - int(was_approved)
+            adjust_comment_count(self.post_id, delta)
+            # along with the replies it counts, which it was hiding or now hides
+            adjust_reply_counts(self.post_id, self.path, delta * (1 + self.reply_count))
+        self._loaded_approved = self.approved
+
+    def _place(self):
+        """
+        Set the depth of a new comment and return its parent's path. Replies
+        to a comment at MAX_DEPTH go next to it instead.
+        """
+        if self.parent_id is None:
+            self.depth = 0
+            return ""
+        parent = self.parent
+        if parent.post_id != self.post_id:
+            raise ValueError("A reply must be on the same post as its parent.")
+        if parent.depth >= MAX_DEPTH:
+            self.parent_id = parent.parent_id
+            self.depth = parent.depth
+            return parent.path[:-SEGMENT]
+        self.depth = parent.depth + 1
+        return parent.path
+
     class Meta:
         ordering = ["-created_date"]
         indexes = [
             models.Index(fields=['post', 'approved', 'created_date']),
             models.Index(fields=['approved', 'created_date']),
+            models.Index(fields=['post', 'path']),
+        ]
+
+
+class Upload(models.Model):
+    """A file stored by trix_upload or a post form; see blog.assets and blog.uploads."""
+    STATUS_CHOICES = [
+        ("staged", "Staged"),
+        ("stored", "Stored"),
+        ("failed", "Failed"),
+    ]
+
+    # staging path until the background transfer moves the file to storage
+    path = models.CharField(max_length=255, unique=True)
+    directory = models.CharField(max_length=50, default="uploads")
+    # content hash of files stored through blog.uploads; null for older files
+    sha256 = models.CharField(max_length=64, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="stored")
+    created_date = models.DateTimeField(default=timezone.now, db_index=True)
+    # everyone who uploaded these bytes; identical files share one row
+    uploaders = models.ManyToManyField(User, related_name="uploads", blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["directory", "sha256"], name="unique_upload_content"),
+        ]
+        indexes = [
+            models.Index(fields=["status"]),
+        ]
+
+    def __str__(self):
+        return self.path
+
+    @property
+    def url(self):
+        return f"{settings.MEDIA_URL}{self.path}"
+
+
+class PostAsset(models.Model):
+    """An upload referenced from a post's content."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="assets")
+    path = models.CharField(max_length=255, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["post", "path"], name="unique_post_asset"),
         ]
+
+    def __str__(self):
+        return self.path
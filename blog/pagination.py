@@ -0,0 +1,96 @@
+"""
+Keyset (cursor) pagination over posts ordered by ``(pub_date, id)``, newest
+first. Comment threads page by their materialized path instead; see
+blog.threads.
+
+A cursor stores the ``(pub_date, id)`` of the last post on a page, and the
+next page is read with ``WHERE (pub_date, id) < cursor``, so every page
+costs one index range scan no matter how deep it is, and no ``COUNT(*)`` is
+needed. The ``pub_date_id_idx`` index on ``Post`` backs the scan.
+"""
+import base64
+import json
+from dataclasses import dataclass, field
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+ORDERING = ("-pub_date", "-id")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(post, reverse=False):
+    """
+    Cursor pointing just past ``post``; ``reverse`` walks towards newer posts.
+    ``post`` may also be a ``values()`` row with ``pub_date`` and ``id``.
+    """
+    if isinstance(post, dict):
+        payload = [post["pub_date"].isoformat(), post["id"]]
+    else:
+        payload = [post.pub_date.isoformat(), post.pk]
+    if reverse:
+        payload.append("r")
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return ``(pub_date, pk, reverse)`` for a cursor, or raise InvalidCursor."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        pub_date = parse_datetime(payload[0])
+        pk = int(payload[1])
+        reverse = payload[2:] == ["r"]
+    except (ValueError, TypeError, IndexError, AttributeError):
+        raise InvalidCursor(token)
+    if pub_date is None:
+        raise InvalidCursor(token)
+    return pub_date, pk, reverse
+
+
+@dataclass
+class KeysetPage:
+    items: list = field(default_factory=list)
+    next_cursor: str | None = None
+    previous_cursor: str | None = None
+
+
+def keyset_page(queryset, cursor=None, size=10):
+    """
+    Return one page of ``queryset`` after ``cursor``.
+    Reads ``size + 1`` rows to know whether another page follows.
+    """
+    reverse = False
+    if cursor:
+        pub_date, pk, reverse = decode_cursor(cursor)
+        if reverse:
+            queryset = queryset.filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+            )
+        else:
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+            )
+
+    if reverse:
+        rows = list(queryset.order_by("pub_date", "id")[: size + 1])
+        has_more = len(rows) > size
+        items = rows[:size][::-1]
+        page = KeysetPage(items)
+        if items:
+            page.next_cursor = encode_cursor(items[-1])
+            if has_more:
+                page.previous_cursor = encode_cursor(items[0], reverse=True)
+        return page
+
+    rows = list(queryset.order_by(*ORDERING)[: size + 1])
+    items = rows[:size]
+    page = KeysetPage(items)
+    if len(rows) > size:
+        page.next_cursor = encode_cursor(items[-1])
+    if cursor and items:
+        page.previous_cursor = encode_cursor(items[0], reverse=True)
+    return page
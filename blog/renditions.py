@@ -0,0 +1,178 @@
+"""
+Resized renditions of featured images and profile pictures.
+
+When an image field changes, ``schedule_renditions`` queues a background job
+that opens the original once with Pillow and writes a fixed set of widths,
+each as JPEG and WebP, under ``renditions/``. The original's size, a tiny
+blurred placeholder (a data URI) and the rendition paths are stored in a
+JSON field next to the image, so pages render ``srcset`` without touching
+storage or running extra queries. ``generate_renditions`` backfills existing
+images.
+"""
+import base64
+import io
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageFilter, ImageOps
+
+FORMATS = {
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+}
+EXTENSIONS = {"jpeg": "jpg", "webp": "webp"}
+PLACEHOLDER_WIDTH = 16
+RENDITION_DIRECTORY = "renditions"
+
+# image field -> (JSON field holding its renditions, widths to generate)
+FIELDS = {
+    "featured_image": ("featured_image_renditions", (320, 640, 960, 1280, 1920)),
+    "profile_picture": ("profile_picture_renditions", (48, 96, 192, 384)),
+}
+
+
+def image_field(model):
+    """Name of the image field with renditions on ``model``."""
+    names = {field.name for field in model._meta.get_fields()}
+    for name in FIELDS:
+        if name in names:
+            return name
+    raise ValueError(f"{model.__name__} has no image field with renditions")
+
+
+def _encode(image, fmt):
+    if fmt == "jpeg" and image.mode != "RGB":
+        # JPEG has no alpha: flatten onto white
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, **FORMATS[fmt])
+    return buffer.getvalue()
+
+
+def _placeholder(image):
+    height = max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))
+    tiny = image.convert("RGB").resize((PLACEHOLDER_WIDTH, height)).filter(ImageFilter.GaussianBlur(1))
+    return "data:image/jpeg;base64," + base64.b64encode(_encode(tiny, "jpeg")).decode("ascii")
+
+
+def generate(name, widths, storage=None):
+    """
+    Write the renditions of the image stored at ``name`` and return its
+    metadata: ``{"source", "width", "height", "placeholder", "sources"}``,
+    where ``sources`` maps each format to ``[[width, path], ...]``.
+    """
+    storage = storage or default_storage
+    with storage.open(name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+
+    stem = posixpath.splitext(name)[0]
+    # never upscale; an image narrower than every width gets one at its own size
+    targets = sorted({min(width, image.width) for width in widths})
+    sources = {fmt: [] for fmt in FORMATS}
+    for width in targets:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for fmt in FORMATS:
+            path = storage.save(
+                f"{RENDITION_DIRECTORY}/{stem}/{width}w.{EXTENSIONS[fmt]}",
+                ContentFile(_encode(resized, fmt)),
+            )
+            sources[fmt].append([width, path])
+
+    return {
+        "source": name,
+        "width": image.width,
+        "height": image.height,
+        "placeholder": _placeholder(image),
+        "sources": sources,
+    }
+
+
+def rendition_paths(meta):
+    return [path for entries in (meta or {}).get("sources", {}).values() for _, path in entries]
+
+
+def update_renditions(model, pk, force=False):
+    """
+    Bring the stored renditions of one row in line with its image.
+    Returns True when renditions were (re)generated or cleared.
+    """
+    field = image_field(model)
+    meta_field, widths = FIELDS[field]
+    row = model.objects.filter(pk=pk).values(field, meta_field).first()
+    if row is None:
+        return False
+
+    name, old = row[field] or "", row[meta_field] or {}
+    if not force and old.get("source", "") == name:
+        return False
+    if name.startswith("staging/"):
+        # rendered once the upload transfer swaps in the stored path
+        return False
+
+    meta = generate(name, widths) if name else {}
+    # only if the image is still the one just rendered
+    if not model.objects.filter(pk=pk, **{field: row[field]}).update(**{meta_field: meta}):
+        for path in rendition_paths(meta):
+            default_storage.delete(path)
+        return False
+
+    for path in set(rendition_paths(old)) - set(rendition_paths(meta)):
+        default_storage.delete(path)
+    _invalidate(model, pk)
+    return True
+
+
+def _invalidate(model, pk):
+    from accounts.cards import invalidate_card
+    from accounts.models import Profile
+
+    from .caching import invalidate_post
+    from .models import Post
+
+    if model is Post:
+        invalidate_post(pk, Post.objects.filter(pk=pk).values_list("author_id", flat=True).first())
+    elif model is Profile:
+        invalidate_card(Profile.objects.filter(pk=pk).values_list("user_id", flat=True).first())
+
+
+def schedule_renditions(model, pk):
+    """Update the row's renditions on the background pool after commit."""
+    from .uploads import run_in_background
+
+    run_in_background(update_renditions, model, pk)
+
+
+def needs_renditions(instance):
+    """True when the instance's image is not the one its renditions were made from."""
+    field = image_field(type(instance))
+    meta_field, _ = FIELDS[field]
+    name = getattr(instance, field).name or ""
+    return (getattr(instance, meta_field) or {}).get("source", "") != name
+
+
+def srcset(meta, fmt):
+    return ", ".join(
+        f"{default_storage.url(path)} {width}w"
+        for width, path in (meta or {}).get("sources", {}).get(fmt, [])
+    )
+
+
+def rendition_urls(meta):
+    """API shape of a renditions field: size, placeholder and URLs per format and width."""
+    if not meta:
+        return None
+    return {
+        "width": meta["width"],
+        "height": meta["height"],
+        "placeholder": meta["placeholder"],
+        "sources": {
+            fmt: [{"width": width, "url": default_storage.url(path)} for width, path in entries]
+            for fmt, entries in meta["sources"].items()
+        },
+    }
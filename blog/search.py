@@ -0,0 +1,309 @@
+"""
+Full-text search for posts.
+
+Each backend keeps an inverted index of post titles, ``plain_text`` bodies and
+author usernames in a side table next to ``blog_post``:
+
+- ``SQLiteSearchBackend`` uses an FTS5 virtual table ranked with ``bm25()``.
+- ``PostgresSearchBackend`` uses a ``tsvector`` column with a GIN index,
+  ranked with ``ts_rank()`` and highlighted with ``ts_headline()``.
+
+The index is updated from ``blog.signals`` whenever a post is saved or
+deleted, and rebuilt without downtime by the ``rebuild_search_index`` command.
+``search()`` returns the queryset it was given, narrowed to matching posts
+and annotated with ``search_rank`` and ``search_snippet``.
+
+The backend is picked from the database vendor, or from the
+``BLOG_SEARCH_BACKEND`` setting (a dotted path) when it is set.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+# highlight markers; blog_tags.highlight turns them into <mark> after escaping
+MARK_START = "\x02"
+MARK_END = "\x03"
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(query):
+    """Split user input into plain search terms, dropping query syntax."""
+    return WORD_RE.findall(query.lower())[:16]
+
+
+def document(post_id):
+    """Return the ``(title, body, author)`` text indexed for a post."""
+    from .models import Post
+
+    row = (
+        Post.objects.filter(pk=post_id)
+        .values_list("title", "plain_text", "author__username")
+        .first()
+    )
+    return row
+
+
+class BaseSearchBackend:
+    """
+    Fallback used on databases without a full-text index.
+    Matches every term with ``icontains``; there is nothing to maintain.
+    """
+
+    table = "blog_post_search"
+
+    def search(self, queryset, query):
+        terms = tokenize(query)
+        if not terms:
+            return queryset.none()
+        for term in terms:
+            queryset = queryset.filter(
+                Q(title__icontains=term)
+                | Q(plain_text__icontains=term)
+                | Q(author__username__icontains=term)
+            )
+        return queryset.annotate(
+            search_rank=Value(0.0),
+            search_snippet=Value(""),
+        ).order_by("-pub_date")
+
+    def index(self, post_id):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def rebuild(self, batch_size=500, stdout=None):
+        return 0
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """FTS5 index in the ``blog_post_search`` virtual table (rowid = post id)."""
+
+    # bm25 weights for the title, body and author columns
+    weights = (10.0, 1.0, 5.0)
+
+    def create_sql(self, table):
+        return (
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+            "title, body, author, tokenize='porter unicode61 remove_diacritics 2')"
+        )
+
+    def match_expression(self, query):
+        terms = tokenize(query)
+        # every term is quoted and prefix-matched: "djan"* "test"*
+        return " ".join(f'"{term}"*' for term in terms)
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+
+        t = self.table
+        ids = RawSQL(f"SELECT rowid FROM {t} WHERE {t} MATCH %s", (match,))
+        weights = ", ".join(str(w) for w in self.weights)
+        # bm25 is lower for better matches, so negate it for a descending rank
+        rank = RawSQL(
+            f"SELECT -bm25({t}, {weights}) FROM {t} "
+            f"WHERE {t} MATCH %s AND rowid = blog_post.id",
+            (match,),
+        )
+        snippet = RawSQL(
+            f"SELECT snippet({t}, -1, %s, %s, '…', 24) FROM {t} "
+            f"WHERE {t} MATCH %s AND rowid = blog_post.id",
+            (MARK_START, MARK_END, match),
+        )
+        return (
+            queryset.filter(pk__in=ids)
+            .annotate(search_rank=rank, search_snippet=snippet)
+            .order_by("-search_rank", "-pub_date")
+        )
+
+    def index(self, post_id, table=None):
+        row = document(post_id)
+        table = table or self.table
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table} WHERE rowid = %s", [post_id])
+            if row is not None:
+                cursor.execute(
+                    f"INSERT INTO {table} (rowid, title, body, author) VALUES (%s, %s, %s, %s)",
+                    [post_id, *row],
+                )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [post_id])
+
+    def insert_many(self, cursor, table, rows):
+        cursor.executemany(
+            f"INSERT INTO {table} (rowid, title, body, author) VALUES (%s, %s, %s, %s)",
+            rows,
+        )
+
+    def swap(self, cursor, new_table):
+        cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+        cursor.execute(f"ALTER TABLE {new_table} RENAME TO {self.table}")
+
+    def prune(self, cursor):
+        cursor.execute(
+            f"DELETE FROM {self.table} WHERE rowid NOT IN (SELECT id FROM blog_post)"
+        )
+
+    def rebuild(self, batch_size=500, stdout=None):
+        """
+        Build a fresh index beside the live one and swap it in.
+        Searches keep hitting the old index until the swap, and posts
+        changed while the rebuild ran are re-indexed afterwards.
+        """
+        from django.utils import timezone
+
+        from .models import Post
+
+        started = timezone.now()
+        new_table = f"{self.table}_new"
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {new_table}")
+            cursor.execute(self.create_sql(new_table))
+
+        indexed = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                Post.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", "title", "plain_text", "author__username")[:batch_size]
+            )
+            if not batch:
+                break
+            rows = batch
+            with transaction.atomic(), connection.cursor() as cursor:
+                self.insert_many(cursor, new_table, rows)
+            indexed += len(rows)
+            last_pk = batch[-1][0]
+            if stdout:
+                stdout.write(f"Indexed {indexed} posts")
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.swap(cursor, new_table)
+
+        # catch up with edits and deletions made during the rebuild
+        for post_id in Post.objects.filter(last_updated__gte=started).values_list("pk", flat=True):
+            self.index(post_id)
+        with connection.cursor() as cursor:
+            self.prune(cursor)
+
+        return indexed
+
+
+class PostgresSearchBackend(SQLiteSearchBackend):
+    """``tsvector`` index in ``blog_post_search`` with a GIN index on it."""
+
+    config = "english"
+
+    def create_sql(self, table):
+        return (
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "post_id bigint PRIMARY KEY, body text NOT NULL, document tsvector NOT NULL)"
+        )
+
+    def vector_sql(self):
+        c = self.config
+        return (
+            f"setweight(to_tsvector('{c}', %s), 'A') || "
+            f"setweight(to_tsvector('{c}', %s), 'B') || "
+            f"setweight(to_tsvector('{c}', %s), 'C')"
+        )
+
+    def match_expression(self, query):
+        terms = tokenize(query)
+        return " & ".join(f"{term}:*" for term in terms)
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+
+        t, c = self.table, self.config
+        tsquery = f"to_tsquery('{c}', %s)"
+        ids = RawSQL(f"SELECT post_id FROM {t} WHERE document @@ {tsquery}", (match,))
+        rank = RawSQL(
+            f"SELECT ts_rank(document, {tsquery}) FROM {t} WHERE post_id = blog_post.id",
+            (match,),
+        )
+        options = f"StartSel={MARK_START}, StopSel={MARK_END}, MaxWords=24, MinWords=12"
+        snippet = RawSQL(
+            f"SELECT ts_headline('{c}', body, {tsquery}, %s) FROM {t} "
+            "WHERE post_id = blog_post.id",
+            (match, options),
+        )
+        return (
+            queryset.filter(pk__in=ids)
+            .annotate(search_rank=rank, search_snippet=snippet)
+            .order_by("-search_rank", "-pub_date")
+        )
+
+    def index(self, post_id, table=None):
+        row = document(post_id)
+        if row is None:
+            return self.remove(post_id)
+        title, body, author = row
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table or self.table} (post_id, body, document) "
+                f"VALUES (%s, %s, {self.vector_sql()}) "
+                "ON CONFLICT (post_id) DO UPDATE "
+                "SET body = EXCLUDED.body, document = EXCLUDED.document",
+                [post_id, body, title, author, body],
+            )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE post_id = %s", [post_id])
+
+    def insert_many(self, cursor, table, rows):
+        cursor.executemany(
+            f"INSERT INTO {table} (post_id, body, document) VALUES (%s, %s, {self.vector_sql()})",
+            [(pk, body, title, author, body) for pk, title, body, author in rows],
+        )
+
+    def swap(self, cursor, new_table):
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {new_table}_document_idx "
+            f"ON {new_table} USING GIN (document)"
+        )
+        cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+        cursor.execute(f"ALTER TABLE {new_table} RENAME TO {self.table}")
+        cursor.execute(
+            f"ALTER INDEX {new_table}_document_idx RENAME TO {self.table}_document_idx"
+        )
+        cursor.execute(
+            f"ALTER INDEX IF EXISTS {new_table}_pkey RENAME TO {self.table}_pkey"
+        )
+
+    def prune(self, cursor):
+        cursor.execute(
+            f"DELETE FROM {self.table} WHERE post_id NOT IN (SELECT id FROM blog_post)"
+        )
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_backend():
+    """Return the search backend for the default database."""
+    path = getattr(settings, "BLOG_SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)()
+    return BACKENDS.get(connection.vendor, BaseSearchBackend)()
+
+
+def search_posts(queryset, query):
+    """Narrow ``queryset`` to posts matching ``query``, best matches first."""
+    return get_backend().search(queryset, query)
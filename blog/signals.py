@@ -0,0 +1,121 @@
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from .assets import sync_post_assets
+from .caching import invalidate_author, invalidate_feeds
+from .likes import forget_liked
+from .models import Comment, Post, adjust_comment_count, adjust_reply_counts
+from .renditions import needs_renditions, rendition_paths, schedule_renditions
+from .search import get_backend
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    """
+    Keep the search index, upload references and image renditions in step
+    with the post.
+    """
+    get_backend().index(instance.pk)
+    sync_post_assets(instance)
+    if needs_renditions(instance):
+        schedule_renditions(Post, instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    get_backend().remove(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def delete_renditions_on_delete(sender, instance, **kwargs):
+    """
+    Delete the resized copies of the featured image with the post; the
+    image itself is left to orphan cleanup.
+    """
+    for path in rendition_paths(instance.featured_image_renditions):
+        default_storage.delete(path)
+
+
+@receiver([post_save, post_delete], sender=Post)
+def refresh_feeds(sender, instance, **kwargs):
+    """
+    Feeds list published posts only, so saving a draft that was not
+    published before leaves them cached. An unknown earlier status counts
+    as published.
+    """
+    was = None if kwargs.get("created") else getattr(instance, "_loaded_status", "published")
+    if "published" in (instance.status, was):
+        invalidate_feeds(instance.author_id)
+    instance._loaded_status = instance.status
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    # compared on save by refresh_author; None when deferred
+    instance._loaded_username = instance.__dict__.get("username")
+
+
+@receiver(post_save, sender=User)
+def refresh_author(sender, instance, created=False, update_fields=None, **kwargs):
+    """
+    Listings and feeds name their authors, so a rename drops them. An
+    unknown earlier username counts as changed; saves that leave it alone,
+    like the one at login, do not.
+    """
+    if not created and (update_fields is None or "username" in update_fields):
+        if instance._loaded_username != instance.username:
+            invalidate_author(instance.pk)
+    instance._loaded_username = instance.username
+
+
+def deletes_post_of(comment, origin):
+    """
+    Whether deleting ``origin`` (what delete() was called on: a post, a
+    user or a queryset of either) takes ``comment``'s post with it, leaving
+    no counts or cached pages of it to keep up to date.
+    """
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if model is Post:
+        return True
+    if model is not User:
+        return False
+    # looked up once per delete() and kept on the origin
+    post_ids = getattr(origin, "_deleted_post_ids", None)
+    if post_ids is None:
+        authors = [origin.pk] if isinstance(origin, User) else origin.values("pk")
+        post_ids = origin._deleted_post_ids = set(
+            Post.objects.filter(author__in=authors).values_list("pk", flat=True)
+        )
+    return comment.post_id in post_ids
+
+
+@receiver(pre_delete, sender=Comment)
+def uncount_comment(sender, instance, origin=None, **kwargs):
+    """
+    Runs for single, bulk and cascading deletes alike, before any row is
+    gone, so each comment is taken off the ancestors that count it.
+    Comments going with their post are left alone, which keeps deleting a
+    post or its author to a few queries however many comments it has.
+    """
+    if instance.approved and not deletes_post_of(instance, origin):
+        adjust_comment_count(instance.post_id, -1)
+        adjust_reply_counts(instance.post_id, instance.path, -1)
+
+
+@receiver(m2m_changed, sender=Post.liked_by.through)
+def forget_liked_sets(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Likes changed through the relation rather than toggle_like (admin,
+    scripts, tests): drop the cached liked sets of the users involved.
+    """
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        forget_liked([instance.pk])
+    elif action == "pre_clear":
+        forget_liked(instance.liked_by.values_list("pk", flat=True))
+    else:
+        forget_liked(pk_set)
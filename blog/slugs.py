@@ -0,0 +1,99 @@
+"""
+Unique slug allocation for posts.
+
+Same-titled posts get ``base``, ``base-1``, ``base-2``... ``base`` is used
+whenever no post has it, whatever ``base-<n>`` slugs exist. The next free
+suffix is found with a single query over the range of the unique slug index
+that holds ``base`` and every ``base-<n>``, instead of probing one candidate
+per query. Two creates can still pick the same slug at the same moment;
+``Post.save`` retries when the unique constraint rejects one of them.
+"""
+import re
+from functools import reduce
+from operator import or_
+
+from django.db.models import BigIntegerField, Case, Count, Max, Q, Value, When
+from django.db.models.functions import Cast, Substr
+from django.utils.text import slugify
+
+# leave room for a "-<n>" suffix inside SlugField(max_length=200)
+MAX_BASE_LENGTH = 190
+# longer digit runs are part of a title ("Phone 5551234567890123456"), not a
+# suffix this module handed out, and would overflow a bigint
+MAX_SUFFIX_DIGITS = 18
+
+
+def slug_base(text):
+    return slugify(text)[:MAX_BASE_LENGTH].strip("-") or "post"
+
+
+def _taken(base):
+    """Rows holding ``base`` itself or ``base-<number>``."""
+    # "." sorts right after "-", so this is a range scan of the slug index
+    return Q(slug=base) | Q(
+        slug__gt=f"{base}-",
+        slug__lt=f"{base}.",
+        slug__regex=rf"^{re.escape(base)}-[0-9]{{1,{MAX_SUFFIX_DIGITS}}}$",
+    )
+
+
+def _suffix(slug, base):
+    """Suffix number of ``slug`` for ``base``: 0 for the base itself."""
+    if slug == base:
+        return 0
+    rest = slug[len(base) + 1:]
+    if slug.startswith(f"{base}-") and rest.isdigit() and len(rest) <= MAX_SUFFIX_DIGITS:
+        return int(rest)
+    return None
+
+
+def next_free_slug(base):
+    """Return ``base`` if it is free, else ``base-<n>`` one past the highest n in use."""
+    from .models import Post
+
+    taken = Post.objects.filter(_taken(base)).aggregate(
+        exact=Count("pk", filter=Q(slug=base)),
+        n=Max(
+            Case(
+                When(slug=base, then=Value(0)),
+                default=Cast(Substr("slug", len(base) + 2), BigIntegerField()),
+                output_field=BigIntegerField(),
+            )
+        ),
+    )
+    if not taken["exact"]:
+        return base
+    return f"{base}-{taken['n'] + 1}"
+
+
+def allocate_slugs(bases):
+    """
+    Return a unique slug for each base in ``bases``, in order, with one query
+    for the whole batch. Repeated bases within the batch get distinct slugs.
+    """
+    from .models import Post
+
+    distinct = set(bases)
+    if not distinct:
+        return []
+
+    highest = {}
+    exact = set()
+    taken = Post.objects.filter(reduce(or_, (_taken(base) for base in distinct)))
+    for slug in taken.values_list("slug", flat=True):
+        if slug in distinct:
+            exact.add(slug)
+        for base in distinct:
+            n = _suffix(slug, base)
+            if n is not None and n > highest.get(base, 0):
+                highest[base] = n
+
+    slugs = []
+    for base in bases:
+        if base not in exact:
+            slugs.append(base)
+            exact.add(base)
+        else:
+            highest[base] = highest.get(base, 0) + 1
+            slugs.append(f"{base}-{highest[base]}")
+    return slugs
@@ -0,0 +1,54 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const container = document.getElementById('posts-container');
+    if (!container || !('IntersectionObserver' in window)) {
+        return; // the "Older posts" link still works without JS
+    }
+
+    let loading = false;
+
+    const observer = new IntersectionObserver(function(entries) {
+        entries.forEach(function(entry) {
+            if (entry.isIntersecting) {
+                loadMore(entry.target);
+            }
+        });
+    }, { rootMargin: '400px' });
+
+    function watch() {
+        const sentinel = document.querySelector('main > .load-more');
+        if (sentinel) {
+            observer.observe(sentinel);
+        }
+    }
+
+    function loadMore(sentinel) {
+        if (loading) return;
+        loading = true;
+        observer.unobserve(sentinel);
+
+        fetch(sentinel.dataset.nextUrl, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+            .then(response => response.text())
+            .then(html => {
+                const page = document.createElement('div');
+                page.innerHTML = html;
+
+                page.querySelectorAll('.post-link').forEach(card => container.appendChild(card));
+
+                const next = page.querySelector('.load-more');
+                if (next) {
+                    sentinel.replaceWith(next);
+                } else {
+                    sentinel.remove();
+                }
+            })
+            .catch(error => {
+                console.error('Error:', error);
+            })
+            .finally(() => {
+                loading = false;
+                watch();
+            });
+    }
+
+    watch();
+});
@@ -30,7 +30,18 @@ document.addEventListener('DOMContentLoaded', function() {
     };
 
     const commentForm = document.getElementById('comment-form');
+    const parentInput = document.getElementById('comment-parent');
+    const replyingTo = document.getElementById('replying-to');
+
+    function cancelReply() {
+        if (parentInput) {
+            parentInput.value = '';
+            replyingTo.hidden = true;
+        }
+    }
+
     if (commentForm) {
+        document.getElementById('cancel-reply').addEventListener('click', cancelReply);
         const trixEditor = commentForm.querySelector('trix-editor');
         if (trixEditor) {
             trixEditor.addEventListener('trix-file-accept', function(e) {
@@ -58,6 +69,7 @@ document.addEventListener('DOMContentLoaded', function() {
                         if (trixEditor) {
                             trixEditor.editor.loadHTML('');
                         }
+                        cancelReply();
 
                         // Update comments count
                         const newCount = parseInt(document.getElementById('comments-count').textContent) + 1;
@@ -73,20 +85,75 @@ document.addEventListener('DOMContentLoaded', function() {
                         }
 
                         const newComment = document.createElement('div');
-                        newComment.className = 'comment';
+                        newComment.className = data.depth ? 'comment comment-reply' : 'comment';
+                        newComment.dataset.id = data.id;
+                        newComment.dataset.depth = data.depth;
+                        newComment.style.setProperty('--depth', data.depth);
                         newComment.innerHTML = `
                         <p class="comment-meta">
                             <span class="comment-author">${data.author}</span> 
                             on ${data.created_date}
                         </p>
                         <p class="comment-content">${data.content}</p>
+                        <button type="button" class="reply-button" data-id="${data.id}" data-author="${data.author}">Reply</button>
                     `;
 
-                        commentsList.insertBefore(newComment, commentsList.firstChild);
+                        const parent = data.parent && commentsList.querySelector(`.comment[data-id="${data.parent}"]`);
+                        if (parent) {
+                            // replies read oldest first: after the parent's last reply
+                            let last = parent;
+                            while (last.nextElementSibling && Number(last.nextElementSibling.dataset.depth) > Number(parent.dataset.depth)) {
+                                last = last.nextElementSibling;
+                            }
+                            last.after(newComment);
+                        } else {
+                            commentsList.insertBefore(newComment, commentsList.firstChild);
+                        }
+                    }
+                })
+                .catch(error => {
+                    console.error('Error:', error);
+                });
+        });
+    }
+
+    // Older threads and deep replies load on demand; the links work without JS
+    const commentsList = document.getElementById('comments-list');
+    if (commentsList) {
+        commentsList.addEventListener('click', function(event) {
+            const replyButton = event.target.closest('.reply-button');
+            if (replyButton && parentInput) {
+                parentInput.value = replyButton.dataset.id;
+                document.getElementById('replying-to-author').textContent = replyButton.dataset.author;
+                replyingTo.hidden = false;
+                commentForm.scrollIntoView({ behavior: 'smooth' });
+                return;
+            }
+
+            const sentinel = event.target.closest('.load-more-comments');
+            if (!sentinel) return;
+            event.preventDefault();
+            if (sentinel.dataset.loading) return;
+            sentinel.dataset.loading = 'true';
+
+            fetch(sentinel.dataset.nextUrl, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+                .then(response => response.text())
+                .then(html => {
+                    const page = document.createElement('div');
+                    page.innerHTML = html;
+
+                    page.querySelectorAll('.comment').forEach(comment => sentinel.before(comment));
+
+                    const next = page.querySelector('.load-more-comments');
+                    if (next) {
+                        sentinel.replaceWith(next);
+                    } else {
+                        sentinel.remove();
                     }
                 })
                 .catch(error => {
                     console.error('Error:', error);
+                    delete sentinel.dataset.loading;
                 });
         });
     }
@@ -1,7 +1,79 @@
 from django import template
+from django.templatetags.static import static
+from django.utils.html import escape, format_html
+from django.utils.safestring import mark_safe
+
+from blog.search import MARK_END, MARK_START
+from blog.renditions import srcset
+from blog.uploads import staged_url
 
 register = template.Library()
 
+
+@register.filter
+def highlight(snippet):
+    """
+    Render a search snippet with the matched terms wrapped in <mark>.
+    The snippet text is escaped first; only the markers become HTML.
+    """
+    html = escape(snippet or "")
+    return mark_safe(html.replace(MARK_START, "<mark>").replace(MARK_END, "</mark>"))
+
+
+@register.filter
+def image_url(image):
+    """URL of an image field, including images still waiting in staging."""
+    return staged_url(image.name) if image else ""
+
+
+@register.simple_tag
+def responsive_image(image, renditions, sizes="100vw", alt="", css_class="", loading="lazy"):
+    """
+    Render an image field as a <picture> with WebP and JPEG srcsets, its
+    intrinsic size and a blurred placeholder. Until its renditions exist
+    (see blog.renditions), a plain lazy-loaded <img> of the original.
+    """
+    if not image:
+        return ""
+    if not renditions or renditions.get("source") != image.name:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">',
+            staged_url(image.name), alt, css_class, loading,
+        )
+
+    fallback = renditions["sources"]["jpeg"][-1][1]
+    return format_html(
+        '<picture class="responsive-image">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" class="{}" '
+        'loading="{}" decoding="async" style="background: url({}) center / cover no-repeat">'
+        '</picture>',
+        srcset(renditions, "webp"), sizes,
+        staged_url(fallback), srcset(renditions, "jpeg"), sizes,
+        renditions["width"], renditions["height"], alt, css_class,
+        loading, renditions["placeholder"],
+    )
+
+
+@register.simple_tag
+def avatar(card, sizes="40px", css_class="", loading="lazy"):
+    """Avatar <img> from an author card (see accounts.cards), or the default avatar."""
+    if not card or not card.get("avatar"):
+        return format_html(
+            '<img src="{}" alt="{}" class="{}">',
+            static("blog/images/default-avatar.png"), card["username"] if card else "", css_class,
+        )
+    if not card["avatar_srcset"]:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">',
+            card["avatar"], card["username"], css_class, loading,
+        )
+    return format_html(
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="{}" decoding="async">',
+        card["avatar"], card["avatar_srcset"], sizes, card["username"], css_class, loading,
+    )
+
+
 @register.simple_tag(takes_context=True)
 def should_hide_search(context):
     """
@@ -1,10 +1,46 @@
 from datetime import timedelta
 from django.utils import timezone
 from django.contrib.auth.models import User
+from accounts.models import Profile
 from django.test import TestCase
-from .models import Post, Comment
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.urls import reverse
+from django.test import override_settings
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.template import Context, Template
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import FileSystemStorage, InMemoryStorage
+from io import BytesIO, StringIO
+import hashlib
+import os
+import shutil
+import tempfile
+from PIL import Image
+from unittest import mock
+from .counters import flush_views, lag, pending_views, record_view
+from .likes import LIKED_KEY, LIKED_LOCK_KEY, decode_ids, encode_ids, has_liked, toggle_like
+from .pagination import keyset_page
+from .slugs import next_free_slug
+from .threads import REPLY_DEPTH, approved_comments, delete_thread, move_thread, subtree, thread_page
+from .search import search_posts
+from .assets import orphaned_uploads
+from .cleanup import SCOPES, clean
+from .renditions import rendition_paths, update_renditions
+from .uploads import transfer
+from .models import MAX_DEPTH, Post, PostAsset, Comment, Upload
 from .forms import CommentForm, PostForm
 
+# smallest valid image for ImageField uploads
+GIF_BYTES = (
+    b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00"
+    b",\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+)
+
 
 class PostModelTest(TestCase):
     @classmethod
@@ -55,6 +91,78 @@ class PostModelTest(TestCase):
         self.assertNotEqual(post.slug, self.post.slug)
         self.assertTrue(post.slug.endswith("-1"))
 
+    def test_slug_allocation_is_one_query(self):
+        """Finding the next free suffix costs one query however many exist"""
+        Post.objects.bulk_create([
+            Post(title="Week 1 notes", content="notes", author=self.user) for _ in range(30)
+        ])
+        with self.assertNumQueries(1):
+            slug = next_free_slug("week-1-notes")
+        self.assertEqual(slug, "week-1-notes-30")
+
+    def test_free_base_slug_is_used_despite_numbered_ones(self):
+        Post.objects.create(title="Week 1 notes 2024", content="x", author=self.user)
+        self.assertEqual(next_free_slug("week-1-notes"), "week-1-notes")
+        posts = Post.objects.bulk_create([
+            Post(title="Week 1 notes", content="x", author=self.user) for _ in range(2)
+        ])
+        self.assertEqual([p.slug for p in posts], ["week-1-notes", "week-1-notes-2025"])
+        self.assertEqual(next_free_slug("week-1-notes"), "week-1-notes-2026")
+
+    def test_long_numbers_in_titles_are_not_suffixes(self):
+        Post.objects.create(title="Phone", content="x", author=self.user)
+        Post.objects.create(title="Phone 5551234567890123456789", content="x", author=self.user)
+        self.assertEqual(next_free_slug("phone"), "phone-1")
+        post = Post.objects.bulk_create([Post(title="Phone", content="x", author=self.user)])[0]
+        self.assertEqual(post.slug, "phone-1")
+
+    def test_slug_suffix_ignores_other_titles(self):
+        """Slugs that merely start with the base do not count as collisions"""
+        Post.objects.create(title="Test Post Extended", content="x", author=self.user)
+        post = Post.objects.create(title="Test Post", content="x", author=self.user)
+        self.assertEqual(post.slug, "test-post-1")
+
+    def test_slug_retry_after_race(self):
+        """A slug taken between allocation and insert is retried"""
+        from . import models
+
+        real = models.next_free_slug
+        calls = []
+
+        def stale(base):
+            calls.append(base)
+            # first answer is already taken, as if another request won the race
+            return "test-post" if len(calls) == 1 else real(base)
+
+        with mock.patch.object(models, "next_free_slug", side_effect=stale):
+            post = Post.objects.create(title="Test Post", content="x", author=self.user)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(post.slug, "test-post-1")
+
+    def test_bulk_create_drops_cached_listings(self):
+        from .caching import FEEDS_LISTING, POSTS_LISTING, author_listing, listing_generation
+
+        names = [POSTS_LISTING, author_listing(self.user.pk), FEEDS_LISTING]
+        before = [listing_generation(name) for name in names]
+        Post.objects.bulk_create([Post(title="Draft", content="x", author=self.user)])
+        after = [listing_generation(name) for name in names]
+        self.assertNotEqual(after[:2], before[:2])
+        self.assertEqual(after[2], before[2])
+
+        Post.objects.bulk_create([
+            Post(title="Live", content="x", author=self.user, status="published")
+        ])
+        self.assertNotEqual(listing_generation(FEEDS_LISTING), after[2])
+
+    def test_bulk_create_allocates_unique_slugs(self):
+        posts = Post.objects.bulk_create([
+            Post(title="Test Post", content="<p>one two</p>", author=self.user),
+            Post(title="Test Post", content="x", author=self.user),
+            Post(title="Fresh", content="x", author=self.user),
+        ])
+        self.assertEqual([p.slug for p in posts], ["test-post-1", "test-post-2", "fresh"])
+        self.assertEqual(posts[0].word_count, 2)
+
     def test_reading_time_calculation(self):
         """Test the calculation of the reading time for a post."""
         post = Post(
@@ -81,6 +189,52 @@ class PostModelTest(TestCase):
         self.assertGreater(post.reading_time, 0)
 
 
+class ContentAnalysisTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="testpass123")
+
+    def test_word_count_ignores_markup(self):
+        """Tags are not words, and block tags separate words"""
+        post = Post.objects.create(
+            title="Markup",
+            content='<div>one <strong class="x y z">two</strong></div><div>three&nbsp;four</div>',
+            author=self.user,
+        )
+        self.assertEqual(post.plain_text, "one two three four")
+        self.assertEqual(post.word_count, 4)
+        self.assertEqual(post.reading_time, 1)
+
+    def test_excerpts_are_stored(self):
+        words = " ".join(f"word{i}" for i in range(40))
+        post = Post.objects.create(title="Long", content=f"<p>{words}</p>", author=self.user)
+        self.assertEqual(post.list_excerpt, " ".join(words.split()[:20]) + " …")
+        self.assertEqual(post.overlay_excerpt, " ".join(words.split()[:30]) + " …")
+        self.assertEqual(post.excerpt, words[:100] + "...")
+        self.assertEqual(post.reading_time, max(1, round(40 / 200)))
+
+    def test_index_does_not_load_content(self):
+        Post.objects.create(title="Listed", content="<p>Body</p>", author=self.user, status="published")
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse("blog:index"))
+        post_queries = [q["sql"] for q in context.captured_queries if 'FROM "blog_post"' in q["sql"]]
+        self.assertTrue(post_queries)
+        for sql in post_queries:
+            self.assertNotIn('"blog_post"."content"', sql)
+
+    def test_backfill_post_content_command(self):
+        post = Post.objects.create(title="Old", content="<p>old post body</p>", author=self.user)
+        Post.objects.filter(pk=post.pk).update(plain_text="", list_excerpt="", word_count=0)
+
+        out = StringIO()
+        call_command("backfill_post_content", "--batch-size", "1", stdout=out)
+        post.refresh_from_db()
+        self.assertEqual(post.plain_text, "old post body")
+        self.assertEqual(post.list_excerpt, "old post body")
+        self.assertEqual(post.word_count, 3)
+        self.assertIn("Backfilled 1 posts", out.getvalue())
+
+
 class CommentModelTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -109,9 +263,80 @@ class CommentModelTest(TestCase):
         """Test the __str__ method of the Comment model."""
         self.assertEqual(str(self.comment), "Comment by testuser on Test Post")
 
+    def count(self):
+        return Post.objects.values_list("approved_comments_count", flat=True).get(pk=self.post.pk)
+
+    def test_approved_comments_count_follows_changes(self):
+        """Create, unapprove, approve and delete keep the count in step"""
+        self.assertEqual(self.count(), 1)
+
+        second = Comment.objects.create(post=self.post, author=self.user, content="Second")
+        Comment.objects.create(post=self.post, author=self.user, content="Hidden", approved=False)
+        self.assertEqual(self.count(), 2)
+
+        second.approved = False
+        second.save()
+        self.assertEqual(self.count(), 1)
+        second.save()
+        self.assertEqual(self.count(), 1)
+
+        second = Comment.objects.get(pk=second.pk)
+        second.approved = True
+        second.save()
+        self.assertEqual(self.count(), 2)
+
+        second.delete()
+        self.assertEqual(self.count(), 1)
+
+    def test_bulk_approval_adjusts_counts(self):
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.user, content=f"Pending {i}", approved=False)
+            for i in range(3)
+        ])
+        changed = Comment.objects.filter(post=self.post).set_approved(True)
+        self.assertEqual(changed, 3)
+        self.assertEqual(self.count(), 4)
+
+        Comment.objects.filter(post=self.post).set_approved(False)
+        self.assertEqual(self.count(), 0)
+
+        Comment.objects.filter(post=self.post).delete()
+        self.assertEqual(self.count(), 0)
+
+    def test_deleting_a_post_skips_per_comment_counting(self):
+        def delete_queries(comments):
+            post = Post.objects.create(title=f"Busy {comments}", content="Content", author=self.user)
+            Comment.objects.bulk_create(
+                Comment(post=post, author=self.user, content="Hi", path=f"{i:010d}")
+                for i in range(comments)
+            )
+            with CaptureQueriesContext(connection) as context:
+                post.delete()
+            return len(context.captured_queries)
+
+        self.assertEqual(delete_queries(50), delete_queries(5))
+
+    def test_deleting_a_user_keeps_counts_on_other_posts(self):
+        other = User.objects.create_user(username="other", password="testpass")
+        own = Post.objects.create(title="Own", content="Content", author=other)
+        Comment.objects.create(post=own, author=self.user, content="On their post")
+        reply = Comment.objects.create(post=self.post, author=other, content="Reply", parent=self.comment)
+        Comment.objects.create(post=self.post, author=self.user, content="Nested", parent=reply)
+        self.assertEqual(self.count(), 3)
+
+        User.objects.filter(pk=other.pk).delete()
+        self.assertEqual(self.count(), 1)
+        self.assertEqual(Comment.objects.get(pk=self.comment.pk).reply_count, 0)
+
+    def test_repair_comment_counts_command(self):
+        Post.objects.filter(pk=self.post.pk).update(approved_comments_count=9)
+        out = StringIO()
+        call_command("repair_comment_counts", stdout=out)
+        self.assertEqual(self.count(), 1)
+        self.assertIn("Done: 1 of 1 posts corrected", out.getvalue())
+
 
 # Test Views
-from django.urls import reverse
 
 class IndexViewTest(TestCase):
     @classmethod
@@ -146,6 +371,69 @@ class IndexViewTest(TestCase):
         )
 
 
+class KeysetPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="testpass123")
+        now = timezone.now()
+        # two posts share a pub_date so the id tiebreaker matters
+        cls.posts = [
+            Post.objects.create(
+                title=f"Post {i}",
+                content="Paged content.",
+                author=cls.user,
+                status="published",
+                pub_date=now - timedelta(hours=i // 2),
+            )
+            for i in range(25)
+        ]
+
+    def test_index_paginates_with_cursor(self):
+        seen = []
+        url = reverse("blog:index")
+        response = self.client.get(url)
+        self.assertEqual(len(response.context["posts"]), 10)
+        while True:
+            seen.extend(response.context["posts"])
+            cursor = response.context["next_cursor"]
+            if not cursor:
+                break
+            response = self.client.get(url, {"cursor": cursor})
+
+        expected = list(Post.objects.order_by("-pub_date", "-id"))
+        self.assertEqual(seen, expected)
+
+    def test_deep_page_has_constant_query_count(self):
+        queryset = Post.objects.filter(status="published")
+        page = keyset_page(queryset, size=5)
+        while page.next_cursor:
+            cursor = page.next_cursor
+            page = keyset_page(queryset, cursor, size=5)
+        with self.assertNumQueries(1):
+            keyset_page(queryset, cursor, size=5)
+
+    def test_previous_cursor_walks_back(self):
+        queryset = Post.objects.all()
+        first = keyset_page(queryset, size=10)
+        second = keyset_page(queryset, first.next_cursor, size=10)
+        back = keyset_page(queryset, second.previous_cursor, size=10)
+        self.assertEqual(back.items, first.items)
+        self.assertIsNone(back.previous_cursor)
+
+    def test_fragment_endpoint_renders_cards(self):
+        response = self.client.get(reverse("blog:index"))
+        cursor = response.context["next_cursor"]
+        response = self.client.get(reverse("blog:post_list_fragment"), {"cursor": cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'class="post-link"', count=10)
+        self.assertNotContains(response, "<main>")
+        self.assertContains(response, 'class="load-more"')
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(reverse("blog:index"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+
 class PostDetailViewTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -163,6 +451,10 @@ class PostDetailViewTest(TestCase):
             content="This is a test comment.",
         )
 
+    def setUp(self):
+        # buffered views from other tests must not leak into these counts
+        cache.clear()
+
     def test_post_detail_view(self):
         """Test that the post detail view returns the correct post."""
         response = self.client.get(reverse("blog:post_detail", args=[self.post.slug]))
@@ -174,9 +466,41 @@ class PostDetailViewTest(TestCase):
         """Test that the post detail view increments the views count."""
         initial_views = self.post.views_count
         self.client.get(reverse("blog:post_detail", args=[self.post.slug]))
+        flush_views()
         self.post.refresh_from_db()
         self.assertEqual(self.post.views_count, initial_views + 1)
 
+    def test_conditional_get_returns_304_and_still_counts_the_view(self):
+        url = reverse("blog:post_detail", args=[self.post.slug])
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertIn("public", response["Cache-Control"])
+        self.assertFalse(response.has_header("Last-Modified"))
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        # never loads the comments or the full post
+        self.assertFalse(any("blog_comment" in query["sql"] for query in context.captured_queries))
+        flush_views()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 2)
+
+    def test_etag_changes_with_content_and_viewer(self):
+        url = reverse("blog:post_detail", args=[self.post.slug])
+        etag = self.client.get(url)["ETag"]
+
+        Comment.objects.create(post=self.post, author=self.user, content="Another one", approved=True)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Another one")
+
+        self.client.login(username="testuser", password="testpass123")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("private", response["Cache-Control"])
+
     def test_future_post_returns_404(self):
         future_post = Post.objects.create(
             title="Future Post",
@@ -189,6 +513,116 @@ class PostDetailViewTest(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
+class ViewCounterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="testpass123")
+        cls.post = Post.objects.create(
+            title="Test Post",
+            content="This is a test post.",
+            author=cls.user,
+            status="published",
+        )
+        cls.other = Post.objects.create(
+            title="Other Post",
+            content="This is another test post.",
+            author=cls.user,
+            status="published",
+        )
+
+    def setUp(self):
+        cache.clear()
+        # pretend a flush just ran so views stay buffered
+        cache.set("views:next_flush", 1, 60)
+
+    def test_views_are_buffered_until_flush(self):
+        """Recording a view does not touch the post row until a flush."""
+        last_updated = self.post.last_updated
+        for _ in range(3):
+            record_view(self.post.pk)
+        record_view(self.other.pk)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 0)
+        self.assertEqual(pending_views(self.post.pk), 3)
+
+        updated, written = flush_views()
+        self.assertEqual(updated, 2)
+        self.assertEqual(written, {self.post.pk: 3, self.other.pk: 1})
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 3)
+        self.assertEqual(self.post.last_updated, last_updated)
+        self.assertEqual(pending_views(self.post.pk), 0)
+
+    def test_views_after_flush_are_counted_again(self):
+        record_view(self.post.pk)
+        flush_views()
+        record_view(self.post.pk)
+        record_view(self.post.pk)
+        flush_views()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 3)
+
+    def test_flush_survives_an_evicted_sequence(self):
+        for _ in range(3):
+            record_view(self.other.pk)
+            flush_views()
+        cache.delete("views:seq")
+        record_view(self.post.pk)
+        self.assertEqual(flush_views(), (1, {self.post.pk: 1}))
+        record_view(self.post.pk)
+        self.assertEqual(flush_views(), (1, {self.post.pk: 1}))
+
+    def test_flush_uses_one_update_per_distinct_increment(self):
+        record_view(self.post.pk)
+        record_view(self.other.pk)
+        # one UPDATE, plus the savepoint around it
+        with self.assertNumQueries(3):
+            flush_views()
+
+    def test_failed_flush_keeps_pending_views(self):
+        """Views stay buffered when writing them to the database fails."""
+        record_view(self.post.pk)
+        record_view(self.post.pk)
+        with mock.patch.object(Post.objects, "filter", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                flush_views()
+
+        self.assertEqual(pending_views(self.post.pk), 2)
+        flush_views()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 2)
+
+    def test_increment_views_does_not_save(self):
+        """increment_views reports the buffered total without post_save."""
+        from django.db.models.signals import post_save
+
+        saves = []
+        handler = lambda **kwargs: saves.append(kwargs)
+        post_save.connect(handler, sender=Post)
+        try:
+            post = Post.objects.get(pk=self.post.pk)
+            post.increment_views()
+            post.increment_views()
+        finally:
+            post_save.disconnect(handler, sender=Post)
+
+        self.assertEqual(saves, [])
+        self.assertEqual(post.views_count, 2)
+
+    def test_flush_command_reports_lag(self):
+        record_view(self.post.pk)
+        record_view(self.post.pk)
+        self.assertEqual(lag()["views"], 2)
+
+        out = StringIO()
+        call_command("flush_view_counts", stdout=out)
+        self.assertIn("Pending: 2 views on 1 posts", out.getvalue())
+        self.assertIn("Flushed 2 views to 1 posts", out.getvalue())
+        self.assertEqual(lag()["views"], 0)
+
+
 class LikePostViewTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -222,6 +656,403 @@ class LikePostViewTest(TestCase):
         self.assertFalse(response.json()["user_has_liked"])
 
 
+class ToggleLikeTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="testpass123")
+        cls.post = Post.objects.create(
+            title="Test Post",
+            content="This is a test post.",
+            author=cls.user,
+            status="published",
+        )
+
+    def test_toggle_like_constant_queries(self):
+        """Toggle cost does not depend on how many users liked the post."""
+        likers = User.objects.bulk_create(
+            [User(username=f"liker{i}") for i in range(50)]
+        )
+        self.post.liked_by.add(*likers)
+        Post.objects.filter(pk=self.post.pk).update(likes=50)
+
+        def statements(context):
+            return [
+                q["sql"] for q in context.captured_queries
+                if not any(x in q["sql"] for x in ["SAVEPOINT", "RELEASE"])
+            ]
+
+        with CaptureQueriesContext(connection) as context:
+            liked, likes = toggle_like(self.post, self.user)
+        self.assertTrue(liked)
+        self.assertEqual(likes, 51)
+        # delete attempt, insert, counter update, counter read
+        self.assertEqual(len(statements(context)), 4)
+
+        with CaptureQueriesContext(connection) as context:
+            liked, likes = toggle_like(self.post, self.user)
+        self.assertFalse(liked)
+        self.assertEqual(likes, 50)
+        self.assertEqual(len(statements(context)), 3)
+
+    def test_toggle_like_does_not_save_post(self):
+        last_updated = self.post.last_updated
+        toggle_like(self.post, self.user)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.last_updated, last_updated)
+        self.assertEqual(self.post.likes, 1)
+
+    def test_reconcile_likes_command(self):
+        self.post.liked_by.add(self.user)
+        Post.objects.filter(pk=self.post.pk).update(likes=7)
+
+        out = StringIO()
+        call_command("reconcile_likes", "--batch-size", "1", stdout=out)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes, 1)
+        self.assertIn("Done: 1 of 1 posts corrected", out.getvalue())
+
+
+class LikedSetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="testpass123")
+        cls.posts = [
+            Post.objects.create(title=f"Post {i}", content="Body", author=cls.user, status="published")
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_encoding_is_packed(self):
+        self.assertEqual(len(encode_ids([30, 10, 20])), 24)
+        self.assertEqual(list(decode_ids(encode_ids([30, 10, 20]))), [10, 20, 30])
+
+    def test_toggle_keeps_cached_set_in_sync(self):
+        first, second, _ = self.posts
+        self.assertFalse(has_liked(self.user, first.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            toggle_like(first, self.user)
+            toggle_like(second, self.user)
+        with self.assertNumQueries(0):
+            self.assertTrue(has_liked(self.user, first.pk))
+            self.assertTrue(has_liked(self.user, second.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            toggle_like(first, self.user)
+        with self.assertNumQueries(0):
+            self.assertFalse(has_liked(self.user, first.pk))
+            self.assertTrue(has_liked(self.user, second.pk))
+
+    def test_concurrent_toggle_marks_set_stale(self):
+        first = self.posts[0]
+        has_liked(self.user, first.pk)
+        cache.add(LIKED_LOCK_KEY.format(self.user.pk), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            toggle_like(first, self.user)
+        # rebuilt from the database while the mark lasts
+        with self.assertNumQueries(1):
+            self.assertTrue(has_liked(self.user, first.pk))
+
+    def test_toggle_without_cached_set_marks_it_stale(self):
+        first = self.posts[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            toggle_like(first, self.user)
+        # a reader that loaded the set before the toggle committed
+        cache.add(LIKED_KEY.format(self.user.pk), encode_ids([]))
+        self.assertTrue(has_liked(self.user, first.pk))
+        self.assertIsNone(cache.get(LIKED_KEY.format(self.user.pk)))
+
+    def test_relation_changes_drop_the_set(self):
+        first = self.posts[0]
+        has_liked(self.user, first.pk)
+        first.liked_by.add(self.user)
+        self.assertTrue(has_liked(self.user, first.pk))
+        first.liked_by.clear()
+        self.assertFalse(has_liked(self.user, first.pk))
+
+    def test_detail_page_never_reads_the_likers(self):
+        first = self.posts[0]
+        first.liked_by.add(self.user)
+        self.client.login(username="testuser", password="testpass123")
+        url = reverse("blog:post_detail", args=[first.slug])
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertTrue(response.context["user_has_liked"])
+        self.assertFalse(any("liked_by" in query["sql"] for query in context.captured_queries))
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="testpass123")
+        cls.post = Post.objects.create(title="Busy Post", content="Body", author=cls.user, status="published")
+        for i in range(45):
+            Comment.objects.create(post=cls.post, author=cls.user, content=f"Comment {i}")
+        Comment.objects.create(post=cls.post, author=cls.user, content="Hidden", approved=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_renders_first_page_only(self):
+        response = self.client.get(reverse("blog:post_detail", args=[self.post.slug]))
+        self.assertEqual(
+            [c.content for c in response.context["comments"]], [f"Comment {i}" for i in range(44, 24, -1)]
+        )
+        self.assertContains(response, 'class="comment"', count=20)
+        self.assertContains(response, reverse("blog:comment_list", args=[self.post.slug]))
+
+    def test_fragment_walks_remaining_comments(self):
+        response = self.client.get(reverse("blog:post_detail", args=[self.post.slug]))
+        seen = [c.content for c in response.context["comments"]]
+        cursor = response.context["comments_next"]
+        while cursor:
+            response = self.client.get(reverse("blog:comment_list", args=[self.post.slug]), {"cursor": cursor})
+            self.assertNotContains(response, "<main>")
+            seen.extend(c.content for c in response.context["comments"])
+            cursor = response.context["comments_next"]
+        self.assertEqual(seen, [f"Comment {i}" for i in range(44, -1, -1)])
+
+    def test_fragment_follows_post_visibility(self):
+        self.post.status = "draft"
+        self.post.save()
+        url = reverse("blog:comment_list", args=[self.post.slug])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.login(username="testuser", password="testpass123")
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url, {"cursor": "bogus"}).status_code, 404)
+
+
+class CommentThreadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="testpass123")
+        cls.post = Post.objects.create(title="Thread Post", content="Body", author=cls.user, status="published")
+
+    def setUp(self):
+        cache.clear()
+
+    def reply(self, parent=None, content="Reply", **kwargs):
+        return Comment.objects.create(post=self.post, author=self.user, parent=parent, content=content, **kwargs)
+
+    def refresh(self, *comments):
+        for comment in comments:
+            comment.refresh_from_db()
+
+    def test_path_orders_newest_thread_then_replies_in_order(self):
+        first = self.reply(content="first")
+        second = self.reply(content="second")
+        a = self.reply(first, "a")
+        b = self.reply(first, "b")
+        a1 = self.reply(a, "a1")
+        ordered = Comment.objects.filter(post=self.post).order_by("path")
+        self.assertEqual([c.content for c in ordered], ["second", "first", "a", "a1", "b"])
+        self.assertEqual(a1.depth, 2)
+
+    def test_reply_counts_follow_replies_and_approval(self):
+        top = self.reply()
+        child = self.reply(top)
+        grandchild = self.reply(child)
+        self.refresh(top, child)
+        self.assertEqual((top.reply_count, child.reply_count), (2, 1))
+
+        Comment.objects.filter(pk=grandchild.pk).set_approved(False)
+        self.refresh(top, child)
+        self.assertEqual((top.reply_count, child.reply_count), (1, 0))
+
+        child.delete()
+        top.refresh_from_db()
+        self.post.refresh_from_db()
+        self.assertEqual(top.reply_count, 0)
+        self.assertEqual(self.post.approved_comments_count, 1)
+
+    def test_reply_counts_skip_replies_under_unapproved_comments(self):
+        top = self.reply()
+        hidden = self.reply(top, approved=False)
+        below = self.reply(hidden)
+        self.reply(below)
+        self.refresh(top, hidden)
+        self.assertEqual((top.reply_count, hidden.reply_count), (0, 2))
+
+        Comment.objects.filter(pk=hidden.pk).set_approved(True)
+        top.refresh_from_db()
+        self.assertEqual(top.reply_count, 3)
+
+        Comment.objects.filter(pk__in=[hidden.pk, below.pk]).set_approved(False)
+        self.refresh(top, hidden)
+        self.assertEqual((top.reply_count, hidden.reply_count), (0, 0))
+
+        other = self.reply()
+        move_thread(below, other)
+        Comment.objects.filter(pk=below.pk).set_approved(True)
+        delete_thread(hidden)
+        self.refresh(top, other)
+        self.assertEqual((top.reply_count, other.reply_count), (0, 2))
+
+    def test_replies_stop_at_max_depth(self):
+        comment = self.reply()
+        for _ in range(MAX_DEPTH):
+            comment = self.reply(comment)
+        too_deep = self.reply(comment)
+        self.assertEqual(too_deep.depth, MAX_DEPTH)
+        self.assertEqual(too_deep.parent_id, comment.parent_id)
+
+    def test_thread_page_loads_in_two_queries(self):
+        for i in range(3):
+            top = self.reply(content=f"top {i}")
+            deep = self.reply(self.reply(top))
+            for _ in range(REPLY_DEPTH):
+                deep = self.reply(deep)
+        hidden = self.reply(top, approved=False)
+        self.reply(hidden)
+
+        with self.assertNumQueries(2):
+            page = thread_page(approved_comments(self.post.pk), size=2)
+        tops = [c for c in page.items if c.depth == 0]
+        self.assertEqual([c.content for c in tops], ["top 2", "top 1"])
+        self.assertTrue(all(c.depth <= REPLY_DEPTH for c in page.items))
+        self.assertTrue(page.items[-1].more_replies)
+        self.assertEqual(len(tops[0].thread_replies), 1)
+
+        page = thread_page(approved_comments(self.post.pk), page.next_cursor, size=2)
+        self.assertEqual([c.content for c in page.items if c.depth == 0], ["top 0"])
+        # the unapproved reply hides its own replies too
+        self.assertEqual(len(page.items[0].thread_replies), 1)
+        self.assertIsNone(page.next_cursor)
+
+    def test_move_thread(self):
+        left, right = self.reply(content="left"), self.reply(content="right")
+        branch = self.reply(left)
+        leaf = self.reply(branch)
+
+        # savepoint, totals, old ancestors (read, update), paths, parent,
+        # new ancestors (read, update), release
+        with self.assertNumQueries(9):
+            move_thread(branch, right)
+        self.refresh(left, right, leaf)
+        self.assertEqual((left.reply_count, right.reply_count), (0, 2))
+        self.assertTrue(leaf.path.startswith(right.path))
+        self.assertEqual(leaf.depth, 2)
+        self.assertEqual([c.pk for c in subtree(right)], [branch.pk, leaf.pk])
+
+        move_thread(branch)
+        leaf.refresh_from_db()
+        self.assertEqual((branch.depth, leaf.depth), (0, 1))
+        with self.assertRaises(ValueError):
+            move_thread(branch, leaf)
+
+    def test_delete_thread(self):
+        top = self.reply()
+        branch = self.reply(top)
+        self.reply(self.reply(branch))
+        self.reply(branch, approved=False)
+
+        self.assertEqual(delete_thread(branch), 4)
+        top.refresh_from_db()
+        self.post.refresh_from_db()
+        self.assertEqual(top.reply_count, 0)
+        self.assertEqual(self.post.approved_comments_count, 1)
+
+    def test_reply_from_detail_page(self):
+        top = self.reply()
+        other = Post.objects.create(title="Other", content="Body", author=self.user, status="published")
+        elsewhere = Comment.objects.create(post=other, author=self.user, content="Elsewhere")
+        self.client.login(username="testuser", password="testpass123")
+        url = reverse("blog:comment", args=[self.post.slug])
+
+        response = self.client.post(url, {"content": "Hi", "parent": top.pk})
+        self.assertEqual(response.json()["depth"], 1)
+        self.assertEqual(self.client.post(url, {"content": "Hi", "parent": elsewhere.pk}).status_code, 400)
+
+        response = self.client.get(reverse("blog:comment_list", args=[self.post.slug]), {"thread": top.pk})
+        self.assertContains(response, 'class="comment comment-reply"', count=1)
+
+
+class FeedTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="testpass123")
+        cls.other = User.objects.create_user(username="other", password="testpass123")
+        cls.post = Post.objects.create(
+            title="Feed Post", content="<p>The whole body of the post</p>", author=cls.user, status="published"
+        )
+        Post.objects.create(title="Other Post", content="Body", author=cls.other, status="published")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_list_excerpts_without_loading_content(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("blog:feed_atom"))
+        self.assertEqual(response["Content-Type"], "application/atom+xml; charset=utf-8")
+        self.assertContains(response, "<summary")
+        self.assertContains(response, "Feed Post")
+        self.assertFalse(any('"content"' in query["sql"] for query in context.captured_queries))
+
+        response = self.client.get(reverse("blog:author_feed_rss", args=["other"]))
+        self.assertContains(response, "Other Post")
+        self.assertNotContains(response, "Feed Post")
+        self.assertEqual(self.client.get(reverse("blog:author_feed_rss", args=["nobody"])).status_code, 404)
+
+    def test_feed_is_cached_and_revalidates(self):
+        url = reverse("blog:feed_rss")
+        response = self.client.get(url)
+        self.assertEqual(response["Cache-Control"], "public, no-cache")
+
+        with self.assertNumQueries(0):
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+        again = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(again.status_code, 304)
+
+    def test_feed_cache_ignores_query_strings(self):
+        url = reverse("blog:feed_rss")
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url, {"utm_source": "reader"})
+
+    def test_feed_follows_username_changes(self):
+        url = reverse("blog:feed_rss")
+        self.assertContains(self.client.get(url), "testuser")
+        self.user.username = "renamed"
+        self.user.save()
+        self.assertContains(self.client.get(url), "renamed")
+        self.assertContains(self.client.get(reverse("blog:author_feed_rss", args=["renamed"])), "Feed Post")
+
+    def test_feed_regenerates_only_for_published_posts(self):
+        url = reverse("blog:feed_rss")
+        etag = self.client.get(url)["ETag"]
+
+        draft = Post.objects.create(title="Draft", content="Body", author=self.user, status="draft")
+        draft.title = "Still a draft"
+        draft.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        draft.status = "published"
+        draft.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Still a draft")
+
+        draft = Post.objects.get(pk=draft.pk)
+        draft.status = "draft"
+        draft.save()
+        self.assertNotContains(self.client.get(url), "Still a draft")
+
+    def test_scheduled_post_appears_when_due(self):
+        now = timezone.now()
+        Post.objects.create(
+            title="Scheduled", content="Body", author=self.user, status="published", pub_date=now + timedelta(hours=1)
+        )
+        url = reverse("blog:feed_rss")
+        self.assertNotContains(self.client.get(url), "Scheduled")
+        with mock.patch("blog.feeds.timezone.now", return_value=now + timedelta(hours=2)):
+            self.assertContains(self.client.get(url), "Scheduled")
+
+
 # test forms
 class PostFormTest(TestCase):
     def test_post_form_valid_data(self):
@@ -340,3 +1171,451 @@ class SearchFunctionalityTests(TestCase):
         self.assertEqual(len(response.context['posts']), 1)
         self.assertEqual(response.context['posts'][0], self.post1)
 
+    def test_search_ranks_title_matches_first(self):
+        """Posts matching in the title outrank posts matching in the body"""
+        body_match = Post.objects.create(
+            title='Weekend notes',
+            content='Some thoughts on Python packaging',
+            author=self.user2,
+            status='published',
+        )
+        response = self.client.get(reverse('blog:search') + '?query=python')
+        self.assertEqual(list(response.context['posts']), [self.post2, body_match])
+
+    def test_search_highlights_matches(self):
+        """Snippets mark matched terms and escape the rest"""
+        Post.objects.create(
+            title='Escaping',
+            content='<p>compare a &lt;b&gt; tag with a glossary entry</p>',
+            author=self.user2,
+            status='published',
+        )
+        response = self.client.get(reverse('blog:search') + '?query=glossary')
+        self.assertContains(response, '<mark>glossary</mark>')
+        self.assertNotContains(response, '<b>')
+
+    def test_search_index_follows_edits_and_deletes(self):
+        self.post2.title = 'Rust Best Practices'
+        self.post2.content = 'How to write clean Rust code'
+        self.post2.save()
+        self.assertEqual(list(search_posts(Post.objects.all(), 'python')), [])
+        self.assertEqual(list(search_posts(Post.objects.all(), 'rust')), [self.post2])
+
+        self.post2.delete()
+        self.assertEqual(list(search_posts(Post.objects.all(), 'rust')), [])
+
+    def test_rebuild_search_index_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM blog_post_search")
+        self.assertEqual(list(search_posts(Post.objects.all(), 'django')), [])
+
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('4 posts', out.getvalue())
+        self.assertEqual(list(search_posts(Post.objects.all(), 'django')), [self.post1])
+
+
+class UploadIndexTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="testpass123")
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            STORAGES={
+                "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                "staging": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+            },
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        os.makedirs(os.path.join(self.media_root, "uploads"))
+
+    def upload(self, name, age_hours=48):
+        with open(os.path.join(self.media_root, "uploads", name), "w") as f:
+            f.write("data")
+        return Upload.objects.create(
+            path=f"uploads/{name}",
+            created_date=timezone.now() - timedelta(hours=age_hours),
+        )
+
+    def test_post_save_tracks_references(self):
+        post = Post.objects.create(
+            title="Pictures",
+            content='<img src="/media/uploads/a.png"><img src="https://cdn.example.com/b.png">',
+            author=self.user,
+        )
+        self.assertEqual(list(post.assets.values_list("path", flat=True)), ["uploads/a.png"])
+
+        post.content = '<img src="/media/uploads/c.png">'
+        post.save()
+        self.assertEqual(list(post.assets.values_list("path", flat=True)), ["uploads/c.png"])
+
+        post.delete()
+        self.assertFalse(PostAsset.objects.exists())
+
+    def test_orphans_are_an_anti_join(self):
+        self.upload("used.png")
+        self.upload("orphan.png")
+        self.upload("fresh.png", age_hours=1)
+        Post.objects.create(title="Uses", content='<img src="/media/uploads/used.png">', author=self.user)
+
+        with self.assertNumQueries(1):
+            orphans = list(orphaned_uploads(timedelta(hours=24)).values_list("path", flat=True))
+        self.assertEqual(orphans, ["uploads/orphan.png"])
+
+    def test_remove_orphaned_files_command(self):
+        self.upload("used.png")
+        self.upload("orphan.png")
+        self.upload("fresh.png", age_hours=1)
+        Post.objects.create(title="Uses", content='<img src="/media/uploads/used.png">', author=self.user)
+
+        out = StringIO()
+        call_command("remove_orphaned_files", "--dry-run", stdout=out)
+        self.assertIn("Would delete orphan file: uploads/orphan.png", out.getvalue())
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, "uploads", "orphan.png")))
+
+        call_command("remove_orphaned_files", "--batch-size", "1", stdout=StringIO())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, "uploads", "orphan.png")))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, "uploads", "used.png")))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, "uploads", "fresh.png")))
+        self.assertFalse(Upload.objects.filter(path="uploads/orphan.png").exists())
+
+        call_command("remove_orphaned_files", "--older-than", "0", stdout=StringIO())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, "uploads", "fresh.png")))
+
+    def test_cleanup_covers_featured_images_and_profile_pictures(self):
+        storage = InMemoryStorage()
+        for path in ["featured_images/kept.png", "featured_images/gone.png",
+                     "profile_pics/kept.png", "profile_pics/gone.png", "uploads/2024/gone.png"]:
+            storage.save(path, ContentFile(b"data"))
+        Post.objects.create(title="Cover", content="", author=self.user, featured_image="featured_images/kept.png")
+        self.user.profile.profile_picture = "profile_pics/kept.png"
+        self.user.profile.save()
+
+        reports = {
+            name: clean(storage, scope, older_than=timedelta(0), page_size=2, workers=2, rate=1000)
+            for name, scope in SCOPES.items()
+        }
+        self.assertEqual(reports["featured_images"].scanned, 2)
+        self.assertEqual(reports["featured_images"].deleted, 1)
+        self.assertEqual(reports["profile_pics"].deleted, 1)
+        self.assertEqual(reports["uploads"].deleted, 1)
+        self.assertTrue(storage.exists("featured_images/kept.png"))
+        self.assertTrue(storage.exists("profile_pics/kept.png"))
+        self.assertFalse(storage.exists("featured_images/gone.png"))
+        self.assertFalse(storage.exists("profile_pics/gone.png"))
+        self.assertFalse(storage.exists("uploads/2024/gone.png"))
+
+    def test_cleanup_reports_failed_deletes(self):
+        class FailingStorage(InMemoryStorage):
+            def delete(self, name):
+                raise OSError("provider unavailable")
+
+        storage = FailingStorage()
+        storage.save("uploads/orphan.png", ContentFile(b"data"))
+        report = clean(storage, SCOPES["uploads"], older_than=timedelta(0))
+        self.assertEqual(report.orphaned, 1)
+        self.assertEqual(report.deleted, 0)
+        self.assertEqual([path for path, _ in report.failed], ["uploads/orphan.png"])
+
+    def test_cleanup_keeps_files_of_unknown_age(self):
+        class NoTimesStorage(InMemoryStorage):
+            def get_modified_time(self, name):
+                raise NotImplementedError
+
+        storage = NoTimesStorage()
+        storage.save("uploads/unknown.png", ContentFile(b"data"))
+        report = clean(storage, SCOPES["uploads"], older_than=timedelta(0))
+        self.assertEqual(report.orphaned, 0)
+        self.assertEqual(report.unknown_age, 1)
+        self.assertTrue(storage.exists("uploads/unknown.png"))
+
+        with mock.patch("blog.management.commands.remove_orphaned_files.storages", {"default": storage}):
+            out = StringIO()
+            call_command("remove_orphaned_files", "--scope", "uploads", stdout=out)
+        self.assertIn("unknown age 1", out.getvalue())
+        self.assertIn("Kept 1 unreferenced files of unknown age", out.getvalue())
+
+    def test_migration_backfills_post_assets(self):
+        from importlib import import_module
+        from django.apps import apps
+
+        migration = import_module("blog.migrations.0015_backfill_post_assets")
+        post = Post.objects.create(title="Legacy", content="", author=self.user)
+        Post.objects.filter(pk=post.pk).update(content='<img src="/media/uploads/legacy.png">')
+
+        migration.backfill_post_assets(apps, None)
+        self.assertEqual(list(post.assets.values_list("path", flat=True)), ["uploads/legacy.png"])
+
+    def test_reindex_registers_existing_files(self):
+        with open(os.path.join(self.media_root, "uploads", "legacy.png"), "w") as f:
+            f.write("data")
+        post = Post.objects.create(title="Legacy", content="", author=self.user)
+        Post.objects.filter(pk=post.pk).update(content='<img src="/media/uploads/legacy.png">')
+
+        call_command("remove_orphaned_files", "--reindex", "--older-than", "0", stdout=StringIO())
+        self.assertTrue(Upload.objects.filter(path="uploads/legacy.png").exists())
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, "uploads", "legacy.png")))
+
+
+
+class TrixUploadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="testpass123")
+
+    def setUp(self):
+        # MEDIA_ROOT holds the staging area; "remote" stands in for the media storage
+        self.media_root = tempfile.mkdtemp()
+        self.remote = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.addCleanup(shutil.rmtree, self.remote)
+        override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            STORAGES={
+                **settings.STORAGES,
+                "default": {
+                    "BACKEND": "django.core.files.storage.FileSystemStorage",
+                    "OPTIONS": {"location": self.remote},
+                },
+                "staging": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+            },
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client.login(username="testuser", password="testpass123")
+
+    def post_file(self, name, data):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(reverse("blog:trix_upload"), {"file": SimpleUploadedFile(name, data)})
+        self.queued = len(callbacks)
+        return response
+
+    def test_upload_is_staged_under_its_content_hash(self):
+        data = b"\x89PNG screenshot"
+        digest = hashlib.sha256(data).hexdigest()
+
+        data_json = self.post_file("Screenshot.PNG", data).json()
+
+        self.assertEqual(data_json["url"], f"/media/staging/uploads/{digest}.png")
+        self.assertEqual(data_json["status"], "staged")
+        self.assertEqual(self.queued, 1)
+        upload = Upload.objects.get()
+        self.assertEqual(upload.sha256, digest)
+        self.assertFalse(os.path.exists(os.path.join(self.remote, "uploads")))
+
+        self.assertEqual(transfer(upload.pk), f"uploads/{digest}.png")
+        with open(os.path.join(self.remote, "uploads", f"{digest}.png"), "rb") as f:
+            self.assertEqual(f.read(), data)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, "staging", "uploads", f"{digest}.png")))
+
+        status = self.client.get(data_json["status_url"]).json()
+        self.assertEqual(status["status"], "stored")
+        self.assertEqual(status["url"], f"/media/uploads/{digest}.png")
+        self.assertIsNone(transfer(upload.pk))
+
+    def test_identical_content_is_stored_once(self):
+        first = self.post_file("a.png", b"same bytes").json()["url"]
+        with mock.patch.object(FileSystemStorage, "save") as save:
+            second = self.post_file("b.png", b"same bytes").json()["url"]
+        save.assert_not_called()
+        self.assertEqual(self.queued, 0)
+        third = self.post_file("c.png", b"other bytes").json()["url"]
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+        self.assertEqual(Upload.objects.count(), 2)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_large_upload_spools_to_disk_and_hashes_stream(self):
+        data = os.urandom(64 * 1024)
+        response = self.post_file("big.bin", data)
+        self.assertEqual(response.json()["url"], f"/media/staging/uploads/{hashlib.sha256(data).hexdigest()}.bin")
+
+    def test_upload_status_is_for_its_uploaders_only(self):
+        status_url = self.post_file("a.png", b"pixels").json()["status_url"]
+        self.assertEqual(self.client.get(status_url).status_code, 200)
+
+        User.objects.create_user(username="other", password="testpass123")
+        self.client.login(username="other", password="testpass123")
+        self.assertEqual(self.client.get(status_url).status_code, 404)
+        # uploading the same bytes makes them one of its uploaders
+        self.assertEqual(self.post_file("b.png", b"pixels").json()["status_url"], status_url)
+        self.assertEqual(self.client.get(status_url).status_code, 200)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(status_url).status_code, 302)
+
+    def test_missing_file_is_rejected(self):
+        response = self.client.post(reverse("blog:trix_upload"))
+        self.assertEqual(response.status_code, 400)
+
+    def test_staged_file_is_served_until_transferred(self):
+        url = self.post_file("a.png", b"pixels").json()["url"]
+        response = self.client.get(url)
+        self.assertEqual(b"".join(response.streaming_content), b"pixels")
+
+        transfer(Upload.objects.get().pk)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_transfer_swaps_placeholder_in_posts(self):
+        staged_url = self.post_file("a.png", b"pixels").json()["url"]
+        post = Post.objects.create(title="Pics", content=f'<img src="{staged_url}">', author=self.user)
+        self.assertEqual(list(post.assets.values_list("path", flat=True)), [staged_url[len("/media/"):]])
+        last_updated = post.last_updated
+
+        stored = transfer(Upload.objects.get().pk)
+
+        post.refresh_from_db()
+        self.assertEqual(post.content, f'<img src="/media/{stored}">')
+        self.assertEqual(list(post.assets.values_list("path", flat=True)), [stored])
+        # a targeted update: the post does not look edited
+        self.assertEqual(post.last_updated, last_updated)
+
+        # an editor still holding the placeholder saves after the transfer
+        late = Post.objects.create(title="Late", content=f'<img src="{staged_url}">', author=self.user)
+        self.assertEqual(late.content, f'<img src="/media/{stored}">')
+
+    def test_failed_transfer_is_retried_by_command(self):
+        self.post_file("a.png", b"pixels")
+        upload = Upload.objects.get()
+        with mock.patch.object(FileSystemStorage, "save", side_effect=OSError("offline")):
+            self.assertIsNone(transfer(upload.pk))
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, "failed")
+
+        call_command("process_uploads", "--retry-failed", stdout=StringIO())
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, "stored")
+
+    def test_featured_image_is_staged_then_swapped(self):
+        self.client.login(username="testuser", password="testpass123")
+        image = SimpleUploadedFile("cover.gif", GIF_BYTES, content_type="image/gif")
+        with self.captureOnCommitCallbacks():
+            self.client.post(reverse("blog:create_post"), {
+                "title": "Cover", "content": "text", "status": "published", "featured_image": image,
+            })
+
+        post = Post.objects.get(title="Cover")
+        digest = hashlib.sha256(GIF_BYTES).hexdigest()
+        self.assertEqual(post.featured_image.name, f"staging/featured_images/{digest}.gif")
+        response = self.client.get(post.get_absolute_url())
+        self.assertContains(response, f'src="/media/staging/featured_images/{digest}.gif"')
+
+        transfer(Upload.objects.get().pk)
+        post.refresh_from_db()
+        self.assertEqual(post.featured_image.name, f"featured_images/{digest}.gif")
+
+
+class ImageRenditionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="testpass123")
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            STORAGES={
+                **settings.STORAGES,
+                "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                "staging": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+            },
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def store_image(self, name, size=(1000, 500), mode="RGB"):
+        buffer = BytesIO()
+        Image.new(mode, size, "teal").save(buffer, format="PNG")
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def test_renditions_are_generated_once_per_image(self):
+        name = self.store_image("featured_images/cover.png")
+        with self.captureOnCommitCallbacks() as callbacks:
+            post = Post.objects.create(title="Cover", content="text", author=self.user, featured_image=name)
+        self.assertEqual(len(callbacks), 1)
+
+        self.assertTrue(update_renditions(Post, post.pk))
+        post.refresh_from_db()
+        meta = post.featured_image_renditions
+        self.assertEqual((meta["source"], meta["width"], meta["height"]), (name, 1000, 500))
+        self.assertTrue(meta["placeholder"].startswith("data:image/jpeg;base64,"))
+        # no upscaling: 1280 and 1920 collapse into the original width
+        self.assertEqual([width for width, _ in meta["sources"]["webp"]], [320, 640, 960, 1000])
+        for _, path in meta["sources"]["jpeg"] + meta["sources"]["webp"]:
+            self.assertTrue(default_storage.exists(path))
+        with default_storage.open(meta["sources"]["webp"][0][1]) as f:
+            self.assertEqual(Image.open(f).size, (320, 160))
+
+        self.assertFalse(update_renditions(Post, post.pk))
+        with self.captureOnCommitCallbacks() as callbacks:
+            post.save()
+        self.assertEqual(len(callbacks), 0)
+
+    def test_replaced_image_drops_old_renditions(self):
+        post = Post.objects.create(
+            title="Cover", content="text", author=self.user,
+            featured_image=self.store_image("featured_images/old.png"),
+        )
+        update_renditions(Post, post.pk)
+        old_paths = rendition_paths(Post.objects.get(pk=post.pk).featured_image_renditions)
+
+        Post.objects.filter(pk=post.pk).update(featured_image=self.store_image("featured_images/new.png", mode="RGBA"))
+        update_renditions(Post, post.pk)
+
+        self.assertEqual(Post.objects.get(pk=post.pk).featured_image_renditions["source"], "featured_images/new.png")
+        self.assertFalse(any(default_storage.exists(path) for path in old_paths))
+
+    def test_deleted_post_drops_its_renditions(self):
+        post = Post.objects.create(
+            title="Cover", content="text", author=self.user,
+            featured_image=self.store_image("featured_images/cover.png"),
+        )
+        update_renditions(Post, post.pk)
+        paths = rendition_paths(Post.objects.get(pk=post.pk).featured_image_renditions)
+        self.assertTrue(paths)
+
+        Post.objects.get(pk=post.pk).delete()
+        self.assertFalse(any(default_storage.exists(path) for path in paths))
+
+    def test_responsive_image_tag(self):
+        post = Post.objects.create(
+            title="Cover", content="text", author=self.user, status="published",
+            featured_image=self.store_image("featured_images/cover.png"),
+        )
+        template = Template(
+            '{% load blog_tags %}{% responsive_image post.featured_image post.featured_image_renditions '
+            'sizes="33vw" alt=post.title css_class="card" %}'
+        )
+        html = template.render(Context({"post": post}))
+        self.assertIn('src="/media/featured_images/cover.png"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertNotIn("srcset", html)
+
+        update_renditions(Post, post.pk)
+        post.refresh_from_db()
+        html = template.render(Context({"post": post}))
+        self.assertIn('<source type="image/webp" srcset="/media/renditions/featured_images/cover/320w.webp 320w', html)
+        self.assertIn('sizes="33vw"', html)
+        self.assertIn('width="1000" height="500"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn("data:image/jpeg;base64,", html)
+
+    def test_generate_renditions_command_backfills_images(self):
+        name = self.store_image("profile_pics/me.png", size=(300, 300))
+        Profile.objects.filter(user=self.user).update(profile_picture=name)
+        Post.objects.create(title="Plain", content="text", author=self.user)
+
+        out = StringIO()
+        call_command("generate_renditions", stdout=out)
+
+        meta = Profile.objects.get(user=self.user).profile_picture_renditions
+        self.assertEqual([width for width, _ in meta["sources"]["jpeg"]], [48, 96, 192, 300])
+        self.assertIn("Rendered 1 profiles", out.getvalue())
+        self.assertIn("Rendered 0 posts", out.getvalue())
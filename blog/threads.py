@@ -0,0 +1,148 @@
+"""
+Threaded comments.
+
+Every comment stores its materialized ``path`` (see blog.models.path_segment)
+and ``depth``. Ordering a post's comments by path lists the newest thread
+first, each followed by its replies in the order they were written, so a
+whole thread, or a page of threads cut off at a depth, is one ordered range
+scan over the ``(post, path)`` index and never a query per level.
+
+A path prefix selects a subtree, so moving one is a single UPDATE and
+deleting one never walks the replies level by level. ``reply_count`` counts the
+approved comments below a comment that ``nest`` shows, those with no
+unapproved comment in between, and is adjusted on the ancestors named by
+the path instead of being recounted.
+"""
+from django.db import transaction
+from django.db.models import F, Max, Q, Sum, Value
+from django.db.models.functions import Concat, Substr
+
+from .caching import invalidate_post
+from .models import MAX_DEPTH, SEGMENT, Comment, adjust_reply_counts, path_segment
+from .pagination import InvalidCursor, KeysetPage
+
+COMMENTS_PAGE_SIZE = 20
+# replies shown with a page of threads; deeper ones load with subtree()
+REPLY_DEPTH = 3
+
+
+def approved_comments(post_id):
+    return Comment.objects.filter(post_id=post_id, approved=True).select_related("author")
+
+
+def _after(path):
+    """The first path past every comment in the subtree at ``path``."""
+    return f"{path[:-SEGMENT]}{int(path[-SEGMENT:]) + 1:0{SEGMENT}d}"
+
+
+def _within(path):
+    return Q(path__gte=path, path__lt=_after(path))
+
+
+def nest(rows, top_depth, depth_limit=None):
+    """
+    Link ``rows`` (ordered by path) into threads and return them flat, in
+    display order. Each comment gets ``thread_replies`` (its direct replies)
+    and ``more_replies`` (replies were left out by ``depth_limit``). Rows
+    whose parent is missing, because it is not approved, are dropped with
+    their replies.
+    """
+    kept, by_id = [], {}
+    for comment in rows:
+        if comment.depth == top_depth:
+            parent = None
+        else:
+            parent = by_id.get(comment.parent_id)
+            if parent is None:
+                continue
+        comment.thread_replies = []
+        comment.more_replies = depth_limit is not None and comment.depth >= depth_limit and comment.reply_count > 0
+        if parent is not None:
+            parent.thread_replies.append(comment)
+        by_id[comment.pk] = comment
+        kept.append(comment)
+    return kept
+
+
+def thread_page(comments, cursor=None, size=COMMENTS_PAGE_SIZE, depth=REPLY_DEPTH):
+    """
+    One page of top-level threads from ``comments`` (one post's), newest
+    first, each with its replies down to ``depth``. The cursor is the path
+    of the last thread on the previous page. Reads the page's top-level
+    paths, then the threads themselves in one range scan.
+    """
+    tops = comments.filter(depth=0)
+    if cursor:
+        if not (cursor.isdigit() and len(cursor) == SEGMENT):
+            raise InvalidCursor(cursor)
+        tops = tops.filter(path__gt=cursor)
+    paths = list(tops.order_by("path").values_list("path", flat=True)[: size + 1])
+
+    page = KeysetPage([])
+    if len(paths) > size:
+        paths = paths[:size]
+        page.next_cursor = paths[-1]
+    if paths:
+        rows = comments.filter(path__gte=paths[0], path__lt=_after(paths[-1]), depth__lte=depth)
+        page.items = nest(rows.order_by("path"), 0, depth)
+    return page
+
+
+def subtree(comment, comments=None):
+    """Every reply below ``comment``, nested, from one range scan."""
+    if comments is None:
+        comments = approved_comments(comment.post_id)
+    rows = comments.filter(_within(comment.path), depth__gt=comment.depth).order_by("path")
+    return nest(rows, comment.depth + 1)
+
+
+def move_thread(comment, parent=None):
+    """
+    Move ``comment`` and all its replies under ``parent`` (to the top level
+    when None) with one UPDATE of their paths and depths.
+    """
+    if parent is not None:
+        if parent.post_id != comment.post_id:
+            raise ValueError("A reply must be on the same post as its parent.")
+        if parent.path.startswith(comment.path):
+            raise ValueError("A comment cannot be moved below its own replies.")
+
+    path = (parent.path if parent else "") + path_segment(comment.pk, parent is None)
+    shift = (parent.depth + 1 if parent else 0) - comment.depth
+
+    with transaction.atomic():
+        moving = Comment.objects.filter(_within(comment.path), post_id=comment.post_id)
+        totals = moving.aggregate(
+            deepest=Max("depth"),
+            # what the ancestors count of the thread: nothing if its top is hidden
+            counted=Sum(F("reply_count") + 1, filter=Q(pk=comment.pk, approved=True)),
+        )
+        if totals["deepest"] + shift > MAX_DEPTH:
+            raise ValueError(f"Threads are at most {MAX_DEPTH} replies deep.")
+
+        counted = totals["counted"] or 0
+        adjust_reply_counts(comment.post_id, comment.path, -counted)
+        moving.update(
+            path=Concat(Value(path), Substr("path", len(comment.path) + 1)),
+            depth=F("depth") + shift,
+        )
+        Comment.objects.filter(pk=comment.pk).update(parent=parent)
+        adjust_reply_counts(comment.post_id, path, counted)
+
+    # update() sends no signals, so drop the cached post here
+    invalidate_post(comment.post_id)
+    comment.parent, comment.path, comment.depth = parent, path, comment.depth + shift
+
+
+def delete_thread(comment):
+    """
+    Delete ``comment`` and all its replies, selected by path in one query
+    rather than level by level through ``parent``. The per-comment
+    pre_delete receiver keeps the counts right.
+    Returns the number of comments deleted.
+    """
+    with transaction.atomic():
+        deleted, _ = Comment.objects.filter(_within(comment.path), post_id=comment.post_id).delete()
+
+    invalidate_post(comment.post_id)
+    return deleted
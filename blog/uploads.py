@@ -0,0 +1,242 @@
+"""
+Content-addressed, background-transferred storage for editor uploads.
+
+``HashingUploadHandler`` computes the SHA-256 of each file while the request
+body streams in, ahead of Django's own handlers (which keep small files in
+memory and spool anything over ``FILE_UPLOAD_MAX_MEMORY_SIZE`` to a
+temporary file). ``store_upload`` names the file after its hash and reuses
+the existing ``Upload`` when the same bytes were stored before, so a
+re-pasted image costs one indexed query instead of another storage write.
+
+New files are written to the local ``staging`` storage and the request
+returns straight away with a placeholder URL under ``staging/``. A small
+thread pool then copies each file to the default (media) storage, points
+posts that link to the placeholder at the stored file and drops the staged
+copy. ``process_uploads`` retries anything a restart or error left behind.
+"""
+import hashlib
+import logging
+import os
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage, storages
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from .assets import referenced_paths
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIRECTORY = "uploads"
+STAGING_DIRECTORY = "staging"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Record the SHA-256 of every uploaded file in ``request.upload_digests``,
+    keyed by field name. Storing the data is left to the next handler.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.request.upload_digests = {}
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.request.upload_digests[self.field_name] = self.hasher.hexdigest()
+        return None
+
+
+def hash_file(file):
+    """SHA-256 of a file object, read in chunks."""
+    hasher = hashlib.sha256()
+    for chunk in file.chunks():
+        hasher.update(chunk)
+    file.seek(0)
+    return hasher.hexdigest()
+
+
+def staging_storage():
+    return storages["staging"]
+
+
+def store_upload(file, digest=None, directory=UPLOAD_DIRECTORY, user=None):
+    """
+    Stage ``file`` under its content hash and queue its transfer to storage.
+    Returns the ``Upload``; identical content already on record returns the
+    existing row without writing anything. ``user`` is recorded as one of
+    its uploaders.
+    """
+    upload = _store(file, digest, directory)
+    if user is not None:
+        upload.uploaders.add(user)
+    return upload
+
+
+def _store(file, digest, directory):
+    from .models import Upload
+
+    digest = digest or hash_file(file)
+    existing = Upload.objects.filter(directory=directory, sha256=digest).first()
+    if existing:
+        # reused content gets a fresh grace period before orphan cleanup
+        Upload.objects.filter(pk=existing.pk).update(created_date=timezone.now())
+        return existing
+
+    extension = os.path.splitext(file.name)[1].lower()
+    staged = staging_storage().save(f"{STAGING_DIRECTORY}/{directory}/{digest}{extension}", file)
+    try:
+        with transaction.atomic():
+            upload = Upload.objects.create(
+                path=staged, directory=directory, sha256=digest, status="staged"
+            )
+    except IntegrityError:
+        # a concurrent request staged the same bytes first; keep its copy
+        staging_storage().delete(staged)
+        return Upload.objects.get(directory=directory, sha256=digest)
+
+    enqueue(upload.pk)
+    return upload
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.UPLOAD_TRANSFER_WORKERS,
+                thread_name_prefix="blog-background",
+            )
+        return _pool
+
+
+def _run(func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Background task %s%r failed", func.__name__, args)
+    finally:
+        # worker threads hold their own connections
+        connections.close_all()
+
+
+def run_in_background(func, *args):
+    """Call ``func(*args)`` on the background pool once the current transaction commits."""
+    transaction.on_commit(lambda: _get_pool().submit(_run, func, args))
+
+
+def enqueue(upload_id):
+    """Transfer the upload on the background pool once the row is committed."""
+    run_in_background(transfer, upload_id)
+
+
+def transfer(upload_id):
+    """
+    Copy a staged upload to the default storage and repoint its references.
+    Returns the stored path, or None if there was nothing (left) to do.
+    """
+    from .models import Upload
+
+    upload = Upload.objects.filter(pk=upload_id, status__in=["staged", "failed"]).first()
+    if upload is None:
+        return None
+
+    staged = upload.path
+    try:
+        with staging_storage().open(staged) as file:
+            path = default_storage.save(f"{upload.directory}/{posixpath.basename(staged)}", file)
+    except Exception:
+        logger.exception("Transfer of upload %s failed", upload.pk)
+        Upload.objects.filter(pk=upload.pk).update(status="failed")
+        return None
+
+    with transaction.atomic():
+        won = Upload.objects.filter(pk=upload.pk, path=staged).update(path=path, status="stored")
+        if won:
+            swap_references(staged, path)
+    if not won:
+        # another worker finished this upload first
+        default_storage.delete(path)
+        return None
+
+    staging_storage().delete(staged)
+    return path
+
+
+def swap_references(staged, path):
+    """
+    Point posts that use the staged file at its stored path. Only the link
+    in ``content`` is rewritten, with an UPDATE of the locked row, so a
+    concurrent edit is neither lost nor overwritten and ``last_updated``
+    does not move. Runs inside the transaction that marks the upload stored.
+    """
+    from .assets import sync_post_assets
+    from .caching import invalidate_post
+    from .models import Post
+    from .renditions import schedule_renditions
+    from .search import get_backend
+
+    old, new = f"{settings.MEDIA_URL}{staged}", f"{settings.MEDIA_URL}{path}"
+    using = Post.objects.filter(assets__path=staged).values("pk")
+    rows = Post.objects.select_for_update().filter(pk__in=using).values_list("pk", "author_id", "content")
+    for post_id, author_id, content in rows:
+        content = content.replace(old, new)
+        Post.objects.filter(pk=post_id).update(content=content)
+        sync_post_assets(Post(pk=post_id, content=content))
+        get_backend().index(post_id)
+        invalidate_post(post_id, author_id)
+
+    for post_id, author_id in Post.objects.filter(featured_image=staged).values_list("pk", "author_id"):
+        Post.objects.filter(pk=post_id).update(featured_image=path)
+        invalidate_post(post_id, author_id)
+        schedule_renditions(Post, post_id)
+
+
+def _staged_key(staged):
+    """``(directory, sha256)`` of a staged path, or None for anything else."""
+    parts = staged.split("/")
+    if len(parts) != 3 or parts[0] != STAGING_DIRECTORY:
+        return None
+    return parts[1], os.path.splitext(parts[2])[0]
+
+
+def resolve_staged(content):
+    """Replace links to staged uploads in ``content`` with their stored URLs, where done."""
+    from .models import Upload
+
+    keys = {}
+    for staged in referenced_paths(content):
+        key = _staged_key(staged)
+        if key:
+            keys[key] = staged
+    if not keys:
+        return content
+
+    stored = Upload.objects.filter(
+        status="stored", sha256__in=[sha for _, sha in keys]
+    ).values_list("directory", "sha256", "path")
+    for directory, sha, path in stored:
+        staged = keys.get((directory, sha))
+        if staged:
+            content = content.replace(f"{settings.MEDIA_URL}{staged}", f"{settings.MEDIA_URL}{path}")
+    return content
+
+
+def staged_url(name):
+    """URL of an image field value, serving staged files from the staging storage."""
+    if name and name.startswith(f"{STAGING_DIRECTORY}/"):
+        return staging_storage().url(name)
+    return default_storage.url(name)
@@ -1,8 +1,11 @@
 from django.urls import path
 
+from .feeds import AuthorAtomFeed, AuthorFeed, PostAtomFeed, PostFeed
 from .views import (
     IndexView,
+    PostListFragmentView,
     PostDetailView,
+    CommentListView,
     PostCreateView,
     like_post,
     PostUpdateView,
@@ -10,17 +13,25 @@ from .views import (
     SearchView,
     comment,
     trix_upload,
+    upload_status,
 )
 
 app_name = "blog"
 urlpatterns = [
     path("", IndexView.as_view(), name="index"),
     path("search/", SearchView.as_view(), name="search"),
+    path("posts/more/", PostListFragmentView.as_view(), name="post_list_fragment"),
+    path("feeds/rss/", PostFeed(), name="feed_rss"),
+    path("feeds/atom/", PostAtomFeed(), name="feed_atom"),
+    path("feeds/<str:username>/rss/", AuthorFeed(), name="author_feed_rss"),
+    path("feeds/<str:username>/atom/", AuthorAtomFeed(), name="author_feed_atom"),
     path("new-post/", PostCreateView.as_view(), name="create_post"),
     path("trix-upload/", trix_upload, name="trix_upload"),
+    path("trix-upload/<int:pk>/status/", upload_status, name="upload_status"),
     path("<slug:slug>/", PostDetailView.as_view(), name="post_detail"),
     path("<slug:slug>/edit/", PostUpdateView.as_view(), name="edit_post"),
     path("<slug:slug>/delete/", PostDeleteView.as_view(), name="delete_post"),
     path("<slug:slug>/like/", like_post, name="like_post"),
     path("<slug:slug>/comment/", comment, name="comment"),
+    path("<slug:slug>/comments/", CommentListView.as_view(), name="comment_list"),
 ]
@@ -1,19 +1,24 @@
-import os
-import uuid
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.http import Http404, JsonResponse
+from django.http import FileResponse, Http404, JsonResponse
 from django.shortcuts import get_object_or_404
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
 from django.views.generic import CreateView, DeleteView, DetailView, ListView, UpdateView
-from django.db.models import Q, Prefetch
 from django.views.decorators.csrf import csrf_exempt
-from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
 
+from accounts.cards import get_card
+
+from .conditional import not_modified, post_etag, set_validators
 from .forms import CommentForm, PostForm, SearchForm
-from .models import Comment, Post
+from .likes import has_liked, toggle_like
+from .pagination import InvalidCursor, keyset_page
+from .search import search_posts
+from .threads import approved_comments, subtree, thread_page
+from .uploads import STAGING_DIRECTORY, HashingUploadHandler, staging_storage, store_upload
+from .models import Comment, Post, Upload
 
 
 # Create your views here.
@@ -21,6 +26,7 @@ class IndexView(ListView):
     model = Post
     template_name = "blog/index.html"
     context_object_name = "posts"
+    page_size = 10
 
     def get_queryset(self):
         """
@@ -29,13 +35,42 @@ class IndexView(ListView):
 
         return super().get_queryset().filter(
             status="published", pub_date__lte=timezone.now()
-        ).select_related('author').order_by("-pub_date")
+        ).select_related('author').defer(
+            "content", "plain_text"
+        ).order_by("-pub_date", "-id")
+
+    def get(self, request, *args, **kwargs):
+        """
+        Render one keyset page; ?cursor= continues after the previous one.
+        """
+        try:
+            self.page = keyset_page(
+                self.get_queryset(), request.GET.get("cursor"), self.page_size
+            )
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+
+        self.object_list = self.page.items
+        context = self.get_context_data()
+        context["next_cursor"] = self.page.next_cursor
+        return self.render_to_response(context)
+
+
+class PostListFragmentView(IndexView):
+    """
+    The next page of post cards as an HTML fragment, for infinite scroll.
+    """
+    template_name = "blog/_post_cards.html"
 
 
 
 class PostDetailView(DetailView):
     model = Post
     template_name = "blog/post_detail.html"
+    # what the visibility check and the validators read
+    validator_fields = (
+        "id", "status", "pub_date", "author", "last_updated", "likes", "approved_comments_count", "views_count",
+    )
 
     def get_object(self, queryset=None):
         """
@@ -48,22 +83,20 @@ class PostDetailView(DetailView):
         if queryset is None:
             queryset = self.get_queryset()
         
-        # Prefetch comments with authors and select related author
-        queryset = queryset.select_related('author').prefetch_related(
-            'liked_by',
-            Prefetch(
-                'comments',
-                queryset=Comment.objects.filter(approved=True).select_related('author').order_by('-created_date')
-            )
-        )
+        # comments are paged in get_context_data; whether the viewer liked
+        # it comes from their cached liked set
+        queryset = queryset.select_related('author')
         
         try:
             post = queryset.get(slug=slug)
         except Post.DoesNotExist:
             raise Http404("No post found matching the query")
         
+        return self.check_visible(post)
+
+    def check_visible(self, post):
         is_public = (post.status == "published" and post.pub_date <= timezone.now())
-        is_author = (self.request.user.is_authenticated and self.request.user == post.author)
+        is_author = (self.request.user.is_authenticated and self.request.user.pk == post.author_id)
         
         if is_public or is_author:
             return post
@@ -72,11 +105,33 @@ class PostDetailView(DetailView):
 
     def get(self, request, *args, **kwargs):
         """
-        Increment the views count for the post when it is viewed.
+        Increment the views count for the post when it is viewed, then
+        answer 304 if the reader's copy is current; otherwise render.
         """
-        response = super().get(request, *args, **kwargs)
-        self.object.increment_views()
-        return response
+        post = self.check_visible(
+            get_object_or_404(Post.objects.only(*self.validator_fields), slug=self.kwargs.get(self.slug_url_kwarg))
+        )
+        post.increment_views()
+
+        etag = post_etag(post, *self.viewer_parts(post))
+        response = not_modified(request, etag)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return set_validators(response, request, etag)
+
+    def viewer_parts(self, post):
+        """What else the page shows that differs per request or viewer."""
+        request = self.request
+        parts = [request.get_full_path(), get_card(post.author_id)["username"]]
+        if request.user.is_authenticated:
+            card = get_card(request.user.pk)
+            parts += [
+                request.user.pk, card["username"], card["avatar"],
+                # the forms embed a token derived from it
+                request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+                has_liked(request.user, post.pk),
+            ]
+        return parts
 
     def get_context_data(self, **kwargs):
         """
@@ -89,15 +144,65 @@ class PostDetailView(DetailView):
 
         context["likes"] = post.likes
         context["reading_time"] = post.reading_time
-        context["user_has_liked"] = self.request.user in post.liked_by.all()
-        # comments are already prefetched and filtered in get_object
-        context["comments"] = post.comments.all()
+        context["user_has_liked"] = has_liked(self.request.user, post.pk)
+        # the first page of threads; the rest load on demand from
+        # CommentListView (?comments_cursor= without JS)
+        try:
+            page = thread_page(approved_comments(post.pk), self.request.GET.get("comments_cursor"))
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+        context["comments"] = page.items
+        context["comments_next"] = page.next_cursor
         context["comment_form"] = CommentForm()
 
         return context
 
 
-class PostCreateView(LoginRequiredMixin, CreateView):
+class CommentListView(PostDetailView):
+    """
+    The next page of a post's comment threads as an HTML fragment, for the
+    "Older comments" button, or with ?thread=<id> the replies below one
+    comment. Same visibility rules as the post.
+    """
+    template_name = "blog/_comments.html"
+
+    def get(self, request, *args, **kwargs):
+        post = self.check_visible(
+            get_object_or_404(Post.objects.only("id", "slug", "status", "pub_date", "author"), slug=kwargs.get("slug"))
+        )
+        comments = approved_comments(post.pk)
+        thread = request.GET.get("thread")
+        if thread:
+            if not thread.isdigit():
+                raise Http404("No comment found matching the query")
+            root = get_object_or_404(
+                Comment.objects.only("post", "path", "depth"), pk=thread, post_id=post.pk, approved=True
+            )
+            replies = subtree(root, comments)
+            return self.render_to_response({"post": post, "comments": replies})
+
+        try:
+            page = thread_page(comments, request.GET.get("cursor"))
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+        return self.render_to_response({
+            "post": post, "comments": page.items, "comments_next": page.next_cursor,
+        })
+
+
+class StagedFeaturedImageMixin:
+    """Stage a newly uploaded featured image instead of writing it to storage in the request."""
+
+    def form_valid(self, form):
+        image = form.cleaned_data.get("featured_image")
+        if isinstance(image, UploadedFile):
+            form.instance.featured_image = store_upload(
+                image, directory="featured_images", user=self.request.user
+            ).path
+        return super().form_valid(form)
+
+
+class PostCreateView(LoginRequiredMixin, StagedFeaturedImageMixin, CreateView):
     model = Post 
     form_class = PostForm
     template_name = "blog/create_post.html"
@@ -117,7 +222,7 @@ class PostCreateView(LoginRequiredMixin, CreateView):
         return reverse_lazy("blog:post_detail", kwargs={'slug':self.object.slug})
 
 
-class PostUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class PostUpdateView(LoginRequiredMixin, UserPassesTestMixin, StagedFeaturedImageMixin, UpdateView):
     model = Post
     form_class = PostForm
     template_name = "blog/edit_post.html"
@@ -149,13 +254,12 @@ class SearchView(ListView):
     def get_queryset(self):
         query = self.request.GET.get('query', '')
         if query:
-            return super().get_queryset().filter(
-                Q(status="published") &
-                Q(pub_date__lte=timezone.now()) &
-                (Q(title__icontains=query) |
-                 Q(content__icontains=query) |
-                 Q(author__username__icontains=query))
-            ).distinct().order_by("-pub_date")
+            return search_posts(
+                super().get_queryset().filter(
+                    status="published", pub_date__lte=timezone.now()
+                ).select_related('author').defer("content", "plain_text"),
+                query,
+            )
 
         return Post.objects.none()
 
@@ -167,50 +271,63 @@ class SearchView(ListView):
     
 
 @csrf_exempt
+@login_required
 def trix_upload(request):
+    # must be installed before request.FILES is first read
+    request.upload_handlers.insert(0, HashingUploadHandler(request))
     if request.method == 'POST':
         file = request.FILES.get('file')
         if file:
-            os.makedirs(os.path.join(settings.MEDIA_ROOT, 'uploads'), exist_ok=True)
+            digest = getattr(request, 'upload_digests', {}).get('file')
+            upload = store_upload(file, digest, user=request.user)
+            return JsonResponse(upload_status_data(upload))
+    return JsonResponse({'error': 'Upload failed'}, status=400)
 
-            #Generate unique filename to prevent collisions
-            file_ext = os.path.splitext(file.name)[1]
-            file_name = f"{uuid.uuid4()}{file_ext}"
-            file_path = default_storage.save(f"uploads/{file_name}", file)
 
-            file_url = f"{settings.MEDIA_URL}{file_path}"
-            return JsonResponse({'url': file_url})
-    return JsonResponse({'error': 'Upload failed'}, status=400)
+def upload_status_data(upload):
+    return {
+        'url': upload.url,
+        'status': upload.status,
+        'status_url': reverse('blog:upload_status', kwargs={'pk': upload.pk}),
+    }
 
 
 @login_required
-def like_post(request, slug):
-    post = get_object_or_404(Post, slug=slug)
+def upload_status(request, pk):
+    """Polled by the Trix script until a staged upload is stored; uploaders only."""
+    upload = get_object_or_404(Upload, pk=pk, uploaders=request.user)
+    return JsonResponse(upload_status_data(upload))
+
 
-    liked = request.user in post.liked_by.all()
+def staged_upload(request, name):
+    """Serve a staged upload until its transfer to the media storage finishes."""
+    name = f"{STAGING_DIRECTORY}/{name}"
+    storage = staging_storage()
+    if ".." in name.split("/") or not storage.exists(name):
+        raise Http404("No such upload")
+    return FileResponse(storage.open(name))
+
+
+@login_required
+def like_post(request, slug):
+    post = get_object_or_404(Post.objects.only("pk"), slug=slug)
 
-    if liked:
-        post.liked_by.remove(request.user)
-        post.likes -= 1
-    else:
-        post.liked_by.add(request.user)
-        post.likes += 1
-    post.save()
+    liked, likes = toggle_like(post, request.user)
 
     return JsonResponse(
         {
-            "likes": post.likes,
-            "user_has_liked": not liked,
+            "likes": likes,
+            "user_has_liked": liked,
         }
     )
 
 
 @login_required
 def comment(request, slug):
-    post = get_object_or_404(Post, slug=slug)
+    post = get_object_or_404(Post.objects.only("pk"), slug=slug)
 
     if request.method == "POST":
-        form = CommentForm(request.POST)
+        form = CommentForm(request.POST, post=post)
 
         if form.is_valid():
             comment = form.save(commit=False)
@@ -220,11 +337,15 @@ def comment(request, slug):
 
             return JsonResponse({
                 'success': True,
+                'id': comment.pk,
+                'parent': comment.parent_id,
+                'depth': comment.depth,
                 'author': request.user.username,
                 'created_date': comment.created_date.strftime("%B %d, %Y %H:%M"),
                 'content': comment.content,
-                # comments are already prefetched and filtered in get_object
-                'comments_count': len(post.comments.all())
+                'comments_count': Post.objects.filter(pk=post.pk).values_list(
+                    'approved_comments_count', flat=True
+                ).get()
             })
 
     return JsonResponse({'success': False}, status=400)
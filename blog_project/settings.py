@@ -85,6 +85,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "accounts.context_processors.user_card",
             ],
         },
     },
@@ -195,15 +196,26 @@ SPECTACULAR_SETTINGS = {
     'VERSION': '1.0.0',
 }
 
-#CACHES = {
-#    "default": {
-#        "BACKEND": "django_redis.cache.RedisCache",
-#        "LOCATION": "redis://127.0.0.1:6379/1",
-#        "OPTIONS": {
-#            "CLIENT_CLASS": "django_redis.client.DefaultClient",
-#        }
-#    }
-#}
+# Buffered post views are written to the database at most this often (seconds)
+VIEW_COUNT_FLUSH_INTERVAL = 60
+
+# Post search backend; chosen from the database vendor when unset
+# BLOG_SEARCH_BACKEND = "blog.search.PostgresSearchBackend"
+
+# View counters, cache generations and hit counts must be shared by every
+# process, including management commands such as flush_view_counts and
+# cache_stats; set REDIS_URL in production. Without it each process gets its
+# own in-memory cache, which is only good for development and tests.
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            }
+        }
+    }
 
 # Deployment settings
 CSRF_TRUSTED_ORIGINS = [
@@ -230,4 +242,11 @@ STORAGES = {
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedStaticFilesStorage",
     },
+    # local holding area for uploads until blog.uploads moves them to "default"
+    "staging": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
 }
+
+# Background threads for upload transfers and image renditions (blog.uploads)
+UPLOAD_TRANSFER_WORKERS = 2
@@ -20,8 +20,12 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
 
+from blog.views import staged_upload
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    # staged uploads live on local disk until moved to the media storage
+    path(f"{settings.MEDIA_URL.strip('/')}/staging/<path:name>", staged_upload, name="staged_upload"),
     path("accounts/", include("accounts.urls")),
     path("api/", include("api.urls")),
 #    path("silk/", include("silk.urls")),